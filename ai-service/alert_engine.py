@@ -0,0 +1,179 @@
+"""
+Alert Engine - Coalesced Threat Alerts
+Every suspicious / critical detection is a "hit". Hits on the same object
+are merged into one open alert with a hit count instead of producing an
+alert (a WebSocket broadcast plus backend POSTs) each. An object is
+matched by, in order: recognized identity, track id, then same class on
+the same camera close to where the alert last saw it (so a re-acquired
+track or an untracked source still lands on its alert).
+
+An alert emits only when it opens or its severity changes: upgrades are
+immediate, downgrades wait until the lower level has held for
+ALERT_ESCALATION_WINDOW seconds (no flapping). An alert with no hits for
+ALERT_COOLDOWN seconds closes; the object's next hit opens a new one.
+"""
+
+import itertools
+import math
+import os
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+from stream_codec import THREAT_CODES
+
+# Configuration (overridable via environment)
+ALERT_COOLDOWN = float(os.getenv("ALERT_COOLDOWN", "60"))                     # seconds without hits before an alert closes
+ALERT_ESCALATION_WINDOW = float(os.getenv("ALERT_ESCALATION_WINDOW", "10"))  # seconds a lower level must hold before a downgrade
+ALERT_MATCH_RADIUS = float(os.getenv("ALERT_MATCH_RADIUS", "1.0"))           # location match distance, in box diagonals
+
+OPENED, ESCALATED, DEESCALATED = "opened", "escalated", "deescalated"
+
+
+def _center(det: Dict) -> Tuple[float, float, float]:
+    """Box center and diagonal, in pixels"""
+    bbox = det["bbox"]
+    return (bbox["x"] + bbox["width"] / 2, bbox["y"] + bbox["height"] / 2,
+            math.hypot(bbox["width"], bbox["height"]))
+
+
+class CoalescedAlert:
+    """One open alert and the hits merged into it"""
+
+    def __init__(self, alert_id: int, camera_id: str, det: Dict, now: float):
+        self.alert_id = alert_id
+        self.camera_id = camera_id
+        self.label = det.get("label") or det["class"]
+        self.identity = det.get("identity")
+        self.severity = det["threat_level"]
+        self.track_ids: Set[int] = set()
+        self.track_id = None
+        self.center = _center(det)
+        self.hits = 0
+        self.first_seen = now
+        self.last_seen = now
+        self.lower_since: Optional[float] = None  # when hits started coming in below `severity`
+        self.lower_level: Optional[str] = None
+        self.data: Dict = {}  # alert payload, built by the caller when the alert emits
+
+    def absorb(self, det: Dict, now: float):
+        self.hits += 1
+        self.last_seen = now
+        self.center = _center(det)
+        self.identity = self.identity or det.get("identity")
+        track_id = det.get("track_id")
+        if track_id is not None:
+            self.track_ids.add(track_id)
+            self.track_id = track_id
+
+    def summary(self) -> Dict:
+        return {
+            "hit_count": self.hits,
+            "severity": self.severity,
+            "first_seen": self.first_seen,
+            "last_seen": self.last_seen,
+            "track_ids": sorted(self.track_ids)
+        }
+
+
+class AlertEngine:
+    """
+    observe() a hit; it returns (event, alert) when the alert must be
+    emitted (OPENED / ESCALATED / DEESCALATED), or None when the hit was
+    merged silently.
+    """
+
+    def __init__(self, cooldown: float = ALERT_COOLDOWN, escalation_window: float = ALERT_ESCALATION_WINDOW,
+                 match_radius: float = ALERT_MATCH_RADIUS):
+        self.cooldown = cooldown
+        self.escalation_window = escalation_window
+        self.match_radius = match_radius
+        self._open: Dict[str, List[CoalescedAlert]] = {}  # camera_id -> open alerts
+        self._ids = itertools.count(1)
+        self.hits = 0
+        self.emitted = {OPENED: 0, ESCALATED: 0, DEESCALATED: 0}
+        self.closed = 0
+
+    def observe(self, camera_id: str, det: Dict, active_tracks: Optional[set] = None,
+                now: Optional[float] = None) -> Optional[Tuple[str, CoalescedAlert]]:
+        now = time.time() if now is None else now
+        self.hits += 1
+        self.expire(now)
+        alerts = self._open.setdefault(camera_id, [])
+
+        alert = self._match(alerts, det, active_tracks or set())
+        if alert is None:
+            alert = CoalescedAlert(next(self._ids), camera_id, det, now)
+            alert.absorb(det, now)
+            alerts.append(alert)
+            return self._emit(OPENED, alert)
+
+        alert.absorb(det, now)
+        level = det["threat_level"]
+        if THREAT_CODES[level] > THREAT_CODES[alert.severity]:
+            alert.severity = level
+            alert.lower_since = alert.lower_level = None
+            return self._emit(ESCALATED, alert)
+        if THREAT_CODES[level] == THREAT_CODES[alert.severity]:
+            alert.lower_since = alert.lower_level = None
+            return None
+        if alert.lower_since is None:
+            alert.lower_since = now
+        alert.lower_level = level
+        if now - alert.lower_since >= self.escalation_window:
+            alert.severity = level
+            alert.lower_since = alert.lower_level = None
+            return self._emit(DEESCALATED, alert)
+        return None
+
+    def _emit(self, event: str, alert: CoalescedAlert) -> Tuple[str, CoalescedAlert]:
+        self.emitted[event] += 1
+        return event, alert
+
+    def _match(self, alerts: List[CoalescedAlert], det: Dict, active_tracks: set) -> Optional[CoalescedAlert]:
+        identity = det.get("identity")
+        if identity:
+            for alert in alerts:
+                if alert.identity == identity:
+                    return alert
+        track_id = det.get("track_id")
+        if track_id is not None:
+            for alert in alerts:
+                if track_id in alert.track_ids:
+                    return alert
+
+        # Location: same class, near the alert's last position, and not a
+        # different object that is still being tracked on its own
+        label = det.get("label") or det["class"]
+        x, y, diagonal = _center(det)
+        best, best_distance = None, None
+        for alert in alerts:
+            if alert.label != label or (identity and alert.identity and alert.identity != identity):
+                continue
+            if alert.track_id is not None and alert.track_id != track_id and alert.track_id in active_tracks:
+                continue
+            ax, ay, adiagonal = alert.center
+            distance = math.hypot(x - ax, y - ay)
+            if distance <= self.match_radius * max(diagonal, adiagonal) and \
+                    (best_distance is None or distance < best_distance):
+                best, best_distance = alert, distance
+        return best
+
+    def expire(self, now: Optional[float] = None):
+        """Close alerts whose cooldown ran out"""
+        now = time.time() if now is None else now
+        for camera_id, alerts in self._open.items():
+            live = [a for a in alerts if now - a.last_seen < self.cooldown]
+            self.closed += len(alerts) - len(live)
+            self._open[camera_id] = live
+
+    def get_stats(self) -> Dict:
+        emitted = sum(self.emitted.values())
+        return {
+            "open": sum(len(a) for a in self._open.values()),
+            "hits": self.hits,
+            "emitted": dict(self.emitted),
+            "closed": self.closed,
+            "hits_per_emit": round(self.hits / emitted, 1) if emitted else None,
+            "cooldown_s": self.cooldown,
+            "escalation_window_s": self.escalation_window
+        }
@@ -0,0 +1,87 @@
+"""
+Benchmark - Detector Backends
+Times every inference backend (PyTorch, ONNX Runtime FP32, ONNX Runtime
+int8) on the same frames and reports the mAP@0.5 drift of each one,
+scoring PyTorch's own detections as ground truth.
+
+Usage:
+    python benchmark_backends.py recording.mp4
+    python benchmark_backends.py recording.mp4 --backends torch,onnx-int8 --batch 4 --imgsz 480
+"""
+
+import argparse
+import os
+import sys
+import time
+
+from inference_backends import BACKENDS, DETECT_CONF, detection_map, load_frames
+from postprocess import result_arrays
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Detector backend benchmark (CPU)")
+    parser.add_argument("video", nargs="?", help="Recording to sample frames from (also used for int8 calibration)")
+    parser.add_argument("--backends", default=",".join(BACKENDS), help="Comma-separated backends")
+    parser.add_argument("--frames", type=int, default=64, help="Frames scored for mAP drift")
+    parser.add_argument("--batch", type=int, default=1, help="Frames per model call")
+    parser.add_argument("--imgsz", type=int, default=640, help="Inference input size")
+    parser.add_argument("--rounds", type=int, default=20, help="Timed calls per backend")
+    parser.add_argument("--warmup", type=int, default=3, help="Untimed calls per backend")
+    args = parser.parse_args()
+
+    if not args.video:
+        print("⚠️ No recording given - synthetic frames make mAP drift meaningless")
+    frames = load_frames(args.video, max(args.frames, args.batch))
+    if not frames:
+        print(f"❌ Could not read frames from {args.video}")
+        sys.exit(1)
+    batch = [frames[i % len(frames)] for i in range(args.batch)]
+
+    print("\n" + "=" * 72)
+    print("🛡️  AUTONOMOUS SHIELD - DETECTOR BACKEND BENCHMARK")
+    print("=" * 72)
+    print(f"CPU cores: {os.cpu_count()} | Batch: {args.batch} | imgsz: {args.imgsz} | "
+          f"Source: {args.video or 'synthetic'}\n")
+    print(f"{'Backend':>10} | {'ms/call':>8} | {'ms/frame':>8} | {'frames/s':>8} | {'mAP50':>6} | {'drift':>6}")
+    print("-" * 62)
+
+    reference = None
+    for name in [b.strip() for b in args.backends.split(",") if b.strip()]:
+        cls = BACKENDS.get(name)
+        if cls is None:
+            print(f"{name:>10} | unknown backend")
+            continue
+        backend = cls() if name == "torch" else cls(calibration=args.video)
+        try:
+            ready = backend.load()
+        except Exception as e:
+            print(f"{name:>10} | failed to load: {e}")
+            continue
+        if not ready:
+            print(f"{name:>10} | failed to load")
+            continue
+
+        for _ in range(args.warmup):
+            backend(batch, imgsz=args.imgsz)
+        t0 = time.perf_counter()
+        for _ in range(args.rounds):
+            backend(batch, imgsz=args.imgsz)
+        per_call = (time.perf_counter() - t0) / args.rounds
+
+        detections = [result_arrays(r) for r in
+                      backend.model(frames, verbose=False, conf=DETECT_CONF, imgsz=args.imgsz)]
+        if reference is None and name == "torch":
+            reference = detections
+        score = detection_map(reference, detections) if reference is not None else None
+        score_text = f"{score:>6.3f}" if score is not None else f"{'n/a':>6}"
+        drift_text = f"{1.0 - score:>6.3f}" if score is not None else f"{'n/a':>6}"
+        print(f"{name:>10} | {per_call * 1000:>8.1f} | {per_call * 1000 / args.batch:>8.1f} | "
+              f"{args.batch / per_call:>8.1f} | {score_text} | {drift_text}")
+
+    if reference is None:
+        print("\n⚠️ torch was not benchmarked first - mAP drift needs it as the reference")
+    print("=" * 72 + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Benchmark - Cross-Camera Batched Inference
+Measures YOLO throughput (frames/sec and frames/sec per core) on CPU for
+different batch sizes, using the same VisionEngine.detect_batch() path the
+inference scheduler uses.
+
+Usage:
+    python benchmark_batch_inference.py                 # synthetic frames
+    python benchmark_batch_inference.py recording.mp4   # frames from a recording (or image directory)
+    python benchmark_batch_inference.py --sizes 1,4,8 --rounds 20
+"""
+
+import argparse
+import os
+import sys
+import time
+
+from inference_backends import load_frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batched YOLO inference benchmark (CPU)")
+    parser.add_argument("video", nargs="?", help="Optional recording or image directory to sample frames from")
+    parser.add_argument("--sizes", default=",".join(str(i) for i in range(1, 17)),
+                        help="Comma-separated batch sizes (default: 1-16)")
+    parser.add_argument("--rounds", type=int, default=10, help="Timed batches per size")
+    parser.add_argument("--warmup", type=int, default=2, help="Untimed batches per size")
+    args = parser.parse_args()
+
+    try:
+        import torch
+        torch.set_num_threads(os.cpu_count() or 1)
+        threads = torch.get_num_threads()
+    except ImportError:
+        print("❌ PyTorch not installed")
+        sys.exit(1)
+
+    from vision_engine import VisionEngine
+    engine = VisionEngine(source=None)
+    if not engine.is_ready:
+        print("❌ YOLO model not available")
+        sys.exit(1)
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    frames = load_frames(args.video, max(sizes))
+    if not frames:
+        print(f"❌ Could not read frames from {args.video}")
+        sys.exit(1)
+    frames = [frames[i % len(frames)] for i in range(max(sizes))]
+
+    print("\n" + "=" * 60)
+    print("🛡️  AUTONOMOUS SHIELD - BATCHED INFERENCE BENCHMARK")
+    print("=" * 60)
+    print(f"CPU threads: {threads} | Rounds: {args.rounds} | Source: {args.video or 'synthetic'}\n")
+    print(f"{'Batch':>5} | {'ms/batch':>9} | {'ms/frame':>9} | {'frames/s':>9} | {'fps/core':>9}")
+    print("-" * 53)
+
+    baseline = None
+    for size in sizes:
+        jobs = [(frames[i], i, f"CAM_{i:02d}") for i in range(size)]
+        for _ in range(args.warmup):
+            engine.detect_batch(jobs)
+
+        t0 = time.perf_counter()
+        for _ in range(args.rounds):
+            engine.detect_batch(jobs)
+        elapsed = time.perf_counter() - t0
+
+        per_batch = elapsed / args.rounds
+        fps = size / per_batch
+        baseline = baseline or fps
+        print(f"{size:>5} | {per_batch * 1000:>9.1f} | {per_batch * 1000 / size:>9.1f} | "
+              f"{fps:>9.1f} | {fps / threads:>9.2f}  (x{fps / baseline:.2f})")
+
+    print("=" * 60 + "\n")
+
+
+if __name__ == "__main__":
+    main()
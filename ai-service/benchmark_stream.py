@@ -0,0 +1,203 @@
+"""
+Benchmark - WebSocket Stream Encoding and Fan-Out
+Compares the JSON frame_analysis message with the binary encoding from
+stream_codec.py: bytes per frame and serialization CPU per frame, on
+synthetic tracked detections moving across a 640x480 frame. Every binary
+frame is decoded again and checked against the JSON boxes.
+
+The fan-out table publishes the same frames to 1, 10 and 100 in-memory
+clients through ConnectionManager, once with the old per-client send_json
+and once with publish_frame (serialize once, same payload for everyone).
+
+Usage:
+    python benchmark_stream.py                        # 10 objects, 300 frames
+    python benchmark_stream.py --objects 1,10,40 --frames 1000
+    python benchmark_stream.py --clients 1,10,100
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import random
+import sys
+import time
+from datetime import datetime
+
+from client_stream import ConnectionManager
+from mock_fusion import MockFusionEngine
+from stream_codec import MSGPACK_AVAILABLE, BinaryFrameDecoder, BinaryFrameEncoder
+
+FRAME_SIZE = (640, 480)
+LABELS = ["PERSON", "CAR", "TRUCK", "BACKPACK", "KNIFE"]
+
+
+def make_frames(objects: int, count: int, seed: int = 0):
+    """frame_analysis messages with `objects` tracked detections drifting a few pixels per frame"""
+    rng = random.Random(seed)
+    fusion = MockFusionEngine()
+    tracks = [[rng.randint(0, 500), rng.randint(0, 350), rng.randint(40, 120), rng.randint(60, 160),
+               rng.choice(LABELS)] for _ in range(objects)]
+    frames = []
+    for frame_id in range(1, count + 1):
+        detections = []
+        for track_id, t in enumerate(tracks, start=1):
+            t[0] = max(0, min(FRAME_SIZE[0] - t[2], t[0] + rng.randint(-4, 4)))
+            t[1] = max(0, min(FRAME_SIZE[1] - t[3], t[1] + rng.randint(-3, 3)))
+            x, y, w, h, label = t
+            threat = "critical" if label == "KNIFE" else "normal"
+            detections.append({
+                "id": f"trk_CAM_1_{track_id}",
+                "camera_id": "CAM_1",
+                "class": label.lower(),
+                "label": label,
+                "identity": None,
+                "face_matches": [],
+                "face_checked": label == "PERSON",
+                "confidence": round(rng.uniform(0.5, 0.99), 2),
+                "bbox": {"x": x, "y": y, "width": w, "height": h},
+                "bbox_normalized": [x / FRAME_SIZE[0], y / FRAME_SIZE[1], w / FRAME_SIZE[0], h / FRAME_SIZE[1]],
+                "threat_level": threat,
+                "frame_id": frame_id,
+                "timestamp": datetime.now().isoformat(),
+                "track_id": track_id,
+                "confirmed": True,
+                "interpolated": False,
+                "identity_score": None
+            })
+        frames.append({
+            "type": "frame_analysis",
+            "camera_id": "CAM_1",
+            "frame_id": frame_id,
+            "detections": detections,
+            "mode": "real",
+            "timestamp": datetime.now().isoformat(),
+            "fusion": fusion.update(),
+            "predictions": None
+        })
+    return frames
+
+
+def run(objects: int, count: int):
+    frames = make_frames(objects, count)
+
+    t0 = time.perf_counter()
+    json_sizes = [len(json.dumps(f)) for f in frames]
+    json_time = time.perf_counter() - t0
+
+    encoder = BinaryFrameEncoder()
+    t0 = time.perf_counter()
+    encoded = [encoder.encode(f, FRAME_SIZE) for f in frames]
+    binary_time = time.perf_counter() - t0
+
+    decoder = BinaryFrameDecoder()
+    for frame, (payload, _) in zip(frames, encoded):
+        decoded = decoder.decode(payload)
+        if [d["bbox"] for d in decoded["detections"]] != [d["bbox"] for d in frame["detections"]]:
+            print(f"❌ Round trip mismatch at frame {frame['frame_id']}")
+            sys.exit(1)
+
+    json_bytes = sum(json_sizes) / count
+    binary_bytes = sum(len(p) for p, _ in encoded) / count
+    keyframes = sum(1 for _, key in encoded if key)
+    print(f"{objects:>7} | {json_bytes:>10.0f} | {binary_bytes:>10.0f} | {binary_bytes / json_bytes:>6.1%} | "
+          f"{json_time / count * 1e6:>9.1f} | {binary_time / count * 1e6:>9.1f} | {keyframes:>9}")
+
+
+class NullWebSocket:
+    """Accepts everything instantly; send_json serializes like Starlette does"""
+
+    def __init__(self):
+        self.bytes_sent = 0
+
+    async def accept(self):
+        pass
+
+    async def send_json(self, data):
+        self.bytes_sent += len(json.dumps(data, separators=(",", ":"), ensure_ascii=False))
+
+    async def send_text(self, data):
+        self.bytes_sent += len(data)
+
+    async def send_bytes(self, data):
+        self.bytes_sent += len(data)
+
+    async def close(self, code=1000):
+        pass
+
+
+async def fan_out(frames, clients: int, mode: str) -> float:
+    """CPU seconds to publish and drain every frame to `clients` clients"""
+    manager = ConnectionManager(queue_size=len(frames))
+    sockets = [NullWebSocket() for _ in range(clients)]
+    encoding = "msgpack" if mode == "msgpack" else "json"
+    quiet = contextlib.redirect_stdout(io.StringIO())  # no per-client connect / disconnect logs
+    with quiet:
+        for ws in sockets:
+            await manager.connect(ws, "CAM_1", encoding)
+    sessions = list(manager.sessions.values())
+
+    t0 = time.process_time()
+    for frame in frames:
+        if mode == "per-client":
+            for session in sessions:
+                session.send(frame)  # dict -> send_json in every writer
+        else:
+            manager.publish_frame("CAM_1", frame, FRAME_SIZE)
+        await asyncio.sleep(0)  # let the writers drain
+    while any(s.get_stats()["queued"] for s in sessions):
+        await asyncio.sleep(0)
+    elapsed = time.process_time() - t0
+
+    with quiet:
+        for ws in sockets:
+            manager.disconnect(ws)
+    return elapsed
+
+
+def run_fan_out(clients: int, frames):
+    count = len(frames)
+    per_client = asyncio.run(fan_out(frames, clients, "per-client"))
+    once = asyncio.run(fan_out(frames, clients, "once"))
+    row = (f"{clients:>7} | {per_client / count * 1e3:>12.3f} | {once / count * 1e3:>12.3f} | "
+           f"{per_client / once:>7.1f}x")
+    if MSGPACK_AVAILABLE:
+        binary = asyncio.run(fan_out(frames, clients, "msgpack"))
+        row += f" | {binary / count * 1e3:>12.3f}"
+    print(row)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON vs binary stream encoding benchmark")
+    parser.add_argument("--objects", default="10", help="Comma-separated detections per frame")
+    parser.add_argument("--frames", type=int, default=300, help="Frames per run")
+    parser.add_argument("--clients", default="1,10,100", help="Comma-separated client counts for the fan-out table")
+    args = parser.parse_args()
+    objects = [int(o) for o in args.objects.split(",") if o.strip()]
+
+    print("\n" + "=" * 60)
+    print("🛡️  AUTONOMOUS SHIELD - STREAM ENCODING BENCHMARK")
+    print("=" * 60)
+    print(f"Frames: {args.frames} | Frame size: {FRAME_SIZE[0]}x{FRAME_SIZE[1]}\n")
+    if MSGPACK_AVAILABLE:
+        print(f"{'Objects':>7} | {'JSON B/fr':>10} | {'bin B/fr':>10} | {'ratio':>6} | "
+              f"{'JSON us':>9} | {'bin us':>9} | {'keyframes':>9}")
+        print("-" * 76)
+        for count in objects:
+            run(count, args.frames)
+    else:
+        print("⚠️ msgpack not installed - skipping the binary encoding table")
+
+    frames = make_frames(objects[-1], args.frames)
+    print(f"\nFan-out, {objects[-1]} objects per frame (CPU ms per frame, all clients):")
+    header = f"{'Clients':>7} | {'per-client':>12} | {'once':>12} | {'speedup':>8}"
+    print(header + (f" | {'once (bin)':>12}" if MSGPACK_AVAILABLE else ""))
+    print("-" * (len(header) + (15 if MSGPACK_AVAILABLE else 0)))
+    for clients in (int(c) for c in args.clients.split(",") if c.strip()):
+        run_fan_out(clients, frames)
+    print()
+
+
+if __name__ == "__main__":
+    main()
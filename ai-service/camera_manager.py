@@ -0,0 +1,284 @@
+"""
+Camera Manager - Multi-Camera Capture
+Keeps one ThreadedCamera running per active row in the `cameras` table and
+hands channels to the shared inference engine in fair round-robin order.
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Union
+
+from motion_gate import validate_config
+from vision_engine import CameraChannel
+
+# Only camera rows in these states are captured (OFFLINE - the column default -
+# MAINTENANCE, DISABLED etc. are not)
+CAPTURE_STATUSES = {s.strip().upper() for s in os.getenv("CAMERA_CAPTURE_STATUSES", "LIVE").split(",") if s.strip()}
+
+# Per-camera motion-gate thresholds live in `settings` under this key prefix
+MOTION_SETTING_PREFIX = "motion_gate."
+
+
+class CameraManager:
+    """
+    Registry of live CameraChannels.
+    sync_from_db() reconciles running channels with the database, so cameras
+    can be added, removed or re-pointed without restarting the service.
+    """
+
+    def __init__(self, fallback_source: Optional[Union[int, str]] = None,
+                 fallback_camera_id: str = "CAM_MAIN", shared_frames: bool = False):
+        self.channels: Dict[str, CameraChannel] = {}
+        # Capture into shared memory so inference worker processes read frames in place
+        self.shared_frames = shared_frames
+        self.primary_camera_id: Optional[str] = None
+        self.fallback_source = fallback_source
+        self.fallback_camera_id = fallback_camera_id
+        self._cursor = 0
+        self._lock = asyncio.Lock()
+        # Set (from capture threads) whenever any camera commits a frame
+        self._frame_event = asyncio.Event()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # Same signal for thread consumers (the staged inference pipeline)
+        self.frame_signal = threading.Event()
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    def add_camera(self, camera_id: str, source: Union[int, str],
+                   motion_config: Optional[Dict] = None) -> CameraChannel:
+        existing = self.channels.get(camera_id)
+        if existing:
+            if str(existing.source) == str(source):
+                return existing
+            # Stream URL changed - restart capture on the new source
+            self.remove_camera(camera_id)
+
+        channel = CameraChannel(camera_id, source, motion_config=motion_config,
+                                shared_frames=self.shared_frames)
+        channel.camera.add_frame_listener(self._on_frame)
+        channel.start()
+        self.channels[camera_id] = channel
+        print(f"➕ Camera attached: {camera_id} ({source})")
+        return channel
+
+    def _on_frame(self, seq: int):
+        """Capture-thread hook: wake the scheduler (coalesced per loop turn)"""
+        self.frame_signal.set()
+        loop = self._loop
+        if loop is not None and not self._frame_event.is_set():
+            try:
+                loop.call_soon_threadsafe(self._frame_event.set)
+            except RuntimeError:
+                pass  # loop closed during shutdown
+
+    def remove_camera(self, camera_id: str):
+        channel = self.channels.pop(camera_id, None)
+        if channel:
+            channel.stop()
+            print(f"➖ Camera detached: {camera_id}")
+        if self.primary_camera_id == camera_id:
+            self.primary_camera_id = next(iter(self.channels), None)
+
+    def stop_all(self):
+        for camera_id in list(self.channels):
+            self.remove_camera(camera_id)
+
+    async def sync_from_db(self) -> Dict:
+        """Start/stop capture threads to match the active rows in `cameras`"""
+        from database import AsyncSessionLocal, Camera, Setting
+        from sqlalchemy import select
+
+        self._loop = asyncio.get_running_loop()
+        async with self._lock:
+            async with AsyncSessionLocal() as db:
+                rows = (await db.execute(select(Camera))).scalars().all()
+                settings = (await db.execute(
+                    select(Setting).where(Setting.key.like(f"{MOTION_SETTING_PREFIX}%"))
+                )).scalars().all()
+
+            motion_configs = {}
+            for setting in settings:
+                try:
+                    motion_configs[setting.key[len(MOTION_SETTING_PREFIX):]] = validate_config(json.loads(setting.value))
+                except (TypeError, ValueError) as e:
+                    print(f"⚠️ Ignoring invalid setting {setting.key}: {e}")
+
+            wanted = {}
+            primary = None
+            for cam in rows:
+                if not cam.stream_url or (cam.status or "").upper() not in CAPTURE_STATUSES:
+                    continue
+                wanted[cam.camera_id] = cam.stream_url
+                if cam.is_primary and primary is None:
+                    primary = cam.camera_id
+
+            # Single-camera deployments with an empty registry keep working
+            if not wanted and self.fallback_source is not None:
+                wanted[self.fallback_camera_id] = self.fallback_source
+
+            added = [cid for cid in wanted if cid not in self.channels
+                     or str(self.channels[cid].source) != str(wanted[cid])]
+            removed = [cid for cid in self.channels if cid not in wanted]
+
+            # Detach on the loop, but join capture threads off the event loop
+            stale = [self.channels.pop(cid) for cid in removed + added if cid in self.channels]
+            if stale:
+                await asyncio.to_thread(self._stop_channels, stale)
+            for cid in added:
+                self.add_camera(cid, wanted[cid], motion_config=motion_configs.get(cid))
+            for cid, config in motion_configs.items():
+                if cid in self.channels and cid not in added:
+                    self.channels[cid].motion_gate.configure(**config)
+
+            self.primary_camera_id = primary or (
+                self.primary_camera_id if self.primary_camera_id in self.channels
+                else next(iter(self.channels), None)
+            )
+
+        if added or removed:
+            print(f"🎥 Camera sync: +{len(added)} -{len(removed)} (active: {len(self.channels)})")
+        return {"added": added, "removed": removed, "active": list(self.channels)}
+
+    async def configure_motion(self, camera_id: str, config: Dict) -> Optional[Dict]:
+        """Apply motion-gate thresholds to a live camera and persist them"""
+        from database import AsyncSessionLocal, Setting
+        from sqlalchemy import select
+
+        channel = self.channels.get(camera_id)
+        if channel is None:
+            return None
+        applied = channel.motion_gate.configure(**config)
+
+        key = f"{MOTION_SETTING_PREFIX}{camera_id}"
+        async with AsyncSessionLocal() as db:
+            setting = (await db.execute(select(Setting).where(Setting.key == key))).scalar_one_or_none()
+            if setting is None:
+                setting = Setting(key=key, type="json", category="detection",
+                                  description=f"Motion gate thresholds for {camera_id}")
+                db.add(setting)
+            setting.value = json.dumps(applied)
+            await db.commit()
+        return applied
+
+    @staticmethod
+    def _stop_channels(channels: List[CameraChannel]):
+        for channel in channels:
+            channel.stop()
+            print(f"➖ Camera detached: {channel.camera_id}")
+
+    # ------------------------------------------------------------------
+    # Scheduling
+    # ------------------------------------------------------------------
+
+    def get(self, camera_id: Optional[str] = None) -> Optional[CameraChannel]:
+        if camera_id is None:
+            camera_id = self.primary_camera_id
+        return self.channels.get(camera_id) if camera_id else None
+
+    def next_ready(self, busy: Iterable[str] = ()) -> Optional[CameraChannel]:
+        """
+        Round-robin pick of the next channel holding an unprocessed frame.
+        The cursor advances past the chosen camera, so a fast feed cannot
+        starve slower ones.
+        """
+        channels = list(self.channels.values())  # may be called off the event loop
+        n = len(channels)
+        for i in range(n):
+            idx = (self._cursor + i) % n
+            channel = channels[idx]
+            if channel.camera_id in busy or not channel.has_new_frame():
+                continue
+            self._cursor = idx + 1
+            return channel
+        return None
+
+    async def wait_for_frames(self, timeout: Optional[float] = None) -> bool:
+        """
+        Sleep until any camera commits a frame after the last next_batch()
+        scan. Returns False on timeout.
+        """
+        self._loop = asyncio.get_running_loop()
+        try:
+            await asyncio.wait_for(self._frame_event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def next_batch(self, max_size: int, max_wait: float,
+                         busy: Iterable[str] = ()) -> List[CameraChannel]:
+        """
+        Collect up to max_size ready channels in round-robin order.
+        Once the first channel is ready, wait at most max_wait seconds for
+        other cameras to deliver a frame before returning a partial batch.
+        """
+        # Clear before scanning so frames landing after the scan re-arm the event
+        self._frame_event.clear()
+        first = self.next_ready(busy)
+        if first is None:
+            return []
+
+        batch = [first]
+        taken = set(busy) | {first.camera_id}
+        deadline = time.monotonic() + max_wait
+        while len(batch) < max_size:
+            self._frame_event.clear()
+            channel = self.next_ready(taken)
+            if channel is not None:
+                batch.append(channel)
+                taken.add(channel.camera_id)
+                continue
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            await self.wait_for_frames(remaining)
+        return batch
+
+    def collect_batch(self, max_size: int, max_wait: float, busy: Iterable[str] = (),
+                      timeout: float = 1.0) -> List[CameraChannel]:
+        """
+        Blocking next_batch() for worker threads: sleeps on frame_signal
+        (up to timeout) until some channel is ready, then waits at most
+        max_wait for more cameras to fill the batch.
+        """
+        self.frame_signal.clear()
+        first = self.next_ready(busy)
+        if first is None:
+            self.frame_signal.wait(timeout)
+            return []
+
+        batch = [first]
+        taken = set(busy) | {first.camera_id}
+        deadline = time.monotonic() + max_wait
+        while len(batch) < max_size:
+            self.frame_signal.clear()
+            channel = self.next_ready(taken)
+            if channel is not None:
+                batch.append(channel)
+                taken.add(channel.camera_id)
+                continue
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            self.frame_signal.wait(remaining)
+        return batch
+
+    def get_stats(self) -> List[Dict]:
+        return [
+            {
+                "camera_id": ch.camera_id,
+                "source": str(ch.source),
+                "status": ch.camera.status,
+                "fps": ch.camera.fps,
+                "frames": ch.camera.frame_count,
+                "ring": ch.camera.ring.get_stats(),
+                "motion": ch.motion_gate.get_stats(),
+                "tracks": ch.tracker.get_stats(),
+                "primary": ch.camera_id == self.primary_camera_id
+            }
+            for ch in self.channels.values()
+        ]
@@ -0,0 +1,394 @@
+"""
+Client Stream - Per-Client WebSocket Send Queues
+Every WebSocket client gets a bounded send queue drained by its own writer
+task, so one operator on a bad link never delays anybody else. Frame
+updates are droppable: when a client falls behind, its oldest queued frame
+is discarded (the newest wins). Critical alerts are never dropped; a client
+whose queue lags more than CLIENT_MAX_LAG seconds, or piles up more than
+CLIENT_MAX_PENDING messages, is disconnected instead.
+
+Messages are serialized once, not once per client: publish_frame() and
+broadcast() encode each message a single time per encoding (JSON text via
+orjson when installed, or binary frames from stream_codec.py) and queue
+the same immutable str / bytes for every subscriber. Each client's topics
+(stream_topics.py) are applied before serialization; clients with equal
+topics share a payload.
+"""
+
+import asyncio
+import itertools
+import json
+import os
+import time
+from collections import Counter, deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from fastapi import WebSocket
+
+from stream_codec import BinaryFrameEncoder, embed_sensors
+from stream_topics import Subscription
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# Configuration (overridable via environment)
+CLIENT_QUEUE_SIZE = int(os.getenv("CLIENT_QUEUE_SIZE", "4"))          # queued frame updates per client
+CLIENT_MAX_PENDING = int(os.getenv("CLIENT_MAX_PENDING", "256"))      # queued messages of any kind before disconnect
+CLIENT_MAX_LAG = float(os.getenv("CLIENT_MAX_LAG", "10.0"))           # seconds the oldest queued message may wait
+CLIENT_SEND_TIMEOUT = float(os.getenv("CLIENT_SEND_TIMEOUT", "10.0"))  # seconds one send may block
+
+# WebSocket close code for clients that cannot keep up ("try again later")
+SLOW_CLIENT_CLOSE_CODE = 1013
+
+
+def _json_default(value: Any):
+    # numpy scalars / arrays (fusion payloads, detector outputs)
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def encode_json(message: Any) -> str:
+    """Serialize a message for text frames (same output as send_json, faster with orjson)"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(message, default=_json_default,
+                            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY).decode()
+    return json.dumps(message, separators=(",", ":"), ensure_ascii=False, default=_json_default)
+
+
+class ClientSession:
+    """
+    One connected WebSocket: a queue of (critical, enqueued_at, message,
+    marks) and the writer task that drains it. send() never blocks the
+    caller; `marks` ({channel: tick seq}) are recorded in `received` only
+    once the message has actually been sent.
+    """
+
+    def __init__(self, websocket: WebSocket, client_id: int, queue_size: int = CLIENT_QUEUE_SIZE,
+                 default_camera: Optional[str] = None, encoding: str = "json",
+                 subscription: Optional[Subscription] = None):
+        self.websocket = websocket
+        self.client_id = client_id
+        self.queue_size = max(1, queue_size)
+        self.default_camera = default_camera  # frames come from here unless topics name cameras
+        self.encoding = encoding              # frame encoding negotiated at connect
+        self.subscription = subscription or Subscription()
+        self.cameras = self.subscription.frame_cameras(default_camera)
+        self.has_detections = set()  # cameras whose last frame sent here had detections
+        self.received: Dict[str, int] = {}  # channel -> last sensor tick seq embedded in a sent frame
+        self.connected_at = time.time()
+        self.closed = False
+        self.evicted = False  # disconnected for lagging
+        self.close_reason: Optional[str] = None
+        self.sent = 0
+        self.dropped = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self._queue: Deque[Tuple[bool, float, Any, Optional[Dict[str, int]]]] = deque()
+        self._frames = 0  # droppable messages currently queued
+        self._wakeup = asyncio.Event()
+        self._writer: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._writer = asyncio.create_task(self._drain())
+
+    def send(self, message: Any, critical: bool = False, marks: Optional[Dict[str, int]] = None) -> bool:
+        """
+        Queue a message. Frame updates push out the oldest queued frame when
+        the queue is full; critical messages always go in. Returns False if
+        the client is closed (or was just disconnected for lagging).
+        """
+        if self.closed:
+            return False
+        now = time.time()
+        if not critical and self._frames >= self.queue_size:
+            self._drop_oldest_frame()
+        self._queue.append((critical, now, message, marks))
+        if not critical:
+            self._frames += 1
+
+        oldest = self._queue[0][1]
+        if len(self._queue) > CLIENT_MAX_PENDING or now - oldest > CLIENT_MAX_LAG:
+            self.evict(f"too slow ({len(self._queue)} queued, {now - oldest:.1f}s behind)")
+            return False
+        self._wakeup.set()
+        return True
+
+    def _drop_oldest_frame(self):
+        for i, (critical, _, _, _) in enumerate(self._queue):
+            if not critical:
+                del self._queue[i]
+                self._frames -= 1
+                self.dropped += 1
+                return
+
+    async def _drain(self):
+        try:
+            while not self.closed:
+                if not self._queue:
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                    continue
+                critical, enqueued_at, message, marks = self._queue.popleft()
+                if not critical:
+                    self._frames -= 1
+                self.last_lag = time.time() - enqueued_at
+                self.max_lag = max(self.max_lag, self.last_lag)
+                try:
+                    await asyncio.wait_for(self._send(message), CLIENT_SEND_TIMEOUT)
+                except asyncio.TimeoutError:
+                    self.evict(f"send blocked for {CLIENT_SEND_TIMEOUT:.0f}s")
+                    return
+                except Exception as e:
+                    # Client went away - the endpoint notices via `closed`
+                    self.closed = True
+                    self.close_reason = self.close_reason or f"send failed: {e}"
+                    return
+                self.sent += 1
+                if marks:
+                    self.received.update(marks)
+        except asyncio.CancelledError:
+            pass
+
+    def _send(self, message: Any):
+        if isinstance(message, bytes):
+            return self.websocket.send_bytes(message)
+        if isinstance(message, str):
+            return self.websocket.send_text(message)
+        return self.websocket.send_json(message)
+
+    def evict(self, reason: str):
+        """Stop sending and close the socket with SLOW_CLIENT_CLOSE_CODE"""
+        if self.closed:
+            return
+        self.closed = True
+        self.evicted = True
+        self.close_reason = reason
+        self._queue.clear()
+        self._frames = 0
+        self._wakeup.set()
+        print(f"🐢 Disconnecting client {self.client_id}: {reason}")
+        asyncio.create_task(self._close_socket())
+
+    async def _close_socket(self):
+        try:
+            await asyncio.wait_for(self.websocket.close(code=SLOW_CLIENT_CLOSE_CODE), CLIENT_SEND_TIMEOUT)
+        except Exception:
+            pass  # already closed, or the link is dead anyway
+
+    def stop(self):
+        self.closed = True
+        self._wakeup.set()
+        if self._writer is not None:
+            self._writer.cancel()
+
+    def get_stats(self) -> Dict:
+        now = time.time()
+        return {
+            "client": self.client_id,
+            "connected_s": round(now - self.connected_at, 1),
+            "cameras": sorted(self.cameras),
+            "encoding": self.encoding,
+            "topics": self.subscription.describe(),
+            "queued": len(self._queue),
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "lag_ms": round(self.last_lag * 1000, 1),
+            "max_lag_ms": round(self.max_lag * 1000, 1),
+            "oldest_queued_ms": round((now - self._queue[0][1]) * 1000, 1) if self._queue else 0.0,
+            "closed": self.closed,
+            "evicted": self.evicted,
+            "close_reason": self.close_reason
+        }
+
+
+class ConnectionManager:
+    """
+    Registry of ClientSessions. broadcast() and publish_frame() serialize
+    once and only enqueue, so publishing costs one encode per encoding plus
+    a queue append per client, with one slow client or none.
+    """
+
+    def __init__(self, queue_size: int = CLIENT_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.sessions: Dict[WebSocket, ClientSession] = {}
+        self.slow_disconnects = 0
+        self.serialized = 0   # messages encoded
+        self.delivered = 0    # payloads queued to clients
+        self._encoders: Dict[Tuple, BinaryFrameEncoder] = {}  # binary frame state per (camera, topics)
+        self._ids = itertools.count(1)
+
+    @property
+    def active_connections(self) -> List[WebSocket]:
+        return list(self.sessions)
+
+    async def connect(self, websocket: WebSocket, default_camera: Optional[str] = None,
+                      encoding: str = "json", subscription: Optional[Subscription] = None) -> ClientSession:
+        await websocket.accept()
+        session = ClientSession(websocket, next(self._ids), self.queue_size, default_camera,
+                                encoding, subscription)
+        session.start()
+        self.sessions[websocket] = session
+        self._request_keyframes(session)
+        print(f"✅ Client connected. Total: {len(self.sessions)}")
+        return session
+
+    def subscribe(self, session: ClientSession, subscription: Subscription):
+        """Replace a client's topics"""
+        session.subscription = subscription
+        session.cameras = subscription.frame_cameras(session.default_camera)
+        session.has_detections.clear()
+        self._prune_encoders()
+        self._request_keyframes(session)
+
+    def _prune_encoders(self):
+        """Forget binary frame state no client needs any more"""
+        live = {(camera_id, s.subscription.frame_key) for s in self.sessions.values()
+                if s.encoding == "msgpack" for camera_id in s.cameras}
+        for key in [k for k in self._encoders if k not in live]:
+            del self._encoders[key]
+
+    def _request_keyframes(self, session: ClientSession):
+        if session.encoding != "msgpack":
+            return
+        for camera_id in session.cameras:
+            encoder = self._encoders.get((camera_id, session.subscription.frame_key))
+            if encoder is not None:
+                # Its deltas would refer to a keyframe this client never got
+                encoder.request_keyframe()
+
+    def disconnect(self, websocket: WebSocket):
+        session = self.sessions.pop(websocket, None)
+        if session is None:
+            return
+        if session.evicted:
+            self.slow_disconnects += 1
+        session.stop()
+        self._prune_encoders()
+        print(f"❌ Client disconnected. Total: {len(self.sessions)}")
+
+    def broadcast(self, message: Any, critical: bool = False):
+        """Queue a message for every client (critical ones are never dropped)"""
+        sessions = list(self.sessions.values())
+        if not sessions:
+            return
+        payload = encode_json(message) if isinstance(message, dict) else message
+        self.serialized += 1
+        for session in sessions:
+            session.send(payload, critical=critical)
+        self.delivered += len(sessions)
+
+    def publish_alert(self, camera_id: str, det: Dict, message: Dict) -> int:
+        """Queue an alert (never dropped) for the clients whose topics match the detection"""
+        sessions = [s for s in self.sessions.values()
+                    if not s.closed and s.subscription.wants_alert(camera_id, det)]
+        if sessions:
+            payload = encode_json(message)
+            self.serialized += 1
+            for session in sessions:
+                session.send(payload, critical=True)
+            self.delivered += len(sessions)
+        return len(sessions)
+
+    def subscribers(self, camera_id: str) -> List[ClientSession]:
+        return [s for s in self.sessions.values()
+                if camera_id in s.cameras and s.subscription.frames and not s.closed]
+
+    def publish_frame(self, camera_id: str, message: Dict,
+                      frame_size: Optional[Tuple[int, int]] = None,
+                      ticks: Optional[Dict[str, int]] = None) -> int:
+        """
+        Filter one frame_analysis message per distinct topic set, serialize
+        each view once per encoding in use and queue the same payload for
+        every client of the camera that shares it. Frames with nothing for
+        a client are skipped, except keyframes and the first empty frame
+        after detections (so the client can clear its overlay).
+
+        ticks ({channel: seq}) names embedded sensor values that are sent
+        once per tick rather than in every frame: a client gets them in its
+        frames until one carrying that seq has actually been sent to it, so
+        a dropped frame or a late join does not lose the tick.
+        Returns the number of clients it was queued for.
+        """
+        ticks = ticks or {}
+        base = dict(message, **{channel: None for channel in ticks}) if ticks else message
+        payloads: Dict[Tuple, Tuple[Any, bool, bool]] = {}
+        queued = 0
+        for session in self.subscribers(camera_id):
+            topics = session.subscription.frame_key
+            key = (session.encoding, topics)
+            if key not in payloads:
+                frame, empty = session.subscription.frame_message(base)
+                if session.encoding == "msgpack":
+                    encoder = self._encoders.get((camera_id, topics))
+                    if encoder is None:
+                        encoder = self._encoders[(camera_id, topics)] = BinaryFrameEncoder()
+                    payload, keyframe = encoder.encode(frame, frame_size)
+                else:
+                    payload, keyframe = encode_json(frame), False
+                payloads[key] = (payload, keyframe, empty)
+                self.serialized += 1
+            payload, keyframe, empty = payloads[key]
+
+            missing = tuple(channel for channel, seq in ticks.items()
+                            if session.subscription.embeds(channel) and session.received.get(channel) != seq)
+            marks = None
+            if missing:
+                tick_key = key + (missing,)
+                if tick_key not in payloads:
+                    # Same frame plus the tick values (binary: the encoder state is not advanced twice)
+                    frame, tick_empty = session.subscription.frame_message(
+                        dict(base, **{channel: message[channel] for channel in missing}))
+                    tick_payload = embed_sensors(payload, frame) if session.encoding == "msgpack" \
+                        else encode_json(frame)
+                    payloads[tick_key] = (tick_payload, keyframe, tick_empty)
+                    self.serialized += 1
+                payload, keyframe, empty = payloads[tick_key]
+                marks = {channel: ticks[channel] for channel in missing}
+            if empty and not keyframe and camera_id not in session.has_detections:
+                continue
+            if empty:
+                session.has_detections.discard(camera_id)
+            else:
+                session.has_detections.add(camera_id)
+            # Later deltas refer to the keyframe, so it must not be dropped
+            session.send(payload, critical=keyframe, marks=marks)
+            queued += 1
+        self.delivered += queued
+        return queued
+
+    def publish_channel(self, channel: str, build: Callable[[], Dict],
+                        sessions: Optional[List[ClientSession]] = None) -> int:
+        """
+        Queue a fusion / predictions message for the clients (all, or the
+        given ones) subscribed to the channel whose own rate allows one now.
+        build() runs (and its result is serialized) at most once, and only
+        if someone is due.
+        """
+        now = time.time()
+        candidates = self.sessions.values() if sessions is None else sessions
+        sessions = [s for s in candidates if not s.closed and s.subscription.due(channel, now)]
+        if sessions:
+            payload = encode_json(build())
+            self.serialized += 1
+            for session in sessions:
+                session.send(payload)
+            self.delivered += len(sessions)
+        return len(sessions)
+
+    def get_stats(self) -> Dict:
+        sessions = [s.get_stats() for s in self.sessions.values()]
+        return {
+            "connected": len(sessions),
+            "per_camera": dict(Counter(camera for s in sessions for camera in s["cameras"])),
+            "dropped": sum(s["dropped"] for s in sessions),
+            "slow_disconnects": self.slow_disconnects,
+            "serializer": "orjson" if ORJSON_AVAILABLE else "json",
+            "serialized": self.serialized,
+            "delivered": self.delivered,
+            "max_lag_ms": max((s["max_lag_ms"] for s in sessions), default=0.0),
+            "clients": sessions
+        }
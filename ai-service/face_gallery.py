@@ -0,0 +1,496 @@
+"""
+Face Gallery - Vectorized Suspect Matching
+Known-face embeddings are kept as one L2-normalized matrix, so every face in
+a frame is matched against every suspect with a single (faces x gallery)
+matrix multiply.
+
+The matrix is persisted as a memory-mapped file plus a small JSON id table,
+so a restart (or a worker process) opens the gallery without running the
+face model, and suspects are enrolled / removed one row at a time.
+
+Rows never move while readers may be using them: a removed suspect's slot
+is tombstoned, and slots are only packed when the matrix is rewritten into
+a new data file that the next snapshot points to.
+"""
+
+import json
+import os
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+DEFAULT_SUSPECT_PRIORITY = "high"
+
+
+def parse_thresholds(spec: str) -> Dict[str, float]:
+    """'critical:0.45,high:0.5' -> {'critical': 0.45, 'high': 0.5}"""
+    thresholds = {}
+    for item in spec.split(","):
+        if ":" in item:
+            priority, value = item.split(":", 1)
+            thresholds[priority.strip().lower()] = float(value)
+    return thresholds
+
+
+# Configuration (overridable via environment)
+FACE_MATCH_TOP_K = int(os.getenv("FACE_MATCH_TOP_K", "3"))
+# Cosine similarity a face needs to match a suspect, by suspect priority
+FACE_MATCH_THRESHOLDS = parse_thresholds(
+    os.getenv("FACE_MATCH_THRESHOLDS", "critical:0.45,high:0.5,medium:0.55")
+)
+FACE_GALLERY_DIR = os.getenv("FACE_GALLERY_DIR", "assets/face_gallery")
+FACE_GALLERY_DTYPE = os.getenv("FACE_GALLERY_DTYPE", "float32")  # float32 | float16 (half the size)
+FACE_MATCH_CHUNK = int(os.getenv("FACE_MATCH_CHUNK", "16384"))    # gallery rows per matmul
+
+FACE_GALLERY_COMPACT_OPS = int(os.getenv("FACE_GALLERY_COMPACT_OPS", "1000"))  # journal ops before a snapshot
+
+INDEX_FILE = "index.json"        # id table snapshot
+JOURNAL_FILE = "journal.jsonl"   # id table changes since the snapshot
+DATA_FILE = "embeddings.dat"     # (capacity, dim) embedding matrix of pre-tombstone snapshots
+
+
+class FaceGallery:
+    """
+    Suspect embeddings plus an id table (key, name, suspect_id, priority)
+    with one row per suspect. Keys are the suspect image filenames.
+
+    On disk the matrix is written in place; id table changes are appended
+    to a journal and folded into a snapshot every FACE_GALLERY_COMPACT_OPS
+    operations, so enrolling or removing one suspect costs O(1). A removed
+    row stays in place as a tombstone (it never matches) until that
+    snapshot packs the matrix into a new data file, so a reader that has
+    not replayed the journal yet never sees one suspect's embedding under
+    another suspect's name.
+
+    directory=None keeps everything in memory. readonly=True opens an
+    existing store for matching only (worker processes) - call refresh()
+    to pick up changes the writer has made since.
+    """
+
+    def __init__(self, directory: Optional[str] = None, dtype: str = FACE_GALLERY_DTYPE,
+                 readonly: bool = False, thresholds: Optional[Dict[str, float]] = None):
+        self.directory = directory
+        self.dtype = np.dtype(dtype)
+        self.readonly = readonly
+        self.thresholds = thresholds or FACE_MATCH_THRESHOLDS
+        self.dim: Optional[int] = None
+        self.version = 0  # bumped on every id table change (identity caches watch it)
+        self._lock = threading.RLock()
+        self._reset()
+
+        if directory:
+            if not readonly:
+                os.makedirs(directory, exist_ok=True)
+            self._load()
+
+    def _reset(self):
+        self.count = 0       # rows in use, tombstones included
+        self.tombstones = 0
+        self.rows: List[Optional[Dict]] = []   # None marks a tombstone
+        self._row_of: Dict[str, int] = {}
+        self._matrix: Optional[np.ndarray] = None     # (capacity, dim), memmap when persisted
+        self._row_thresholds = np.empty(0, dtype=np.float32)
+        self._generation = 0
+        self._data_file = DATA_FILE
+        self._retired_data_file: Optional[str] = None
+        self._index_signature = None
+        self._journal_inode = None
+        self._journal_offset = 0
+        self._journal_ops = 0
+
+    # ------------------------------------------------------------------
+    # Id table
+    # ------------------------------------------------------------------
+
+    def __len__(self) -> int:
+        return len(self._row_of)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._row_of
+
+    @property
+    def keys(self) -> List[str]:
+        return [row["key"] for row in self.rows if row is not None]
+
+    @property
+    def names(self) -> List[str]:
+        return [row["name"] for row in self.rows if row is not None]
+
+    @property
+    def capacity(self) -> int:
+        return 0 if self._matrix is None else self._matrix.shape[0]
+
+    def get(self, key: str) -> Optional[Dict]:
+        idx = self._row_of.get(key)
+        return None if idx is None else self.rows[idx]
+
+    def threshold_for(self, priority: str) -> float:
+        default = self.thresholds.get(DEFAULT_SUSPECT_PRIORITY, 0.5)
+        return self.thresholds.get(priority, default)
+
+    def _table_put(self, idx: int, row: Optional[Dict]):
+        if idx == self.count:
+            self.rows.append(row)
+            self.count += 1
+        else:
+            old = self.rows[idx]
+            if old is None:
+                self.tombstones -= 1
+            else:
+                self._row_of.pop(old["key"], None)
+            self.rows[idx] = row
+        if row is None:
+            self.tombstones += 1
+            self._row_thresholds[idx] = np.inf    # a tombstone never matches
+        else:
+            self._row_of[row["key"]] = idx
+            self._row_thresholds[idx] = self.threshold_for(row["priority"])
+        self.version += 1
+
+    def _table_drop(self, key: str) -> bool:
+        """Tombstone a row; its slot keeps the embedding until the matrix is packed"""
+        idx = self._row_of.pop(key, None)
+        if idx is None:
+            return False
+        self.rows[idx] = None
+        self.tombstones += 1
+        self._row_thresholds[idx] = np.inf
+        self.version += 1
+        return True
+
+    def _table_remove(self, key: str) -> Optional[Tuple[int, int]]:
+        """Replay a pre-tombstone "remove": the last row moved into the slot"""
+        idx = self._row_of.pop(key, None)
+        if idx is None:
+            return None
+        last = self.count - 1
+        if idx != last:
+            self.rows[idx] = self.rows[last]
+            self._row_of[self.rows[idx]["key"]] = idx
+            self._row_thresholds[idx] = self._row_thresholds[last]
+        self.rows.pop()
+        self.count = last
+        self.version += 1
+        return idx, last
+
+    def _table_priority(self, key: str, priority: str) -> bool:
+        idx = self._row_of.get(key)
+        if idx is None:
+            return False
+        self.rows[idx] = {**self.rows[idx], "priority": priority}
+        self._row_thresholds[idx] = self.threshold_for(priority)
+        self.version += 1
+        return True
+
+    def _apply(self, op: Dict):
+        if op["op"] == "put":
+            self._table_put(op["index"], op["row"])
+        elif op["op"] == "drop":
+            self._table_drop(op["key"])
+        elif op["op"] == "remove":
+            self._table_remove(op["key"])
+        elif op["op"] == "priority":
+            self._table_priority(op["key"], op["priority"])
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _signature(self, name: str) -> Tuple[int, int, int]:
+        # Snapshots are written with os.replace(), so the inode changes on every write
+        st = os.stat(self._path(name))
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    def _load(self):
+        """(Re)open the on-disk store: snapshot, then journal; no face model involved"""
+        with self._lock:
+            for attempt in range(3):
+                self._reset()
+                try:
+                    with open(self._path(INDEX_FILE)) as f:
+                        st = os.fstat(f.fileno())
+                        index = json.load(f)
+                except FileNotFoundError:
+                    return
+                self._index_signature = (st.st_ino, st.st_mtime_ns, st.st_size)
+                self.dim = index["dim"]
+                self.dtype = np.dtype(index["dtype"])
+                self._generation = index["generation"]
+                self._data_file = index.get("data", DATA_FILE)
+                capacity = index["capacity"]
+                if not capacity:
+                    break
+                try:
+                    self._matrix = np.memmap(self._path(self._data_file), dtype=self.dtype,
+                                             mode="r" if self.readonly else "r+",
+                                             shape=(capacity, self.dim))
+                    break
+                except FileNotFoundError:
+                    # The writer packed the matrix between our two reads - reread the index
+                    if attempt == 2:
+                        raise
+            self._row_thresholds = np.zeros(capacity, dtype=np.float32)
+            for row in index["rows"]:
+                self._table_put(self.count, row)
+            self._replay_journal()
+
+    def _replay_journal(self):
+        """Apply journal lines written since the last replay"""
+        try:
+            inode = os.stat(self._path(JOURNAL_FILE)).st_ino
+        except FileNotFoundError:
+            return
+        if inode != self._journal_inode:
+            self._journal_inode = inode
+            self._journal_offset = 0
+            self._journal_ops = 0
+        with open(self._path(JOURNAL_FILE), "rb") as f:
+            f.seek(self._journal_offset)
+            data = f.read()
+        end = data.rfind(b"\n") + 1  # ignore a line the writer is still appending
+        for line in data[:end].splitlines():
+            op = json.loads(line)
+            if "generation" in op:
+                if op["generation"] != self._generation:
+                    # Journal of an older snapshot - wait for the writer to replace it
+                    self._journal_offset = os.stat(self._path(JOURNAL_FILE)).st_size
+                    return
+                continue
+            self._apply(op)
+            self._journal_ops += 1
+        self._journal_offset += end
+
+    def refresh(self) -> bool:
+        """Pick up changes another process made to the store; True if anything changed"""
+        if not self.directory:
+            return False
+        with self._lock:
+            try:
+                index_signature = self._signature(INDEX_FILE)
+            except FileNotFoundError:
+                return False
+            if index_signature != self._index_signature:
+                self._load()
+                return True
+            before = (self._journal_inode, self._journal_offset)
+            self._replay_journal()
+            return before != (self._journal_inode, self._journal_offset)
+
+    def _write_atomic(self, name: str, data: bytes):
+        tmp = self._path(name + ".tmp")
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, self._path(name))
+
+    def _snapshot(self):
+        """Fold the journal into a new snapshot and start an empty journal"""
+        if self.tombstones:
+            self._rewrite(self.capacity)
+        self._generation += 1
+        index = {
+            "generation": self._generation,
+            "dim": self.dim,
+            "dtype": self.dtype.name,
+            "capacity": self.capacity,
+            "data": self._data_file,
+            "rows": self.rows
+        }
+        self._write_atomic(INDEX_FILE, json.dumps(index, separators=(",", ":")).encode())
+        self._index_signature = self._signature(INDEX_FILE)
+        if self._retired_data_file:
+            # Readers still mapping it keep their pages; new readers follow the index
+            try:
+                os.remove(self._path(self._retired_data_file))
+            except OSError:
+                pass
+            self._retired_data_file = None
+        header = json.dumps({"generation": self._generation}).encode() + b"\n"
+        self._write_atomic(JOURNAL_FILE, header)
+        self._journal_inode = os.stat(self._path(JOURNAL_FILE)).st_ino
+        self._journal_offset = len(header)
+        self._journal_ops = 0
+
+    def _commit(self, ops: List[Dict], snapshot: bool = False):
+        """Persist id table changes (matrix rows are already written in place)"""
+        if not self.directory or not ops:
+            return
+        if isinstance(self._matrix, np.memmap):
+            self._matrix.flush()
+        if snapshot or self._index_signature is None \
+                or self._journal_ops + len(ops) > FACE_GALLERY_COMPACT_OPS:
+            self._snapshot()
+            return
+        data = b"".join(json.dumps(op, separators=(",", ":")).encode() + b"\n" for op in ops)
+        with open(self._path(JOURNAL_FILE), "ab") as f:
+            f.write(data)
+        self._journal_offset += len(data)
+        self._journal_ops += len(ops)
+
+    def _rewrite(self, capacity: int):
+        """
+        Copy the live rows, packed, into a new (capacity, dim) matrix. A
+        persisted store writes a new data file that only the next snapshot
+        names, so readers switch id table and row order together.
+        """
+        live = [idx for idx, row in enumerate(self.rows) if row is not None]
+        if self.directory:
+            data_file = f"embeddings.{self._generation + 1}.dat"
+            matrix = np.memmap(self._path(data_file), dtype=self.dtype, mode="w+",
+                               shape=(capacity, self.dim))
+        else:
+            matrix = np.zeros((capacity, self.dim), dtype=self.dtype)
+        if live:
+            matrix[:len(live)] = self._matrix[live]
+        if self.directory:
+            matrix.flush()
+            if self._matrix is not None:
+                self._retired_data_file = self._data_file
+            self._data_file = data_file
+        rows = [self.rows[idx] for idx in live]
+        self.count = 0
+        self.tombstones = 0
+        self.rows = []
+        self._row_of = {}
+        self._matrix = matrix
+        self._row_thresholds = np.zeros(capacity, dtype=np.float32)
+        for row in rows:
+            self._table_put(self.count, row)
+
+    def _ensure_capacity(self, needed: int) -> bool:
+        """Grow the matrix (doubling) to hold `needed` rows; True if it grew"""
+        if needed <= self.capacity:
+            return False
+        capacity = max(1024, self.capacity * 2)
+        while capacity < needed:
+            capacity *= 2
+        self._rewrite(capacity)
+        return True
+
+    # ------------------------------------------------------------------
+    # Enroll / remove
+    # ------------------------------------------------------------------
+
+    def _check_writable(self):
+        if self.readonly:
+            raise RuntimeError("Face gallery opened read-only")
+
+    def enroll(self, key: str, name: str, embedding: np.ndarray,
+               priority: str = DEFAULT_SUSPECT_PRIORITY, suspect_id: Optional[str] = None):
+        """Add (or replace) one suspect"""
+        self.enroll_many([(key, name, embedding, priority, suspect_id)])
+
+    def enroll_many(self, items: Sequence[Tuple]):
+        """Add or replace (key, name, embedding, priority, suspect_id) rows"""
+        self._check_writable()
+        if not items:
+            return
+        with self._lock:
+            if self.dim is None:
+                self.dim = int(np.asarray(items[0][2]).size)
+            new_keys = {item[0] for item in items if item[0] not in self._row_of}
+            grew = self._ensure_capacity(self.count + len(new_keys))
+            ops = []
+            for key, name, embedding, priority, suspect_id in items:
+                vector = np.asarray(embedding, dtype=np.float32).reshape(-1)
+                idx = self._row_of.get(key, self.count)
+                self._matrix[idx] = vector / max(float(np.linalg.norm(vector)), 1e-12)
+                row = {"key": key, "name": name, "suspect_id": suspect_id,
+                       "priority": (priority or DEFAULT_SUSPECT_PRIORITY).lower()}
+                self._table_put(idx, row)
+                ops.append({"op": "put", "index": idx, "row": row})
+            self._commit(ops, snapshot=grew)
+
+    def remove(self, key: str) -> bool:
+        return self.remove_many([key]) > 0
+
+    def remove_many(self, keys: Sequence[str]) -> int:
+        """Drop rows by key (tombstoned; the next snapshot packs the matrix)"""
+        self._check_writable()
+        ops = []
+        with self._lock:
+            for key in keys:
+                if self._table_drop(key):
+                    ops.append({"op": "drop", "key": key})
+            self._commit(ops)
+        return len(ops)
+
+    def set_priority(self, key: str, priority: str) -> bool:
+        """Change one suspect's priority (match threshold) in place"""
+        self._check_writable()
+        priority = priority.lower()
+        with self._lock:
+            if not self._table_priority(key, priority):
+                return False
+            self._commit([{"op": "priority", "key": key, "priority": priority}])
+            return True
+
+    # ------------------------------------------------------------------
+    # Matching
+    # ------------------------------------------------------------------
+
+    def match(self, embeddings: Sequence[np.ndarray], top_k: int = FACE_MATCH_TOP_K) -> List[List[Dict]]:
+        """
+        Match every face embedding against the whole gallery at once.
+        Returns, per face, up to top_k {name, key, suspect_id, priority, score}
+        dicts (best first) that clear their suspect's threshold.
+        """
+        if len(embeddings) == 0:
+            return []
+        with self._lock:
+            if not self._row_of:
+                return [[] for _ in embeddings]
+
+            faces = np.array(embeddings, dtype=np.float32).reshape(len(embeddings), -1)
+            faces /= np.maximum(np.linalg.norm(faces, axis=1, keepdims=True), 1e-12)
+
+            # (faces, gallery) cosine similarity, a chunk of gallery rows at a time
+            sims = np.empty((len(faces), self.count), dtype=np.float32)
+            for start in range(0, self.count, FACE_MATCH_CHUNK):
+                end = min(start + FACE_MATCH_CHUNK, self.count)
+                block = self._matrix[start:end]
+                if block.dtype != np.float32:
+                    block = block.astype(np.float32)
+                sims[:, start:end] = faces @ block.T
+            sims[sims < self._row_thresholds[:self.count]] = -np.inf   # per-suspect threshold, tombstones inf
+
+            k = min(top_k, sims.shape[1])
+            top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+            top_scores = np.take_along_axis(sims, top, axis=1)
+            order = np.argsort(-top_scores, axis=1)
+
+            results = []
+            for f in range(len(faces)):
+                matches = []
+                for j in order[f]:
+                    score = float(top_scores[f, j])
+                    if score == -np.inf:
+                        break
+                    row = self.rows[int(top[f, j])]
+                    matches.append({
+                        "name": row["name"],
+                        "key": row["key"],
+                        "suspect_id": row.get("suspect_id"),
+                        "priority": row["priority"],
+                        "score": round(score, 4)
+                    })
+                results.append(matches)
+        return results
+
+    def get_stats(self) -> Dict:
+        return {
+            "size": len(self._row_of),
+            "tombstones": self.tombstones,
+            "capacity": self.capacity,
+            "dim": self.dim or 0,
+            "dtype": self.dtype.name,
+            "bytes": self.capacity * (self.dim or 0) * self.dtype.itemsize,
+            "path": self.directory,
+            "generation": self._generation,
+            "version": self.version,
+            "journal_ops": self._journal_ops,
+            "thresholds": self.thresholds
+        }
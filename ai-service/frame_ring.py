@@ -0,0 +1,229 @@
+"""
+Frame Ring - Preallocated Frame Store
+Fixed ring of numpy buffers that a capture thread writes into in place.
+Readers borrow the newest frame by sequence number and release it when
+done; a borrowed slot is never overwritten. A shared ring keeps its slots
+in one multiprocessing.shared_memory block, so worker processes can read
+a borrowed frame in place from its SharedFrameRef instead of a pickled copy.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from multiprocessing import shared_memory
+from typing import Dict, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+
+class SharedFrameRef(NamedTuple):
+    """Picklable address of one shared ring slot (a few bytes instead of the frame)"""
+    name: str
+    shape: Tuple[int, ...]
+    dtype: str
+    offset: int
+
+
+class FrameLease:
+    """
+    Read access to one ring slot. The frame stays valid until release().
+    Usable as a context manager: `with ring.borrow() as lease: ...`
+    """
+    __slots__ = ("_ring", "index", "generation", "frame", "seq", "timestamp", "ref", "_released")
+
+    def __init__(self, ring: "FrameRing", index: int, generation: int, frame: np.ndarray,
+                 seq: int, timestamp: float, ref: Optional[SharedFrameRef] = None):
+        self._ring = ring
+        self.index = index
+        self.generation = generation
+        self.frame = frame
+        self.seq = seq
+        self.timestamp = timestamp
+        self.ref = ref  # set for shared rings: hand this to other processes
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._ring._release(self.index, self.generation)
+
+    def __enter__(self) -> "FrameLease":
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class FrameRing:
+    """
+    Single-writer, multi-reader ring of preallocated frames.
+
+    Writer:  idx, buf = ring.acquire_write(); fill buf in place; ring.commit(idx)
+    Readers: lease = ring.borrow(); use lease.frame; lease.release()
+
+    shared=True places the slots in shared memory; close() unlinks it.
+    """
+
+    def __init__(self, slots: int = 4, shared: bool = False):
+        if slots < 2:
+            raise ValueError("FrameRing needs at least 2 slots")
+        self.slots = slots
+        self.shared = shared
+        self.buffers = []
+        self.shape: Optional[Tuple[int, ...]] = None
+        self.dtype = np.uint8
+        self.seq = 0
+        self.dropped = 0
+        self._seqs = [0] * slots
+        self._timestamps = [0.0] * slots
+        self._refs = [0] * slots
+        self._latest = -1
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._shm: Optional[shared_memory.SharedMemory] = None
+        # Previous block, kept until the next reallocation for in-flight readers
+        self._retired: Optional[shared_memory.SharedMemory] = None
+
+    def allocate(self, shape: Tuple[int, ...], dtype=np.uint8):
+        """(Re)allocate every slot; only the writer thread may call this"""
+        with self._lock:
+            self.shape = tuple(shape)
+            self.dtype = dtype
+            if self.shared:
+                nbytes = int(np.prod(self.shape)) * np.dtype(dtype).itemsize
+                self._free_block(self._retired)
+                self._retired = self._shm
+                self._shm = shared_memory.SharedMemory(create=True, size=nbytes * self.slots)
+                self.buffers = [np.ndarray(self.shape, dtype=dtype, buffer=self._shm.buf, offset=i * nbytes)
+                                for i in range(self.slots)]
+            else:
+                self.buffers = [np.empty(self.shape, dtype=dtype) for _ in range(self.slots)]
+            self._seqs = [0] * self.slots
+            self._refs = [0] * self.slots
+            self._latest = -1
+            # Leases on the old buffers stay valid but no longer pin any slot
+            self._generation += 1
+
+    def acquire_write(self) -> Optional[Tuple[int, np.ndarray]]:
+        """
+        Pick the oldest slot that is neither the newest frame nor borrowed.
+        Returns None (and counts a drop) when every slot is in use.
+        """
+        with self._lock:
+            best = None
+            for i in range(self.slots):
+                if i == self._latest or self._refs[i] > 0:
+                    continue
+                if best is None or self._seqs[i] < self._seqs[best]:
+                    best = i
+            if best is None:
+                self.dropped += 1
+                return None
+            return best, self.buffers[best]
+
+    def commit(self, index: int) -> int:
+        """Publish a filled slot as the newest frame; returns its sequence number"""
+        with self._lock:
+            self.seq += 1
+            self._seqs[index] = self.seq
+            self._timestamps[index] = time.time()
+            self._latest = index
+            return self.seq
+
+    def borrow(self, after_seq: int = 0) -> Optional[FrameLease]:
+        """Borrow the newest frame if its sequence number is above after_seq"""
+        with self._lock:
+            idx = self._latest
+            if idx < 0 or self._seqs[idx] <= after_seq:
+                return None
+            self._refs[idx] += 1
+            ref = None
+            if self._shm is not None:
+                ref = SharedFrameRef(self._shm.name, self.shape, np.dtype(self.dtype).str,
+                                     idx * self.buffers[idx].nbytes)
+            return FrameLease(self, idx, self._generation, self.buffers[idx],
+                              self._seqs[idx], self._timestamps[idx], ref)
+
+    def _release(self, index: int, generation: int):
+        with self._lock:
+            if generation == self._generation and self._refs[index] > 0:
+                self._refs[index] -= 1
+
+    def copy_latest(self) -> Optional[np.ndarray]:
+        """Independent copy of the newest frame (for callers that keep it)"""
+        lease = self.borrow()
+        if lease is None:
+            return None
+        with lease:
+            return lease.frame.copy()
+
+    def close(self):
+        """Unlink a shared ring's memory (a later frame allocates a fresh block)"""
+        with self._lock:
+            blocks = (self._shm, self._retired)
+            self._shm = self._retired = None
+            self.buffers = []
+            self.shape = None
+            self._latest = -1
+            self._generation += 1
+        for block in blocks:
+            self._free_block(block)
+
+    @staticmethod
+    def _free_block(block: Optional[shared_memory.SharedMemory]):
+        if block is None:
+            return
+        try:
+            block.unlink()
+        except FileNotFoundError:
+            pass
+        try:
+            block.close()
+        except BufferError:
+            pass  # a lease still holds a view; the mapping goes once it is dropped
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                "slots": self.slots,
+                "seq": self.seq,
+                "borrowed": sum(1 for r in self._refs if r > 0),
+                "dropped": self.dropped,
+                "shape": list(self.shape) if self.shape else None,
+                "shared": self._shm.name if self._shm is not None else None
+            }
+
+
+class SharedFrameReader:
+    """
+    Process-side counterpart of a shared FrameRing: maps SharedFrameRefs
+    onto zero-copy numpy views, keeping the most recently used blocks attached.
+    """
+
+    def __init__(self, max_blocks: int = 32):
+        self.max_blocks = max_blocks
+        self._blocks: "OrderedDict[str, shared_memory.SharedMemory]" = OrderedDict()
+
+    def view(self, ref: SharedFrameRef) -> np.ndarray:
+        """The frame at ref; valid while the owner keeps the slot borrowed"""
+        block = self._blocks.get(ref.name)
+        if block is None:
+            block = shared_memory.SharedMemory(name=ref.name)
+            self._blocks[ref.name] = block
+            while len(self._blocks) > self.max_blocks:
+                _, old = self._blocks.popitem(last=False)
+                self._detach(old)
+        else:
+            self._blocks.move_to_end(ref.name)
+        return np.ndarray(ref.shape, dtype=np.dtype(ref.dtype), buffer=block.buf, offset=ref.offset)
+
+    def close(self):
+        while self._blocks:
+            self._detach(self._blocks.popitem()[1])
+
+    @staticmethod
+    def _detach(block: shared_memory.SharedMemory):
+        try:
+            block.close()
+        except BufferError:
+            pass
@@ -0,0 +1,130 @@
+"""
+Identity Cache - Per-Track Face Identity
+Remembers the face-match result of every tracked person so a person who
+stays in view is re-embedded every FACE_REVERIFY_INTERVAL seconds instead
+of on every inference frame. Entries die with their track, expire after
+FACE_ID_TTL seconds without a fresh embedding, and are all dropped when
+the face gallery changes.
+"""
+
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+# Configuration (overridable via environment)
+FACE_REVERIFY_INTERVAL = float(os.getenv("FACE_REVERIFY_INTERVAL", "3.0"))  # seconds between re-embeds of a track
+FACE_ID_TTL = float(os.getenv("FACE_ID_TTL", "10.0"))                       # seconds a result survives unverified
+
+
+class IdentityEntry:
+    """Best gallery match for one track at its last verification (None = no match)"""
+    __slots__ = ("matches", "verified_at", "verifications")
+
+    def __init__(self, matches: List[Dict], verified_at: float):
+        self.matches = matches
+        self.verified_at = verified_at
+        self.verifications = 1
+
+    @property
+    def identity(self) -> Optional[str]:
+        return self.matches[0]["name"] if self.matches else None
+
+    @property
+    def score(self) -> float:
+        return self.matches[0]["score"] if self.matches else 0.0
+
+
+class IdentityCache:
+    """
+    track_id -> IdentityEntry for one camera's tracker.
+    is_fresh() tells the face stage which tracks it may skip; store()
+    records each new embedding's matches (an empty list caches "unknown").
+    Thread-safe: batch preparation and tracking may run on different threads.
+    """
+
+    def __init__(self, ttl: float = FACE_ID_TTL, reverify_interval: float = FACE_REVERIFY_INTERVAL):
+        self.ttl = ttl
+        self.reverify_interval = reverify_interval
+        self.entries: Dict[int, IdentityEntry] = {}
+        self.gallery_version: Optional[int] = None
+        self.hits = 0           # inference passes that reused a cached result
+        self.verifications = 0  # embeddings stored
+        self.invalidations = 0  # full clears caused by gallery changes
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def sync_gallery(self, version: int) -> bool:
+        """Drop every entry if the gallery changed since the last call; True if it did"""
+        with self._lock:
+            if version == self.gallery_version:
+                return False
+            changed = self.gallery_version is not None
+            self.gallery_version = version
+            if changed and self.entries:
+                self.entries.clear()
+                self.invalidations += 1
+            return changed
+
+    def get(self, track_id: int, now: Optional[float] = None) -> Optional[IdentityEntry]:
+        """Cached result for a track, or None if there is none (or it outlived the TTL)"""
+        now = time.time() if now is None else now
+        with self._lock:
+            entry = self.entries.get(track_id)
+            if entry is not None and now - entry.verified_at > self.ttl:
+                del self.entries[track_id]
+                return None
+            return entry
+
+    def is_fresh(self, track_id: int, now: Optional[float] = None, reverify: bool = True) -> bool:
+        """
+        True if the track needs no face pass now. reverify=False keeps any
+        live entry (QoS "new_tracks" mode: check each track only once).
+        """
+        entry = self.get(track_id, now)
+        if entry is None:
+            return False
+        now = time.time() if now is None else now
+        return not reverify or now - entry.verified_at < self.reverify_interval
+
+    def store(self, track_id: int, matches: Optional[List[Dict]], now: Optional[float] = None):
+        """Record the matches of a fresh embedding of this track"""
+        now = time.time() if now is None else now
+        with self._lock:
+            entry = self.entries.get(track_id)
+            if entry is None:
+                self.entries[track_id] = IdentityEntry(matches or [], now)
+            else:
+                entry.matches = matches or []
+                entry.verified_at = now
+                entry.verifications += 1
+            self.verifications += 1
+
+    def retain(self, track_ids: Iterable[int]):
+        """Forget tracks the tracker has lost"""
+        live = set(track_ids)
+        with self._lock:
+            for track_id in [t for t in self.entries if t not in live]:
+                del self.entries[track_id]
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+
+    def identified(self) -> int:
+        """Tracks whose cached result names a suspect"""
+        with self._lock:
+            return sum(1 for e in self.entries.values() if e.matches)
+
+    def get_stats(self) -> Dict:
+        return {
+            "size": len(self.entries),
+            "identified": self.identified(),
+            "hits": self.hits,
+            "verifications": self.verifications,
+            "invalidations": self.invalidations,
+            "ttl": self.ttl,
+            "reverify_interval": self.reverify_interval
+        }
@@ -0,0 +1,421 @@
+"""
+Inference Backends - Pluggable CPU Detection Runtimes
+The YOLO detector can run through PyTorch, ONNX Runtime (FP32) or ONNX
+Runtime with a statically int8-quantized graph. ONNX models are exported
+once into MODEL_CACHE_DIR and checked against PyTorch before first use;
+every backend hands back ultralytics Results, so the rest of the pipeline
+does not care which one is active.
+
+One-time export (otherwise done lazily on first start):
+    python inference_backends.py --backend onnx-int8 --calibration recording.mp4
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from postprocess import result_arrays
+from preprocess import letterbox_batch
+from tracker import iou_matrix
+
+try:
+    from ultralytics import YOLO
+    YOLO_AVAILABLE = True
+except ImportError:
+    YOLO_AVAILABLE = False
+
+try:
+    import onnxruntime as ort
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+    ONNX_AVAILABLE = True
+except ImportError:
+    CalibrationDataReader = object
+    ONNX_AVAILABLE = False
+
+# Configuration (overridable via environment)
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torch")  # torch | onnx | onnx-int8
+MODEL_WEIGHTS = ("yolo11n.pt", "yolov8n.pt")                  # tried in order
+MODEL_CACHE_DIR = os.getenv("MODEL_CACHE_DIR", "assets/models")
+EXPORT_IMGSZ = 640
+INT8_CALIBRATION_SOURCE = os.getenv("INT8_CALIBRATION_SOURCE", "")  # recording or image directory
+INT8_CALIBRATION_FRAMES = int(os.getenv("INT8_CALIBRATION_FRAMES", "64"))
+PARITY_FRAMES = int(os.getenv("BACKEND_PARITY_FRAMES", "16"))
+# mAP@0.5 against PyTorch's own detections a backend needs to be used
+PARITY_MIN_MAP = {
+    "onnx": float(os.getenv("BACKEND_PARITY_MIN_MAP_FP32", "0.95")),
+    "onnx-int8": float(os.getenv("BACKEND_PARITY_MIN_MAP_INT8", "0.80")),
+}
+# Largest raw head output difference from PyTorch (box coordinates in input pixels) a backend may have
+PARITY_MAX_ABS_DIFF = {
+    "onnx": float(os.getenv("BACKEND_PARITY_MAX_DIFF_FP32", "0.05")),
+    "onnx-int8": float(os.getenv("BACKEND_PARITY_MAX_DIFF_INT8", "16.0")),
+}
+DETECT_CONF = 0.5
+
+
+# ==============================================================================
+# FRAMES, PREPROCESSING AND METRICS
+# ==============================================================================
+
+def load_frames(source: Optional[str], count: int, size: Tuple[int, int] = (640, 480)) -> List[np.ndarray]:
+    """
+    Sample `count` frames evenly from a recording or an image directory.
+    Without a source, synthetic frames are returned (fine for timing, not
+    for calibration).
+    """
+    frames = []
+    if source and os.path.isdir(source):
+        names = sorted(f for f in os.listdir(source) if f.lower().endswith(('.jpg', '.jpeg', '.png')))
+        step = max(1, len(names) // max(count, 1))
+        for name in names[::step][:count]:
+            img = cv2.imread(os.path.join(source, name))
+            if img is not None:
+                frames.append(cv2.resize(img, size))
+    elif source:
+        cap = cv2.VideoCapture(source)
+        total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) or count
+        step = max(1, total // max(count, 1))
+        pos = 0
+        while len(frames) < count:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, pos)
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frames.append(cv2.resize(frame, size))
+            pos += step
+        cap.release()
+    else:
+        rng = np.random.default_rng(0)
+        frames = [rng.integers(0, 255, (size[1], size[0], 3), dtype=np.uint8) for _ in range(count)]
+    return frames
+
+
+def letterbox_blob(frame: np.ndarray, imgsz: int = EXPORT_IMGSZ) -> np.ndarray:
+    """BGR frame -> (1, 3, imgsz, imgsz) float32 input, padded the way ultralytics pads"""
+    batch, _ = letterbox_batch([frame], imgsz, auto=False)
+    return batch.astype(np.float32) / 255.0
+
+
+def detection_map(reference: Sequence[Tuple], candidate: Sequence[Tuple], iou: float = 0.5) -> Optional[float]:
+    """
+    mAP@iou of a backend's detections, scoring a reference backend's
+    detections (normally PyTorch) as ground truth. Both are per-frame
+    (xyxy, conf, cls) tuples. None when the reference found nothing.
+    """
+    classes = sorted({int(c) for _, _, cls in reference for c in cls})
+    if not classes:
+        return None
+    aps = []
+    for cls_id in classes:
+        scored = []   # (confidence, is_true_positive)
+        n_ref = 0
+        for (rb, _, rc), (cb, cc, ccls) in zip(reference, candidate):
+            gt = rb[rc == cls_id]
+            n_ref += len(gt)
+            mask = ccls == cls_id
+            preds, confs = cb[mask], cc[mask]
+            order = np.argsort(-confs)
+            ious = iou_matrix(preds[order], gt)
+            used = set()
+            for p, conf in enumerate(confs[order]):
+                best = int(np.argmax(ious[p])) if ious.shape[1] else -1
+                hit = best >= 0 and ious[p, best] >= iou and best not in used
+                if hit:
+                    used.add(best)
+                scored.append((float(conf), hit))
+        if not scored:
+            aps.append(0.0)
+            continue
+        scored.sort(key=lambda s: -s[0])
+        tp = np.cumsum([hit for _, hit in scored])
+        fp = np.cumsum([not hit for _, hit in scored])
+        recall = tp / max(n_ref, 1)
+        precision = tp / np.maximum(tp + fp, 1)
+        # All-point interpolated area under the precision/recall curve
+        r = np.concatenate(([0.0], recall, [1.0]))
+        p = np.concatenate(([1.0], precision, [0.0]))
+        p = np.flip(np.maximum.accumulate(np.flip(p)))
+        idx = np.where(r[1:] != r[:-1])[0]
+        aps.append(float(np.sum((r[idx + 1] - r[idx]) * p[idx + 1])))
+    return float(np.mean(aps))
+
+
+class FrameCalibrationReader(CalibrationDataReader):
+    """Feeds letterboxed recorded frames to the int8 calibrator, one at a time"""
+
+    def __init__(self, input_name: str, frames: List[np.ndarray], imgsz: int = EXPORT_IMGSZ):
+        self.input_name = input_name
+        self._blobs = iter([letterbox_blob(f, imgsz) for f in frames])
+
+    def get_next(self) -> Optional[Dict[str, np.ndarray]]:
+        blob = next(self._blobs, None)
+        return None if blob is None else {self.input_name: blob}
+
+
+# ==============================================================================
+# BACKENDS
+# ==============================================================================
+
+class TorchBackend:
+    """Plain ultralytics/PyTorch model - the reference the others are checked against"""
+    name = "torch"
+
+    def __init__(self, cache_dir: str = MODEL_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.model = None
+        self.weights: Optional[str] = None
+        self.path: Optional[str] = None
+        self.parity: Optional[Dict] = None
+
+    def load(self) -> bool:
+        self.model, self.weights = load_torch_model()
+        self.path = self.weights
+        return self.model is not None
+
+    @property
+    def names(self) -> Dict[int, str]:
+        return self.model.names
+
+    def __call__(self, frames: List[np.ndarray], conf: float = DETECT_CONF, imgsz: int = EXPORT_IMGSZ):
+        return self.model(frames, verbose=False, conf=conf, imgsz=imgsz)
+
+    def get_stats(self) -> Dict:
+        return {"backend": self.name, "weights": self.weights, "path": self.path, "parity": self.parity}
+
+
+class OnnxBackend(TorchBackend):
+    """
+    ONNX Runtime FP32. The .pt weights are exported once (dynamic batch and
+    input size, so QoS can still change imgsz) and parity-checked against
+    PyTorch; later starts just open the cached file.
+    """
+    name = "onnx"
+    suffix = ".onnx"
+
+    def __init__(self, cache_dir: str = MODEL_CACHE_DIR, calibration: Optional[str] = None,
+                 force: bool = False):
+        super().__init__(cache_dir)
+        self.calibration = calibration or INT8_CALIBRATION_SOURCE
+        self.force = force
+
+    def _cache_path(self, weights: str) -> str:
+        return os.path.join(self.cache_dir, os.path.splitext(os.path.basename(weights))[0] + self.suffix)
+
+    def load(self) -> bool:
+        if not ONNX_AVAILABLE:
+            print("❌ onnxruntime not installed")
+            return False
+        # A cached export of weights already on disk needs no PyTorch model at all
+        self.weights = next((w for w in MODEL_WEIGHTS if os.path.exists(w)), None)
+        meta = None
+        if self.weights:
+            self.path = self._cache_path(self.weights)
+            meta = read_meta(self.path)
+        # Reports from before the raw-output tolerance (no "status") are re-checked
+        if self.force or meta is None or meta.get("source") != weights_signature(self.weights) \
+                or "status" not in meta.get("parity", {}):
+            torch_model, self.weights = load_torch_model()
+            if torch_model is None:
+                return False
+            self.path = self._cache_path(self.weights)
+            os.makedirs(self.cache_dir, exist_ok=True)
+            print(f"📦 Building {self.name} model: {self.path}")
+            t0 = time.perf_counter()
+            self._build(torch_model)
+            self.model = YOLO(self.path, task="detect")
+            meta = {
+                "backend": self.name,
+                "source": weights_signature(self.weights),
+                "build_s": round(time.perf_counter() - t0, 1),
+                "parity": check_parity(torch_model, self.model, self.name, self.path, self.calibration)
+            }
+            write_meta(self.path, meta)
+        self.parity = meta["parity"]
+        if not self.parity.get("passed"):
+            verdict = "could not be parity-checked" if self.parity.get("status") == "not evaluated" \
+                else "failed the PyTorch parity check"
+            print(f"❌ {self.name} {verdict}: {self.parity}")
+            self.model = None
+            return False
+        if self.model is None:
+            self.model = YOLO(self.path, task="detect")
+        return True
+
+    def _build(self, torch_model):
+        export_onnx(torch_model, self.path)
+
+
+class OnnxInt8Backend(OnnxBackend):
+    """
+    ONNX Runtime with a statically quantized (QDQ, int8 weights and
+    activations) graph, calibrated on frames drawn from a recording.
+    """
+    name = "onnx-int8"
+    suffix = ".int8.onnx"
+
+    def _build(self, torch_model):
+        fp32_path = self.path[:-len(self.suffix)] + OnnxBackend.suffix
+        if self.force or not os.path.exists(fp32_path):
+            export_onnx(torch_model, fp32_path)
+        frames = load_frames(self.calibration, INT8_CALIBRATION_FRAMES) if self.calibration else []
+        if not frames:
+            raise RuntimeError("int8 calibration needs recorded frames "
+                               "(INT8_CALIBRATION_SOURCE or --calibration)")
+        print(f"📏 Calibrating int8 on {len(frames)} frame(s) from {self.calibration}")
+        quantize_onnx(fp32_path, self.path, frames)
+
+
+BACKENDS = {cls.name: cls for cls in (TorchBackend, OnnxBackend, OnnxInt8Backend)}
+
+
+def load_torch_model() -> Tuple[Optional["YOLO"], Optional[str]]:
+    """First loadable entry of MODEL_WEIGHTS"""
+    if not YOLO_AVAILABLE:
+        print("❌ ultralytics not installed")
+        return None, None
+    for weights in MODEL_WEIGHTS:
+        try:
+            return YOLO(weights), weights
+        except Exception as e:
+            print(f"⚠️ Could not load {weights}: {e}")
+    return None, None
+
+
+def weights_signature(weights: str) -> Dict:
+    """Identifies the .pt file an export was made from (rebuild when it changes)"""
+    size = os.path.getsize(weights) if os.path.exists(weights) else None
+    return {"weights": os.path.basename(weights), "size": size}
+
+
+def read_meta(path: str) -> Optional[Dict]:
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path + ".json") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_meta(path: str, meta: Dict):
+    with open(path + ".json", "w") as f:
+        json.dump(meta, f, indent=2)
+
+
+def export_onnx(torch_model, path: str):
+    """Export once; written next to the .pt by ultralytics, then moved into the cache"""
+    exported = torch_model.export(format="onnx", imgsz=EXPORT_IMGSZ, dynamic=True, verbose=False)
+    os.replace(exported, path)
+
+
+def quantize_onnx(fp32_path: str, int8_path: str, frames: List[np.ndarray]):
+    """Static QDQ quantization; ultralytics metadata (class names, stride) is carried over"""
+    import onnx
+    input_name = ort.InferenceSession(fp32_path, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+    tmp = int8_path + ".tmp"
+    quantize_static(fp32_path, tmp, FrameCalibrationReader(input_name, frames),
+                    quant_format=QuantFormat.QDQ, per_channel=True,
+                    activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8)
+    quantized = onnx.load(tmp)
+    del quantized.metadata_props[:]
+    quantized.metadata_props.extend(onnx.load(fp32_path, load_external_data=False).metadata_props)
+    onnx.save(quantized, tmp)
+    os.replace(tmp, int8_path)
+
+
+def check_parity(torch_model, candidate, backend: str, onnx_path: str,
+                 source: Optional[str] = None) -> Dict:
+    """
+    Compare a freshly built backend with PyTorch on the same frames:
+    max difference of the raw head output, and mAP@0.5 of its detections
+    scored against PyTorch's. Every metric that could be computed must be
+    within its tolerance; with neither (no reference detections and no raw
+    output) the backend is "not evaluated" and does not pass.
+    """
+    frames = load_frames(source, PARITY_FRAMES) if source else []
+    if not frames:
+        frames = load_frames(None, PARITY_FRAMES)
+    report: Dict = {"frames": len(frames), "min_map50": PARITY_MIN_MAP.get(backend, 0.0),
+                    "max_abs_diff_tolerance": PARITY_MAX_ABS_DIFF.get(backend, 0.0)}
+
+    try:
+        import torch
+        blob = letterbox_blob(frames[0])
+        net = torch_model.model.float().eval()
+        with torch.no_grad():
+            ref = net(torch.from_numpy(blob))
+        ref = (ref[0] if isinstance(ref, (list, tuple)) else ref).numpy()
+        session = ort.InferenceSession(onnx_path, providers=["CPUExecutionProvider"])
+        out = session.run(None, {session.get_inputs()[0].name: blob})[0]
+        report["max_abs_diff"] = round(float(np.abs(ref - out).max()), 5)
+    except Exception as e:
+        report["max_abs_diff"] = None
+        report["raw_error"] = str(e)
+
+    reference = [result_arrays(r) for r in torch_model(frames, verbose=False, conf=DETECT_CONF)]
+    detections = [result_arrays(r) for r in candidate(frames, verbose=False, conf=DETECT_CONF)]
+    score = detection_map(reference, detections)
+    report["map50"] = None if score is None else round(score, 4)
+    # mAP needs reference detections (synthetic frames have none); raw diff needs the ONNX session
+    checks = {}
+    if score is not None:
+        checks["map50"] = score >= report["min_map50"]
+    if report["max_abs_diff"] is not None:
+        checks["max_abs_diff"] = report["max_abs_diff"] <= report["max_abs_diff_tolerance"]
+    report["checks"] = checks
+    report["passed"] = bool(checks) and all(checks.values())
+    report["status"] = "not evaluated" if not checks else "passed" if report["passed"] else "failed"
+    return report
+
+
+def create_backend(name: str = INFERENCE_BACKEND, **kwargs) -> TorchBackend:
+    """
+    Load the configured backend; anything that cannot be built, or fails its
+    parity check, falls back to PyTorch.
+    """
+    cls = BACKENDS.get(name)
+    if cls is None:
+        print(f"⚠️ Unknown INFERENCE_BACKEND '{name}' (use {', '.join(BACKENDS)}) - using torch")
+        cls = TorchBackend
+    backend = cls(**kwargs) if cls is not TorchBackend else cls()
+    print(f"🧠 Loading detector ({backend.name})...")
+    try:
+        ready = backend.load()
+    except Exception as e:
+        print(f"❌ {backend.name} backend failed: {e}")
+        ready = False
+    if ready:
+        print(f"✅ Detector ready: {backend.weights} via {backend.name}")
+        return backend
+    if cls is TorchBackend:
+        print("❌ All YOLO models failed")
+        return backend
+    print("⚠️ Falling back to the torch backend")
+    return create_backend("torch")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export / quantize / parity-check a detector backend")
+    parser.add_argument("--backend", default=INFERENCE_BACKEND, choices=sorted(BACKENDS))
+    parser.add_argument("--calibration", default=INT8_CALIBRATION_SOURCE,
+                        help="Recording or image directory (int8 calibration and parity frames)")
+    parser.add_argument("--force", action="store_true", help="Rebuild even if a cached model exists")
+    args = parser.parse_args()
+
+    if args.backend == "torch":
+        backend = TorchBackend()
+    else:
+        backend = BACKENDS[args.backend](calibration=args.calibration, force=args.force)
+    if not backend.load():
+        sys.exit(1)
+    print(json.dumps(backend.get_stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""
+Inference Executor - Off-Loop Model Execution
+Runs YOLO / InsightFace work on a dedicated thread pool or on inference
+worker processes (see inference_workers.py) so the FastAPI event loop keeps
+serving requests, WebSockets and DB writes while the model is busy.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from inference_workers import InferenceWorkerPool
+
+# Configuration (overridable via environment)
+INFERENCE_EXECUTOR = os.getenv("INFERENCE_EXECUTOR", "thread")  # thread | process
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "1"))
+
+
+def _timed_call(fn: Callable, args: tuple):
+    """Execute fn in the worker and report when it started and how long it ran"""
+    started = time.time()
+    t0 = time.perf_counter()
+    result = fn(*args)
+    return result, started, time.perf_counter() - t0
+
+
+# ==============================================================================
+# EXECUTOR
+# ==============================================================================
+
+class InferenceExecutor:
+    """
+    Awaitable wrapper around a thread pool or an InferenceWorkerPool.
+    Tracks queue depth plus per-call execution latency and queue wait.
+    """
+
+    def __init__(self, mode: str = INFERENCE_EXECUTOR, max_workers: int = INFERENCE_WORKERS,
+                 history: int = 200):
+        if mode not in ("thread", "process"):
+            raise ValueError(f"Unknown executor mode: {mode}")
+        self.mode = mode
+        self.max_workers = max(1, max_workers)
+        self.pending = 0
+        self.completed = 0
+        self.failed = 0
+        self._latencies = deque(maxlen=history)
+        self._waits = deque(maxlen=history)
+        self._lock = threading.Lock()
+        self._pool = self._create_pool()
+        print(f"⚙️  Inference executor: {self.mode} pool x{self.max_workers}")
+
+    def _create_pool(self):
+        if self.mode == "process":
+            return InferenceWorkerPool(self.max_workers)
+        return ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="inference")
+
+    def _record(self, elapsed: float, wait: float):
+        with self._lock:
+            self.completed += 1
+            self._latencies.append(elapsed)
+            self._waits.append(max(0.0, wait))
+
+    async def run(self, fn: Callable, *args) -> Any:
+        """Run fn(*args) on the thread pool and await its result"""
+        if self.mode == "process":
+            raise RuntimeError("Inference worker processes only run detection batches")
+        loop = asyncio.get_running_loop()
+        submitted = time.time()
+        with self._lock:
+            self.pending += 1
+        try:
+            result, started, elapsed = await loop.run_in_executor(self._pool, _timed_call, fn, args)
+        except Exception:
+            with self._lock:
+                self.failed += 1
+            raise
+        finally:
+            with self._lock:
+                self.pending -= 1
+
+        self._record(elapsed, started - submitted)
+        return result
+
+    async def analyze(self, engine, channel=None) -> Dict:
+        """Awaitable counterpart of VisionEngine.analyze()"""
+        return (await self.analyze_batch(engine, [channel or engine.channel]))[0]
+
+    async def analyze_batch(self, engine, channels: List) -> List[Dict]:
+        """
+        Awaitable counterpart of VisionEngine.analyze_batch().
+        Thread mode runs the whole call on the pool; process mode keeps the
+        frame bookkeeping local and hands each worker references to the
+        shared-memory frames of the cameras assigned to it.
+        """
+        if self.mode == "thread":
+            return await self.run(engine.analyze_batch, channels)
+
+        due, jobs, leases = engine.prepare_batch(channels)
+        results = []
+        if jobs:
+            try:
+                results = await self._run_on_workers(jobs, leases, engine.get_inference_options())
+            finally:
+                engine.release_frames(due, leases)
+
+        # Tracking stays in this process: trackers are per-camera state
+        return engine.finish_batch(channels, due, jobs, results)
+
+    async def _run_on_workers(self, jobs: List[tuple], leases: List, options: Dict) -> List[List[Dict]]:
+        """Split a batch by camera-to-worker assignment and run the parts in parallel"""
+        groups: Dict[int, List[int]] = {}
+        for i, job in enumerate(jobs):
+            groups.setdefault(self._pool.worker_for(job[2]), []).append(i)
+
+        submitted = time.time()
+        calls = []
+        for index, members in groups.items():
+            # A shared ring slot travels as its SharedFrameRef, never as pixels
+            parts = [((leases[i].ref if leases[i] is not None and leases[i].ref is not None else jobs[i][0]),)
+                     + tuple(jobs[i][1:]) for i in members]
+            calls.append(asyncio.wrap_future(self._pool.submit(index, parts, options)))
+        with self._lock:
+            self.pending += len(calls)
+        try:
+            # Wait for every part: a worker may still be reading a slot another part failed on
+            done = await asyncio.gather(*calls, return_exceptions=True)
+        finally:
+            with self._lock:
+                self.pending -= len(calls)
+
+        results: List[List[Dict]] = [[] for _ in jobs]
+        for members, outcome in zip(groups.values(), done):
+            if isinstance(outcome, BaseException):
+                with self._lock:
+                    self.failed += 1
+                print(f"❌ Inference error ({', '.join(jobs[i][2] for i in members)}): {outcome}")
+                continue
+            detections, started, elapsed = outcome
+            self._record(elapsed, started - submitted)
+            for i, dets in zip(members, detections):
+                results[i] = dets
+        return results
+
+    def shutdown(self):
+        if self.mode == "process":
+            self._pool.shutdown()
+        else:
+            self._pool.shutdown(wait=False)
+
+    @property
+    def queue_depth(self) -> int:
+        """Calls waiting for a free worker"""
+        return max(0, self.pending - self.max_workers)
+
+    def recent_latency(self, window: int = 20) -> Optional[float]:
+        """Mean execution latency (ms) of the last `window` calls"""
+        with self._lock:
+            recent = list(self._latencies)[-window:]
+        return sum(recent) / len(recent) * 1000 if recent else None
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            latencies = np.array(self._latencies) * 1000 if self._latencies else None
+            waits = np.array(self._waits) * 1000 if self._waits else None
+            stats = {
+                "mode": self.mode,
+                "workers": self.max_workers,
+                "pending": self.pending,
+                "queue_depth": self.queue_depth,
+                "completed": self.completed,
+                "failed": self.failed,
+            }
+        if self.mode == "process":
+            stats["process_workers"] = self._pool.get_stats()
+
+        if latencies is not None:
+            stats["latency_ms"] = {
+                "last": round(float(latencies[-1]), 2),
+                "avg": round(float(latencies.mean()), 2),
+                "p95": round(float(np.percentile(latencies, 95)), 2),
+                "max": round(float(latencies.max()), 2)
+            }
+            stats["queue_wait_ms"] = {
+                "avg": round(float(waits.mean()), 2),
+                "max": round(float(waits.max()), 2)
+            }
+        return stats
@@ -0,0 +1,331 @@
+"""
+Inference Workers - Process Pool with Shared-Memory Frames
+N worker processes, each with its own detection engine, so result parsing,
+face matching and detection building run on separate cores instead of
+behind one GIL. Frames never cross a queue: capture threads write them
+into shared-memory FrameRings, a job only carries each frame's
+SharedFrameRef, and the parent keeps the slot borrowed until the worker's
+result comes back over the shared result queue.
+
+Each camera sticks to one worker - pinned with INFERENCE_WORKER_ASSIGNMENT
+("CAM_1:0,CAM_2:1"), otherwise given to the worker with the fewest cameras
+the first time it is seen.
+"""
+
+import itertools
+import multiprocessing as mp
+import os
+import queue
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Tuple
+
+from frame_ring import SharedFrameReader, SharedFrameRef
+
+# Configuration (overridable via environment)
+INFERENCE_WORKER_ASSIGNMENT = os.getenv("INFERENCE_WORKER_ASSIGNMENT", "")      # camera_id:worker,...
+INFERENCE_WORKER_THREADS = int(os.getenv("INFERENCE_WORKER_THREADS", "0"))     # torch threads per worker (0 = cores / workers)
+
+
+def parse_assignment(spec: str, workers: int) -> Dict[str, int]:
+    """'CAM_1:0,CAM_2:1' -> {'CAM_1': 0, 'CAM_2': 1}; bad entries are skipped"""
+    pinned = {}
+    for entry in filter(None, (e.strip() for e in spec.split(","))):
+        camera_id, _, index = entry.rpartition(":")
+        try:
+            worker = int(index)
+        except ValueError:
+            worker = -1
+        if not camera_id or not 0 <= worker < workers:
+            print(f"⚠️ Ignoring worker assignment '{entry}' ({workers} worker(s))")
+            continue
+        pinned[camera_id] = worker
+    return pinned
+
+
+# ==============================================================================
+# WORKER PROCESS
+# ==============================================================================
+
+def app_state_types() -> tuple:
+    """
+    What a worker must never inherit from the launch script: spawn re-runs
+    it as __mp_main__ in every worker before _worker_main starts
+    """
+    from face_gallery import FaceGallery
+    from inference_executor import InferenceExecutor
+    from vision_engine import InsightFaceRecognizer, VisionEngine
+    return VisionEngine, InsightFaceRecognizer, FaceGallery, InferenceExecutor, InferenceWorkerPool
+
+
+def inherited_app_state() -> List[str]:
+    """Globals of the re-run launch script that built app state in this process (should be none)"""
+    launcher = sys.modules.get("__mp_main__")
+    if launcher is None:
+        return []
+    types = app_state_types()
+    return sorted(name for name, value in vars(launcher).items() if isinstance(value, types))
+
+
+def probe_worker_imports(results) -> None:
+    """Spawn target for test_worker_spawn.py: report what the launch script built"""
+    results.put(inherited_app_state())
+
+
+def _worker_main(worker_id: int, jobs: mp.Queue, results: mp.Queue, threads: int):
+    """Worker loop: (call_id, jobs, options) in, (call_id, worker_id, detections, error, started, elapsed) out"""
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    from vision_engine import VisionEngine
+
+    # Anything here is a second model / writable gallery in this worker
+    inherited = inherited_app_state()
+
+    # The parent owns the face gallery; workers map it read-only
+    engine = VisionEngine(source=None, gallery_readonly=True)
+    reader = SharedFrameReader()
+    results.put((None, worker_id, os.getpid(), inherited or None, time.time(), 0.0))  # ready
+
+    while True:
+        message = jobs.get()
+        if message is None:
+            break
+        call_id, batch, options = message
+        started = time.time()
+        t0 = time.perf_counter()
+        try:
+            # Mirror the parent engine's runtime settings (QoS level) before detecting
+            engine.set_inference_options(options)
+            engine.face_recognizer.gallery.refresh()  # pick up enrolled / removed suspects
+            batch = [(reader.view(job[0]) if isinstance(job[0], SharedFrameRef) else job[0],) + tuple(job[1:])
+                     for job in batch]
+            detections = engine.detect_batch(batch)
+            results.put((call_id, worker_id, detections, None, started, time.perf_counter() - t0))
+        except Exception as e:
+            results.put((call_id, worker_id, None, f"{type(e).__name__}: {e}", started,
+                         time.perf_counter() - t0))
+        finally:
+            batch = None  # drop the frame views before the parent frees the slots
+    reader.close()
+
+
+# ==============================================================================
+# POOL
+# ==============================================================================
+
+class WorkerHandle:
+    """Parent-side view of one worker process"""
+
+    def __init__(self, index: int, process, jobs: mp.Queue):
+        self.index = index
+        self.process = process
+        self.jobs = jobs
+        self.pid: Optional[int] = None  # set once the engine has loaded
+        self.inherited: List[str] = []  # app globals the launch script built in the worker
+        self.cameras = set()
+        self.pending = 0
+        self.completed = 0
+        self.failed = 0
+        self.restarts = 0
+        self.latencies = deque(maxlen=100)
+
+    @property
+    def ready(self) -> bool:
+        return self.pid is not None
+
+
+class InferenceWorkerPool:
+    """
+    Spawned worker processes with one job queue each and a shared result
+    queue. submit() returns a concurrent Future resolved by a collector
+    thread; a worker that dies fails its pending calls and is respawned.
+    Spawn re-runs the launch script (main.py) as __mp_main__ in every
+    worker, so the app must build its engine, gallery and executor in the
+    startup handler rather than at import; each worker reports any such
+    state it finds on startup (see inherited_app_state).
+    """
+
+    def __init__(self, workers: int, assignment: str = INFERENCE_WORKER_ASSIGNMENT,
+                 threads: int = INFERENCE_WORKER_THREADS):
+        self.size = max(1, workers)
+        self.threads = threads if threads > 0 else max(1, (os.cpu_count() or 1) // self.size)
+        self.pinned = parse_assignment(assignment, self.size)
+        # spawn: torch and the capture threads do not survive fork()
+        self._ctx = mp.get_context("spawn")
+        self._results = self._ctx.Queue()
+        self._calls: Dict[int, Tuple[Future, int]] = {}
+        self._assigned: Dict[str, int] = dict(self.pinned)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._lifecycle = threading.Lock()  # start / reap / shutdown
+        self.workers: List[WorkerHandle] = []
+        self._collector: Optional[threading.Thread] = None
+        self._running = False
+        self._closed = False
+
+    def start(self):
+        with self._lifecycle:
+            if self._running:
+                return
+            if self._closed:
+                raise RuntimeError("Inference worker pool is shut down")
+            self.workers = [self._spawn(i) for i in range(self.size)]
+            for camera_id, index in self._assigned.items():
+                self.workers[index].cameras.add(camera_id)
+            self._running = True
+            self._collector = threading.Thread(target=self._collect, name="inference-results", daemon=True)
+            self._collector.start()
+        print(f"⚙️  Inference workers: {self.size} process(es), {self.threads} thread(s) each, "
+              f"pinned: {self.pinned or 'none'}")
+
+    def _spawn(self, index: int) -> WorkerHandle:
+        jobs = self._ctx.Queue()
+        process = self._ctx.Process(target=_worker_main, args=(index, jobs, self._results, self.threads),
+                                    name=f"inference-worker-{index}", daemon=True)
+        process.start()
+        return WorkerHandle(index, process, jobs)
+
+    # ------------------------------------------------------------------
+    # Dispatch
+    # ------------------------------------------------------------------
+
+    def worker_for(self, camera_id: str) -> int:
+        """Worker that runs this camera's frames (sticky once chosen)"""
+        self.start()
+        with self._lock:
+            index = self._assigned.get(camera_id)
+            if index is None:
+                index = min(self.workers, key=lambda w: (len(w.cameras), w.index)).index
+                self._assigned[camera_id] = index
+                self.workers[index].cameras.add(camera_id)
+            return index
+
+    def submit(self, index: int, jobs: List[tuple], options: Dict) -> Future:
+        """
+        Queue a detect_batch() call on one worker. Frames must already be
+        SharedFrameRefs (plain arrays work but are pickled). The Future
+        yields (detections, started, elapsed).
+        """
+        self.start()
+        future = Future()
+        with self._lock:
+            call_id = next(self._ids)
+            self._calls[call_id] = (future, index)
+            worker = self.workers[index]
+            worker.pending += 1
+        worker.jobs.put((call_id, jobs, options))
+        return future
+
+    def _collect(self):
+        """Collector thread: resolve futures from the result queue, reap dead workers"""
+        last_reap = time.monotonic()
+        while self._running:
+            if time.monotonic() - last_reap >= 1.0:
+                self._reap()
+                last_reap = time.monotonic()
+            try:
+                message = self._results.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                break
+            call_id, index, payload, error, started, elapsed = message
+            if call_id is None:
+                self.workers[index].pid = payload
+                self.workers[index].inherited = error or []
+                print(f"✅ Inference worker {index} ready (pid {payload}, {self.threads} thread(s))")
+                if error:
+                    print(f"⚠️ Inference worker {index} inherited app state from the launch script: "
+                          f"{', '.join(error)} (build it at startup, not at import)")
+                continue
+
+            with self._lock:
+                entry = self._calls.pop(call_id, None)
+                worker = self.workers[index]
+                worker.pending = max(0, worker.pending - 1)
+                if error:
+                    worker.failed += 1
+                else:
+                    worker.completed += 1
+                    worker.latencies.append(elapsed)
+            if entry is None:
+                continue
+            future = entry[0]
+            if error:
+                future.set_exception(RuntimeError(f"Inference worker {index}: {error}"))
+            else:
+                future.set_result((payload, started, elapsed))
+
+    def _reap(self):
+        with self._lifecycle:
+            for worker in list(self.workers):
+                if self._running and not worker.process.is_alive():
+                    print(f"⚠️ Inference worker {worker.index} exited ({worker.process.exitcode}) - respawning")
+                    self._replace(worker)
+
+    def _replace(self, worker: WorkerHandle):
+        """Fail a worker's outstanding calls and start a fresh process in its place"""
+        self._fail_calls(lambda index: index == worker.index, "worker restarted")
+        fresh = self._spawn(worker.index)
+        fresh.cameras = worker.cameras
+        fresh.restarts = worker.restarts + 1
+        self.workers[worker.index] = fresh
+
+    def _fail_calls(self, match, reason: str):
+        with self._lock:
+            failed = [(cid, entry) for cid, entry in self._calls.items() if match(entry[1])]
+            for cid, _ in failed:
+                del self._calls[cid]
+        for _, (future, index) in failed:
+            future.set_exception(RuntimeError(f"Inference worker {index}: {reason}"))
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    def shutdown(self):
+        with self._lifecycle:
+            self._closed = True
+            if not self._running:
+                return
+            self._running = False
+            for worker in self.workers:
+                self._stop_worker(worker)
+        self._fail_calls(lambda index: True, "pool shut down")
+        self._results.close()
+
+    @staticmethod
+    def _stop_worker(worker: WorkerHandle, timeout: float = 2.0):
+        try:
+            worker.jobs.put(None)
+        except (ValueError, OSError):
+            pass
+        worker.process.join(timeout)
+        if worker.process.is_alive():
+            worker.process.terminate()
+        worker.jobs.close()
+
+    def get_stats(self) -> List[Dict]:
+        with self._lock:
+            return [
+                {
+                    "worker": w.index,
+                    "pid": w.pid,
+                    "alive": w.process.is_alive(),
+                    "ready": w.ready,
+                    "inherited_app_state": w.inherited,
+                    "cameras": sorted(w.cameras),
+                    "pending": w.pending,
+                    "completed": w.completed,
+                    "failed": w.failed,
+                    "restarts": w.restarts,
+                    "avg_latency_ms": round(sum(w.latencies) / len(w.latencies) * 1000, 2) if w.latencies else None
+                }
+                for w in self.workers
+            ]
@@ -3,9 +3,10 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 import asyncio
 import json
+import os
 import cv2
 from datetime import datetime
-from typing import List, Dict
+from typing import List, Dict, Optional
 import time
 import uvicorn
 from fastapi.responses import StreamingResponse
@@ -14,6 +15,19 @@ import io
 from mock_detector import MockDetector, ThreatLevel
 from mock_fusion import MockFusionEngine
 from prediction_engine import ThreatPredictor
+from result_hub import ResultHub
+from inference_executor import InferenceExecutor, INFERENCE_EXECUTOR, INFERENCE_WORKERS
+from camera_manager import CameraManager
+from motion_gate import validate_config as validate_motion_config
+from qos_governor import QoSGovernor, QOS_INTERVAL
+from pipeline import InferencePipeline, PIPELINE_ENABLED
+from video_broadcaster import VideoBroadcaster, MJPEG_MEDIA_TYPE, VIDEO_DEFAULT_RENDITION
+from client_stream import ConnectionManager
+from stream_codec import negotiate_encoding, parse_resolution
+from stream_topics import Subscription
+from sensor_ticks import SensorTicker, SENSOR_FUSION_HZ, SENSOR_PREDICTION_INTERVAL
+from alert_engine import AlertEngine, CoalescedAlert, DEESCALATED
+from face_gallery import FACE_MATCH_THRESHOLDS, DEFAULT_SUSPECT_PRIORITY
 
 # Try to import Vision Engine
 try:
@@ -49,6 +63,9 @@ from fastapi.staticfiles import StaticFiles
 # VIDEO_SOURCE = "http://172.16.4.124:8080/video"
 VIDEO_SOURCE = 0
 
+# Cameras come from the `cameras` table; VIDEO_SOURCE is used only when it is empty
+CAMERA_SYNC_INTERVAL = float(os.getenv("CAMERA_SYNC_INTERVAL", "10"))  # seconds
+
 # Global instances
 detector = MockDetector(frame_width=1280, frame_height=720)
 fusion_engine = MockFusionEngine()
@@ -56,42 +73,66 @@ predictor = ThreatPredictor()
 vision_engine = None
 using_real_vision = False
 
+# Shared inference fan-out: producers publish per camera, N WebSocket readers
+PRIMARY_CAMERA_ID = "CAM_MAIN"
+result_hub = ResultHub()
+background_tasks: Dict[str, asyncio.Task] = {}
+# Process workers read frames straight out of the capture rings (shared memory)
+camera_manager = CameraManager(fallback_source=VIDEO_SOURCE, fallback_camera_id=PRIMARY_CAMERA_ID,
+                               shared_frames=INFERENCE_EXECUTOR == "process")
+
+# Model inference runs here, never on the event loop (built at startup, see init_vision)
+inference_executor: Optional[InferenceExecutor] = None
+
+# Sheds load (detection rate, model size, face matching, video fps) under pressure
+qos_governor = QoSGovernor()
+
+# One MJPEG encode per camera frame, shared by every /api/ai/video_feed viewer
+video_broadcaster = VideoBroadcaster(camera_manager.get, settings=lambda: qos_governor.current)
+
+# Staged preprocess -> infer -> postprocess -> publish threads (thread executor mode)
+inference_pipeline: Optional[InferencePipeline] = None
+
+# Per-client send queues: a slow operator never delays the others
+manager = ConnectionManager()
+
+# Fusion at the sensors' native rate, predictions on a fixed cadence - never per client or per frame
+sensor_ticker = SensorTicker(manager.publish_channel)
+sensor_ticker.add("fusion", 1.0 / SENSOR_FUSION_HZ, fusion_engine.update)
+sensor_ticker.add("predictions", SENSOR_PREDICTION_INTERVAL, predictor.predict_risks)
+
+# camera_id -> {track_id: last threat level saved}
+track_reports: Dict[str, Dict[int, str]] = {}
+
+# Merges repeated threat hits per object; emits only new alerts and severity changes
+alert_engine = AlertEngine()
+
 print(f"🔧 CONFIG: VISION_AVAILABLE={VISION_AVAILABLE}", flush=True)
 print(f"🔧 CONFIG: VIDEO_SOURCE={VIDEO_SOURCE}", flush=True)
 
-if VISION_AVAILABLE:
+
+def init_vision():
+    """
+    Build the executor and the shared engine (model + face gallery).
+    Called from startup, never at import: spawned inference workers re-run
+    this module as __mp_main__ and must not load a second model or open the
+    gallery for writing.
+    """
+    global inference_executor, vision_engine, using_real_vision
+    inference_executor = InferenceExecutor(mode=INFERENCE_EXECUTOR, max_workers=INFERENCE_WORKERS)
+    if not VISION_AVAILABLE:
+        return
     try:
+        # One shared engine (model + face gallery); cameras attach at startup
         print("🚀 Initializing Vision Engine...", flush=True)
-        vision_engine = VisionEngine(source=VIDEO_SOURCE)
-        vision_engine.start()
+        # Process workers run their own detector; the parent would only hold a copy
+        vision_engine = VisionEngine(source=None, load_detector=INFERENCE_EXECUTOR != "process")
         using_real_vision = True
-        print("✅ Vision Engine Started", flush=True)
+        print("✅ Vision Engine Ready", flush=True)
     except Exception as e:
          print(f"❌ Failed to start Vision Engine: {e}", flush=True)
          using_real_vision = False
 
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
-    
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
-        print(f"✅ Client connected. Total: {len(self.active_connections)}")
-    
-    def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
-        print(f"❌ Client disconnected. Total: {len(self.active_connections)}")
-    
-    async def broadcast(self, message: dict):
-        for connection in self.active_connections:
-            try:
-                await connection.send_json(message)
-            except Exception as e:
-                print(f"Error broadcasting: {e}")
-
-manager = ConnectionManager()
-
 async def persist_alert(detection: dict, alert_data: dict):
     """Save critical alert to backend API"""
     try:
@@ -148,7 +189,7 @@ async def save_detection(detection: dict):
         async with AsyncSessionLocal() as db:
             det = Detection(
                 detection_id=f"DET_{int(time.time()*1000)}_{random.randint(10000,99999)}",
-                camera_id="CAM_MAIN",
+                camera_id=detection.get("camera_id") or PRIMARY_CAMERA_ID,
                 frame_id=detection.get("frame_id", 0),
                 object_class=detection["class"],
                 confidence=detection["confidence"],
@@ -198,38 +239,53 @@ async def root():
         "timestamp": datetime.utcnow().isoformat()
     }
 
-from database import init_db, get_db, Detection, Alert, Log, Camera, Incident, Setting, DailyStat
+from database import init_db, get_db, Detection, Alert, Log, Camera, Incident, Setting, DailyStat, Suspect
 from sqlalchemy import select, func
 
 @app.on_event("startup")
 async def startup():
+    global inference_pipeline
+    init_vision()
+
     # Initialize Database
     await init_db()
     print("💾 Database Initialized")
 
-    global vision_engine, using_real_vision
-    
-    if VIDEO_SOURCE is not None and VISION_AVAILABLE:
-        print(f"\n👁️  Initializing Vision Engine: {VIDEO_SOURCE}")
-        try:
-            vision_engine = VisionEngine(source=VIDEO_SOURCE)
-            vision_engine.start()
-            using_real_vision = True
-            print("✅ Vision Engine Started")
-        except Exception as e:
-            print(f"⚠️  Vision Engine Failed: {e}")
-            vision_engine = None
+    if using_real_vision and vision_engine:
+        await sync_face_gallery()
+        sync = await camera_manager.sync_from_db()
+        print(f"👁️  Capturing {len(sync['active'])} camera(s): {', '.join(sync['active'])}")
+        if PIPELINE_ENABLED and inference_executor.mode == "thread":
+            inference_pipeline = InferencePipeline(vision_engine, camera_manager, publish_batch)
+            inference_pipeline.start(asyncio.get_running_loop())
+        else:
+            background_tasks["inference"] = asyncio.create_task(inference_scheduler())
+        background_tasks["camera_sync"] = asyncio.create_task(camera_sync_loop())
+        background_tasks["qos"] = asyncio.create_task(qos_loop())
     else:
         print("\n⚠️  Using MOCK DETECTOR (Vision Engine unavailable)")
-    
+        background_tasks["inference"] = asyncio.create_task(mock_producer(PRIMARY_CAMERA_ID))
+
+    for name in sensor_ticker.feeds:
+        background_tasks[f"sensor_{name}"] = asyncio.create_task(sensor_ticker.run(name))
+
     mode = "REAL YOLOv8" if using_real_vision else "MOCK DETECTOR"
     print(f"\n🛡️  AUTONOMOUS SHIELD - {mode} MODE")
     print("="*60)
 
 @app.on_event("shutdown")
 async def shutdown():
-    if vision_engine:
-        vision_engine.stop()
+    for task in background_tasks.values():
+        task.cancel()
+    background_tasks.clear()
+    video_broadcaster.stop_all()
+    if inference_pipeline:
+        await asyncio.to_thread(inference_pipeline.stop)
+    if inference_executor:
+        inference_executor.shutdown()
+
+    if camera_manager.channels:
+        camera_manager.stop_all()
         print("🛑 Vision Engine Stopped")
 
 
@@ -239,8 +295,12 @@ async def get_model_status():
     mode = "Real YOLOv8" if using_real_vision else "Mock Detector"
     stats = {}
     
-    if vision_engine:
-         stats = vision_engine.analyze()["stats"]
+    # Read the producer's latest stats instead of triggering another inference
+    latest = result_hub.latest(camera_manager.primary_camera_id or PRIMARY_CAMERA_ID)
+    if latest:
+        stats = latest.data.get("stats", {})
+    executor_stats = inference_executor.get_stats() if inference_executor else {}
+    latency = executor_stats.get("latency_ms")
 
     return {
         "model": {
@@ -249,15 +309,26 @@ async def get_model_status():
             "status": "loaded" if using_real_vision else "mock",
             "confidence_threshold": 0.50,
             "input_resolution": stats.get('res', 'Unknown'),
-            "inference_time": "~15ms",
+            "inference_time": f"{latency['avg']}ms" if latency else "~15ms",
             "edge_optimized": True,
-            "video_source": str(VIDEO_SOURCE) if VIDEO_SOURCE else "None",
+            "backend": vision_engine.backend.get_stats() if vision_engine and vision_engine.backend else None,
+            "video_source": ", ".join(str(ch.source) for ch in camera_manager.channels.values()) or "None",
             "using_real_video": using_real_vision
         },
         "statistics": {
             "uptime": "operational",
             "fps": stats.get('fps', 0),
-            "status": stats.get('status', 'unknown')
+            "status": stats.get('status', 'unknown'),
+            "cameras": camera_manager.get_stats(),
+            "stream": result_hub.get_stats(),
+            "qos": qos_governor.get_stats(),
+            "pipeline": inference_pipeline.get_stats() if inference_pipeline else None,
+            "video": video_broadcaster.get_stats(),
+            "clients": manager.get_stats(),
+            "sensors": sensor_ticker.get_stats(),
+            "alerts": alert_engine.get_stats(),
+            "face_gallery": vision_engine.face_recognizer.gallery.get_stats() if vision_engine else None,
+            "executor": executor_stats
         },
         "classes": ["human", "vehicle", "weapon"],
         "threat_levels": ["normal", "suspicious", "critical"]
@@ -296,40 +367,80 @@ async def detect_frame():
         "timestamp": datetime.utcnow().isoformat()
     }
 
-# MJPEG Streaming Generator - Maximum Performance
-def generate_frames():
-    consecutive_errors = 0
-    while True:
-        if vision_engine and vision_engine.camera:
-            frame = vision_engine.camera.get_frame()
-            if frame is not None:
-                consecutive_errors = 0
-                # Lowest quality for fastest streaming
-                _, buffer = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), 30])
-                yield (b'--frame\r\n'
-                       b'Content-Type: image/jpeg\r\n\r\n' + buffer.tobytes() + b'\r\n')
-            else:
-                consecutive_errors += 1
-                if consecutive_errors % 100 == 0:
-                     print(f"⚠️ Warning: Camera returning None (x{consecutive_errors})")
-                time.sleep(0.01)
-        else:
-            time.sleep(0.01)
-
 @app.get("/api/ai/video_feed")
-def video_feed():
-    """Stream real-time video via MJPEG"""
+async def video_feed(camera_id: Optional[str] = None, rendition: str = VIDEO_DEFAULT_RENDITION):
+    """
+    Stream real-time video via MJPEG (each frame encoded once per rendition
+    for all viewers). ?rendition= picks a size/quality/fps preset from
+    /api/ai/video_renditions, or "auto" to follow the viewer's link.
+    """
     if not VISION_AVAILABLE or not vision_engine:
          return JSONResponse(status_code=503, content={"error": "Vision engine not available"})
     
-    return StreamingResponse(generate_frames(), media_type="multipart/x-mixed-replace; boundary=frame")
+    channel = camera_manager.get(camera_id)
+    if not channel:
+        return JSONResponse(status_code=404, content={"error": f"Camera not active: {camera_id}"})
+    if not video_broadcaster.accepts(rendition):
+        return JSONResponse(status_code=400, content={
+            "error": f"Unknown rendition: {rendition}",
+            "renditions": ["auto"] + list(video_broadcaster.renditions)
+        })
+    
+    return StreamingResponse(video_broadcaster.stream(channel.camera_id, rendition), media_type=MJPEG_MEDIA_TYPE)
+
+@app.get("/api/ai/video_renditions")
+async def video_renditions():
+    """Video renditions a client can request from /api/ai/video_feed"""
+    return {"default": VIDEO_DEFAULT_RENDITION, "renditions": video_broadcaster.get_renditions()}
+
+# ==============================================================================
+# CAMERA MANAGEMENT API
+# ==============================================================================
+
+@app.get("/api/ai/cameras")
+async def list_active_cameras():
+    """Cameras currently being captured and analyzed"""
+    return {
+        "primary": camera_manager.primary_camera_id,
+        "cameras": camera_manager.get_stats()
+    }
+
+@app.get("/api/ai/cameras/{camera_id}/motion")
+async def get_motion_gate(camera_id: str):
+    """Motion-gate thresholds and motion-score stats for one camera"""
+    channel = camera_manager.get(camera_id)
+    if not channel:
+        return JSONResponse(status_code=404, content={"error": f"Camera not active: {camera_id}"})
+    return {"camera_id": camera_id, "motion": channel.motion_gate.get_stats()}
+
+@app.put("/api/ai/cameras/{camera_id}/motion")
+async def configure_motion_gate(camera_id: str, config: Dict):
+    """
+    Tune motion gating for one camera (persisted in settings).
+    Keys: enabled, threshold, pixel_threshold, refresh_interval, learning_rate
+    """
+    try:
+        config = validate_motion_config(config)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    applied = await camera_manager.configure_motion(camera_id, config)
+    if applied is None:
+        return JSONResponse(status_code=404, content={"error": f"Camera not active: {camera_id}"})
+    return {"camera_id": camera_id, "motion": applied}
+
+@app.post("/api/ai/cameras/sync")
+async def sync_cameras():
+    """Re-read the cameras table now instead of waiting for the next sync tick"""
+    if not using_real_vision:
+        return JSONResponse(status_code=503, content={"error": "Vision engine not available"})
+    return await camera_manager.sync_from_db()
 
 # ==============================================================================
 # SUSPECT MANAGEMENT API
 # ==============================================================================
 import os
 import shutil
-from fastapi import UploadFile, File
+from fastapi import UploadFile, File, Form
 
 KNOWN_FACES_DIR = "assets/known_faces"
 os.makedirs(KNOWN_FACES_DIR, exist_ok=True)
@@ -337,125 +448,454 @@ os.makedirs(KNOWN_FACES_DIR, exist_ok=True)
 # Mount static files to serve images
 app.mount("/api/suspects/image", StaticFiles(directory=KNOWN_FACES_DIR), name="suspects")
 
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+def suspect_name(filename: str) -> str:
+    return os.path.splitext(filename)[0].replace("_", " ").title()
+
+async def embed_suspect_image(path: str):
+    """Run the face model on one image, off the event loop"""
+    recognizer = vision_engine.face_recognizer
+    if inference_executor.mode == "thread":
+        # Share the inference thread with YOLO / frame face matching
+        return await inference_executor.run(recognizer.embed_image, path)
+    return await asyncio.to_thread(recognizer.embed_image, path)
+
+def unique_suspect_id(filename: str, taken: set) -> str:
+    """SUS_<STEM>, suffixed _2, _3... if a row (active or not) already uses it; claims the id in `taken`"""
+    base = f"SUS_{os.path.splitext(filename)[0].upper()}"
+    suspect_id, n = base, 1
+    while suspect_id in taken:
+        n += 1
+        suspect_id = f"{base}_{n}"
+    taken.add(suspect_id)
+    return suspect_id
+
+async def sync_face_gallery():
+    """
+    Reconcile the on-disk face gallery with the suspects table at startup.
+    Rows that already carry an embedding are enrolled without running the
+    face model; only images never embedded before (e.g. files copied into
+    KNOWN_FACES_DIR by hand) are embedded, once. Images whose row was
+    deactivated stay out of the gallery.
+    """
+    from database import AsyncSessionLocal
+    gallery = vision_engine.face_recognizer.gallery
+    enroll = []
+    async with AsyncSessionLocal() as db:
+        # Inactive rows too: their files must not get a second row (unique suspect_id)
+        rows = (await db.execute(select(Suspect))).scalars().all()
+        taken = {s.suspect_id for s in rows}
+        known = {os.path.basename(s.image_path) for s in rows}
+        suspects = {os.path.basename(s.image_path): s for s in rows if s.active}
+
+        for filename in os.listdir(KNOWN_FACES_DIR):
+            if filename.endswith(IMAGE_EXTENSIONS) and filename not in known:
+                suspect = Suspect(suspect_id=unique_suspect_id(filename, taken), name=suspect_name(filename),
+                                  image_path=os.path.join(KNOWN_FACES_DIR, filename),
+                                  priority=DEFAULT_SUSPECT_PRIORITY, active=True)
+                db.add(suspect)
+                suspects[filename] = suspect
+
+        for filename, suspect in suspects.items():
+            if suspect.embedding is None:
+                embedding = await embed_suspect_image(suspect.image_path)
+                if embedding is None:
+                    continue
+                suspect.embedding = embedding.tolist()
+            row = gallery.get(filename)
+            priority = suspect.priority or DEFAULT_SUSPECT_PRIORITY
+            if row is None or row["priority"] != priority or row["suspect_id"] != suspect.suspect_id:
+                enroll.append((filename, suspect.name, suspect.embedding, priority, suspect.suspect_id))
+        await db.commit()
+
+    stale = [key for key in gallery.keys if key not in suspects]
+    gallery.remove_many(stale)
+    gallery.enroll_many(enroll)
+    print(f"👤 Face gallery: {len(gallery)} identities (+{len(enroll)} -{len(stale)})")
+
+async def upsert_suspect(filename: str, priority: str, embedding=None, new_image: bool = False) -> Suspect:
+    """
+    Create or update the suspects row for an image in KNOWN_FACES_DIR.
+    new_image: the file was replaced, so the stored embedding is dropped
+    unless a new one is given (the next sync embeds it).
+    """
+    from database import AsyncSessionLocal
+    image_path = os.path.join(KNOWN_FACES_DIR, filename)
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(Suspect).where(Suspect.image_path == image_path))
+        suspect = result.scalar_one_or_none()
+        if suspect is None:
+            base = f"SUS_{os.path.splitext(filename)[0].upper()}"
+            taken = await db.execute(select(Suspect.suspect_id).where(Suspect.suspect_id.startswith(base)))
+            suspect = Suspect(
+                suspect_id=unique_suspect_id(filename, set(taken.scalars().all())),
+                name=suspect_name(filename),
+                image_path=image_path
+            )
+            db.add(suspect)
+        suspect.priority = priority
+        suspect.active = True
+        if embedding is not None or new_image:
+            suspect.embedding = embedding.tolist() if embedding is not None else None
+        await db.commit()
+        return suspect
+
+def validate_priority(priority: str) -> Optional[JSONResponse]:
+    if priority.lower() not in FACE_MATCH_THRESHOLDS:
+        return JSONResponse(status_code=400, content={
+            "error": f"Unknown priority '{priority}'",
+            "allowed": sorted(FACE_MATCH_THRESHOLDS)
+        })
+    return None
+
 @app.get("/api/suspects")
 def list_suspects():
     """List all registered suspects"""
     files = []
     if os.path.exists(KNOWN_FACES_DIR):
         for f in os.listdir(KNOWN_FACES_DIR):
-            if f.endswith(('.jpg', '.jpeg', '.png')):
+            if f.endswith(IMAGE_EXTENSIONS):
                 files.append(f)
     return {"suspects": files}
 
 @app.post("/api/suspects")
-async def upload_suspect(file: UploadFile = File(...)):
-    """Upload a new suspect image"""
+async def upload_suspect(file: UploadFile = File(...), priority: str = Form(DEFAULT_SUSPECT_PRIORITY)):
+    """Upload a new suspect image (priority picks the match threshold)"""
+    error = validate_priority(priority)
+    if error:
+        return error
+    priority = priority.lower()
     file_path = os.path.join(KNOWN_FACES_DIR, file.filename)
-    with open(file_path, "wb") as buffer:
+    # Written aside first: an image without a face must not replace a working one
+    upload_path = file_path + ".part"
+    with open(upload_path, "wb") as buffer:
         shutil.copyfileobj(file.file, buffer)
     
-    # Trigger reload if vision engine is active
-    if vision_engine and vision_engine.face_recognizer:
-        vision_engine.face_recognizer.reload()
+    # Embed just this image and add one gallery row (no full reload)
+    embedding = None
+    recognizer = vision_engine.face_recognizer if vision_engine else None
+    if recognizer and recognizer.app is not None:
+        embedding = await embed_suspect_image(upload_path)
+        if embedding is None:
+            os.remove(upload_path)
+            return JSONResponse(status_code=400, content={"error": f"No face found in {file.filename}"})
+    os.replace(upload_path, file_path)
+    suspect = await upsert_suspect(file.filename, priority, embedding, new_image=True)
+    if embedding is not None:
+        recognizer.gallery.enroll(
+            file.filename, suspect.name, embedding, priority, suspect.suspect_id
+        )
+    elif recognizer:
+        # Replaced image not embedded yet: its old face must not keep matching
+        recognizer.gallery.remove(file.filename)
         
-    return {"status": "uploaded", "filename": file.filename}
+    return {"status": "uploaded", "filename": file.filename, "priority": priority,
+            "enrolled": embedding is not None}
+
+@app.put("/api/suspects/{filename}/priority")
+async def update_suspect_priority(filename: str, payload: Dict):
+    """Change a suspect's priority (match threshold) without re-embedding"""
+    priority = str(payload.get("priority", ""))
+    error = validate_priority(priority)
+    if error:
+        return error
+    priority = priority.lower()
+    if not os.path.exists(os.path.join(KNOWN_FACES_DIR, filename)):
+        return JSONResponse(status_code=404, content={"error": "File not found"})
+    await upsert_suspect(filename, priority)
+    if vision_engine and vision_engine.face_recognizer:
+        vision_engine.face_recognizer.gallery.set_priority(filename, priority)
+    return {
+        "filename": filename,
+        "priority": priority,
+        "threshold": FACE_MATCH_THRESHOLDS[priority]
+    }
 
 @app.delete("/api/suspects/{filename}")
-def delete_suspect(filename: str):
+async def delete_suspect(filename: str):
     """Delete a suspect"""
     file_path = os.path.join(KNOWN_FACES_DIR, filename)
     if os.path.exists(file_path):
         os.remove(file_path)
+        from database import AsyncSessionLocal
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(select(Suspect).where(Suspect.image_path == file_path))
+            for suspect in result.scalars().all():
+                await db.delete(suspect)
+            await db.commit()
         
-        # Trigger reload
+        # Drop just this gallery row
         if vision_engine and vision_engine.face_recognizer:
-            vision_engine.face_recognizer.reload()
+            vision_engine.face_recognizer.gallery.remove(filename)
             
         return {"status": "deleted", "filename": filename}
     return JSONResponse(status_code=404, content={"error": "File not found"})
 
+# ==============================================================================
+# INFERENCE SCHEDULING
+# ==============================================================================
+
+async def publish_analysis(camera_id: str, frame_id: int, detections: List[Dict], stats: Dict,
+                           active_tracks: Optional[set] = None):
+    """
+    Publish one analyzed frame to result_hub and run the side effects once,
+    so their rate no longer scales with the number of clients.
+    Tracked detections count only once confirmed and actually observed:
+    they are saved once per track (and again when the track's threat level
+    changes), not once per frame; threat hits go through the alert engine,
+    which emits only new alerts and severity changes.
+    """
+    published = await result_hub.publish(camera_id, {
+        "frame_id": frame_id,
+        "detections": detections,
+        "stats": stats
+    })
+    stream_frame(camera_id, published)
+
+    reported = track_reports.setdefault(camera_id, {})
+    if active_tracks is not None:
+        for track_id in [t for t in reported if t not in active_tracks]:
+            del reported[track_id]
+
+    for det in detections:
+        track_id = det.get("track_id")
+        if track_id is not None and (det.get("interpolated") or not det.get("confirmed")):
+            # Coasting and tentative tracks are neither saved nor alerted on:
+            # a one-frame false positive must not open an alert
+            continue
+
+        if track_id is None:
+            # Untracked source (mock mode): sample every 30 frames
+            if frame_id % 30 == 0:
+                asyncio.create_task(save_detection(det))
+        else:
+            if reported.get(track_id) != det["threat_level"]:
+                reported[track_id] = det["threat_level"]
+                asyncio.create_task(save_detection(det))
+
+        # Threat hits are merged per object; only new alerts and severity changes go out
+        if det["threat_level"] in ["critical", "suspicious"]:
+            update = alert_engine.observe(camera_id, det, active_tracks)
+            if update:
+                emit_alert(camera_id, det, *update)
+
+def emit_alert(camera_id: str, det: Dict, event: str, alert: CoalescedAlert):
+    """Send an opened / re-graded coalesced alert to clients and the backend"""
+    alert_data = detector.generate_threat_alert(det)
+    if not alert_data:
+        return
+    if alert.data:
+        # Same alert, new severity: keep its id and location
+        for key in ("alert_id", "location", "coordinates"):
+            alert_data[key] = alert.data[key]
+    alert_data["camera_id"] = camera_id
+    alert_data["track_id"] = det.get("track_id")
+    alert_data["update"] = event
+    alert_data.update(alert.summary())
+    alert.data = alert_data
+    manager.publish_alert(camera_id, det, {
+        "type": "critical_alert",
+        "alert": alert_data
+    })
+    asyncio.create_task(persist_alert(det, alert_data))
+    if event != DEESCALATED:
+        asyncio.create_task(save_suspect_to_mongodb(alert_data))
+
+def stream_frame(camera_id: str, result):
+    """
+    Build the frame_analysis message once and hand it to the connection
+    manager, which filters it per topic set and serializes each view once
+    for all of the camera's clients (a lagging client loses stale frames,
+    not others' time). Fusion and predictions are the sensor ticker's
+    cached values: the latest fusion snapshot in every frame, the latest
+    prediction in a client's frames until one carrying it was sent to that
+    client (see ConnectionManager.publish_frame).
+    """
+    if not manager.subscribers(camera_id):
+        return
+    frame_data = {
+        "type": "frame_analysis",
+        "camera_id": camera_id,
+        "frame_id": result.data["frame_id"],
+        "detections": result.data["detections"],
+        "mode": "real" if using_real_vision else "mock",
+        "timestamp": datetime.now().isoformat(),
+        "fusion": sensor_ticker.latest("fusion"),
+        "predictions": sensor_ticker.latest("predictions")
+    }
+    frame_size = parse_resolution(result.data["stats"].get("res")) \
+        or (None if using_real_vision else (detector.frame_width, detector.frame_height))
+    predictions_seq = sensor_ticker.feeds["predictions"].seq
+    manager.publish_frame(camera_id, frame_data, frame_size,
+                          ticks={"predictions": predictions_seq} if predictions_seq else None)
+
+async def publish_batch(channels: List, analyses: List[Dict]):
+    """Publish one analyzed batch (scheduler and pipeline publish stage alike)"""
+    for channel, analysis in zip(channels, analyses):
+        await publish_analysis(channel.camera_id, channel.frame_counter,
+                               analysis["detections"], analysis["stats"],
+                               active_tracks=channel.tracker.active_ids())
+
+async def analyze_batch(channels: List):
+    """Analyze a batch of cameras with one model call and publish each result"""
+    try:
+        analyses = await inference_executor.analyze_batch(vision_engine, channels)
+    except Exception as e:
+        print(f"❌ Inference error ({', '.join(ch.camera_id for ch in channels)}): {e}")
+        return
+    await publish_batch(channels, analyses)
+
+async def inference_scheduler():
+    """
+    Background task: feed every active camera's new frames to the shared
+    engine in round-robin order, batching up to vision_engine.max_batch_size
+    cameras per model call. Each frame is analyzed exactly once, and a
+    camera never has more than one analysis in flight.
+    """
+    # Thread workers share one model instance, so only process pools run in parallel
+    slots = inference_executor.max_workers if inference_executor.mode == "process" else 1
+    in_flight: Dict[asyncio.Task, List[str]] = {}
+    print(f"🧠 Inference scheduler started ({slots} slot(s), batch<={vision_engine.max_batch_size})")
+
+    try:
+        while True:
+            if len(in_flight) >= slots:
+                # All slots busy - wake when a batch finishes
+                await asyncio.wait(list(in_flight), return_when=asyncio.FIRST_COMPLETED)
+                continue
+
+            busy = {cid for cids in in_flight.values() for cid in cids}
+            batch = await camera_manager.next_batch(vision_engine.max_batch_size,
+                                                    vision_engine.max_batch_wait, busy)
+            if not batch:
+                # Sleep until a capture thread commits a frame (no polling)
+                await camera_manager.wait_for_frames(timeout=1.0)
+                continue
+
+            task = asyncio.create_task(analyze_batch(batch))
+            in_flight[task] = [ch.camera_id for ch in batch]
+            task.add_done_callback(lambda t: in_flight.pop(t, None))
+    except asyncio.CancelledError:
+        for task in list(in_flight):
+            task.cancel()
+        print("🛑 Inference scheduler stopped")
+        raise
+
+async def camera_sync_loop():
+    """Hot add/remove: periodically reconcile capture threads with the DB"""
+    while True:
+        await asyncio.sleep(CAMERA_SYNC_INTERVAL)
+        try:
+            await camera_manager.sync_from_db()
+        except Exception as e:
+            print(f"❌ Camera sync error: {e}")
+
+async def qos_loop():
+    """Sample latency / staleness / CPU and let the governor pick a level"""
+    qos_governor.apply(vision_engine)
+    while True:
+        await asyncio.sleep(QOS_INTERVAL)
+        try:
+            channels = list(camera_manager.channels.values())
+            staleness = max((ch.last_staleness for ch in channels), default=None)
+            latency = inference_pipeline.recent_latency() if inference_pipeline \
+                else inference_executor.recent_latency()
+            changed = qos_governor.observe(
+                latency_ms=latency,
+                staleness=staleness,
+                cpu=qos_governor.sample_cpu()
+            )
+            if changed:
+                qos_governor.apply(vision_engine)
+        except Exception as e:
+            print(f"❌ QoS governor error: {e}")
+
+async def mock_producer(camera_id: str):
+    """Mock fallback: publish simulated detections at ~30 FPS"""
+    print(f"🧠 Mock producer started for {camera_id}")
+    frame_count = 0
+    while True:
+        try:
+            await asyncio.sleep(0.033)
+            detections = detector.detect_frame()
+            for det in detections:
+                det["camera_id"] = camera_id
+            await publish_analysis(camera_id, frame_count, detections, {})
+            frame_count += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"❌ Mock producer error: {e}")
+            await asyncio.sleep(0.5)
+
 # WebSocket for real-time AI metadata
 @app.websocket("/api/ai/stream")
-async def websocket_stream(websocket: WebSocket):
+async def websocket_stream(websocket: WebSocket, encoding: str = "json"):
     """
     WebSocket endpoint for continuous detection stream
-    Simulates real-time YOLOv8 inference at 20 FPS
+    Frames are pushed from the publish path into the client's own send
+    queue (see client_stream.py), filtered by the topics the client chose
+    with query parameters (?cameras=&min_threat=&classes=..., see
+    stream_topics.py) or later {"type": "subscribe", ...} messages.
+    ?encoding=msgpack switches frame_analysis messages to compact binary
+    frames (see stream_codec.py); all other messages stay JSON.
     """
-    await manager.connect(websocket)
+    default_camera = camera_manager.primary_camera_id or PRIMARY_CAMERA_ID
+    try:
+        subscription = Subscription.parse(websocket.query_params)
+    except ValueError as e:
+        await websocket.accept()
+        await websocket.close(code=1008, reason=str(e))
+        return
+    session = await manager.connect(websocket, default_camera, negotiate_encoding(encoding), subscription)
     
     try:
-        # Send initial connection message
-        await websocket.send_json({
+        # Send initial connection message (tells the client its encoding and topics)
+        session.send({
             "type": "connection",
             "status": "connected",
             "message": "Autonomous Shield AI Stream Active",
+            "encoding": session.encoding,
+            "topics": session.subscription.describe(),
             "timestamp": datetime.utcnow().isoformat()
-        })
+        }, critical=True)
+        # Channel subscribers get the cached fusion / predictions now, not at the next tick
+        sensor_ticker.prime(lambda channel, build: manager.publish_channel(channel, build, [session]))
         
-        # Continuous detection loop
-        frame_count = 0
-        while True:
-            # Throttle to ~30 FPS (0.033s)
-            await asyncio.sleep(0.033)
-            
-            # Perform detection (real or mock)
-            if using_real_vision and vision_engine:
-                 analysis = vision_engine.analyze()
-                 detections = analysis["detections"]
-                 current_frame_id = frame_count
-            else:
-                # Mock fallback
-                detections = detector.detect_frame()
-                current_frame_id = frame_count
-
-            # Send frame analysis
-            frame_data = {
-                "type": "frame_analysis",
-                "frame_id": current_frame_id,
-                "detections": detections,
-                "mode": "real" if using_real_vision else "mock",
-                "timestamp": datetime.now().isoformat(),
-                "fusion": fusion_engine.update(),
-                "predictions": predictor.predict_risks() if frame_count % 300 == 0 else None
-            }
-            
+        # Frames are pushed - here we only take topic changes and notice the client leaving
+        while not session.closed:
             try:
-                await websocket.send_json(frame_data)
-            except RuntimeError:
-                # Connection likely closed
+                message = await asyncio.wait_for(websocket.receive(), timeout=1.0)
+            except asyncio.TimeoutError:
+                continue
+            if message["type"] == "websocket.disconnect":
                 break
-            
-            # Save detections every 30 frames
-            if frame_count % 30 == 0:
-                for det in detections:
-                    asyncio.create_task(save_detection(det))
-            
-            # Create alerts for critical threats
-            for det in detections:
-                if det["threat_level"] in ["critical", "suspicious"]:
-                    alert_data = detector.generate_threat_alert(det)
-                    if alert_data:
-                         await manager.broadcast({
-                             "type": "critical_alert",
-                             "alert": alert_data
-                         })
-                         asyncio.create_task(persist_alert(det, alert_data))
-                         asyncio.create_task(save_suspect_to_mongodb(alert_data))
-            
-            frame_count += 1
+            try:
+                request = json.loads(message.get("text") or "null")
+            except ValueError:
+                request = None
+            if not isinstance(request, dict) or request.get("type") != "subscribe":
+                continue
+            try:
+                manager.subscribe(session, Subscription.parse(request, base=session.subscription))
+            except ValueError as e:
+                session.send({"type": "error", "message": str(e)}, critical=True)
+                continue
+            session.send({"type": "subscribed", "topics": session.subscription.describe()}, critical=True)
+            sensor_ticker.prime(lambda channel, build: manager.publish_channel(channel, build, [session]))
             
     except WebSocketDisconnect:
-        manager.disconnect(websocket)
         print(f"🔌 WebSocket disconnected normally")
     except Exception as e:
         # Ignore "Cannot call send" error if it happens elsewhere
-        if "Cannot call" in str(e):
-             manager.disconnect(websocket)
-             return
-        print(f"❌ WebSocket error: {e}")
-        import traceback
-        traceback.print_exc()
-        manager.disconnect(websocket)
+        if "Cannot call" not in str(e):
+            print(f"❌ WebSocket error: {e}")
+            import traceback
+            traceback.print_exc()
+    finally:
+        if websocket in manager.active_connections:
+            manager.disconnect(websocket)
 
 
 @app.get("/api/ai/statistics")
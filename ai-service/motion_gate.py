@@ -0,0 +1,193 @@
+"""
+Motion Gate - Cheap Scene-Change Detection
+Runs in the capture thread on a downscaled grayscale copy of every frame
+and tells the inference scheduler whether YOLO needs to look again, so
+static scenes reuse their cached detections.
+"""
+
+import os
+import threading
+import time
+from typing import Dict
+
+import cv2
+import numpy as np
+
+# Defaults (overridable via environment, and per camera at runtime)
+MOTION_GATE_ENABLED = os.getenv("MOTION_GATE_ENABLED", "1") == "1"
+MOTION_THRESHOLD = float(os.getenv("MOTION_THRESHOLD", "0.002"))          # fraction of changed pixels
+MOTION_PIXEL_THRESHOLD = int(os.getenv("MOTION_PIXEL_THRESHOLD", "25"))   # per-pixel intensity delta
+MOTION_REFRESH_INTERVAL = float(os.getenv("MOTION_REFRESH_INTERVAL", "10"))  # forced re-check (s)
+
+# Keys accepted by MotionGate.configure()
+CONFIG_KEYS = ("enabled", "threshold", "pixel_threshold", "refresh_interval", "learning_rate")
+# Allowed range per numeric key (inclusive; learning_rate must also be > 0)
+CONFIG_RANGES = {
+    "threshold": (0.0, 1.0),
+    "pixel_threshold": (0, 255),
+    "refresh_interval": (0.0, 86400.0),
+    "learning_rate": (0.0, 1.0),
+}
+BOOL_STRINGS = {"1": True, "true": True, "yes": True, "on": True,
+                "0": False, "false": False, "no": False, "off": False}
+
+
+def validate_config(config: Dict) -> Dict:
+    """
+    Check a runtime config (e.g. an API request body) and return it with
+    typed values; None means "leave unchanged". Raises ValueError naming
+    every bad key.
+    """
+    if not isinstance(config, dict):
+        raise ValueError("Motion config must be an object")
+    errors = [f"unknown key '{key}'" for key in config if key not in CONFIG_KEYS]
+    clean = {}
+    for key in CONFIG_KEYS:
+        value = config.get(key)
+        if value is None:
+            continue
+        if key == "enabled":
+            if isinstance(value, bool):
+                clean[key] = value
+            elif str(value).strip().lower() in BOOL_STRINGS:
+                clean[key] = BOOL_STRINGS[str(value).strip().lower()]
+            else:
+                errors.append(f"enabled must be a boolean, got {value!r}")
+            continue
+        low, high = CONFIG_RANGES[key]
+        try:
+            if isinstance(value, bool):
+                raise ValueError
+            number = float(value)
+            if isinstance(low, int) and number != int(number):
+                raise ValueError
+        except (TypeError, ValueError):
+            errors.append(f"{key} must be a{'n integer' if isinstance(low, int) else ' number'}, got {value!r}")
+            continue
+        if not low <= number <= high or (key == "learning_rate" and number == 0):
+            errors.append(f"{key} must be in {'(' if key == 'learning_rate' else '['}{low}, {high}], got {value!r}")
+            continue
+        clean[key] = int(number) if isinstance(low, int) else number
+    if errors:
+        raise ValueError("; ".join(errors))
+    return clean
+
+
+class MotionGate:
+    """
+    Running-average background model on a small grayscale frame.
+    update() scores each frame (fraction of pixels that differ from the
+    background); needs_inference() says whether anything moved since the
+    last frame YOLO analyzed.
+    """
+
+    def __init__(self, enabled: bool = MOTION_GATE_ENABLED, threshold: float = MOTION_THRESHOLD,
+                 pixel_threshold: int = MOTION_PIXEL_THRESHOLD,
+                 refresh_interval: float = MOTION_REFRESH_INTERVAL,
+                 learning_rate: float = 0.05, width: int = 160):
+        self.enabled = enabled
+        self.threshold = threshold
+        self.pixel_threshold = pixel_threshold
+        self.refresh_interval = refresh_interval
+        self.learning_rate = learning_rate
+        self.width = width
+
+        # Preallocated work buffers (sized on the first frame)
+        self._source_shape = None
+        self._small = None
+        self._gray = None
+        self._background = None
+        self._background_u8 = None
+        self._diff = None
+        self._mask = None
+
+        self.last_score = 0.0
+        self.avg_score = 0.0
+        self.peak_score = 0.0
+        self.last_motion_seq = 0
+        self.frames = 0
+        self.motion_frames = 0
+        self.inference_run = 0
+        self.inference_skipped = 0
+        self._last_inference_time = 0.0
+        self._lock = threading.Lock()
+
+    def configure(self, **config) -> Dict:
+        """Update thresholds at runtime; a bad config raises ValueError and changes nothing"""
+        clean = validate_config(config)
+        with self._lock:
+            for key, value in clean.items():
+                setattr(self, key, value)
+        return self.get_config()
+
+    def get_config(self) -> Dict:
+        return {key: getattr(self, key) for key in CONFIG_KEYS}
+
+    def _allocate(self, frame: np.ndarray):
+        self._source_shape = frame.shape
+        h, w = frame.shape[:2]
+        height = max(1, int(h * self.width / w))
+        self._small = np.empty((height, self.width, 3), dtype=np.uint8)
+        self._gray = np.empty((height, self.width), dtype=np.uint8)
+        self._background = None
+        self._background_u8 = np.empty((height, self.width), dtype=np.uint8)
+        self._diff = np.empty((height, self.width), dtype=np.uint8)
+        self._mask = np.empty((height, self.width), dtype=np.uint8)
+
+    def update(self, frame: np.ndarray, seq: int) -> float:
+        """Score one frame (capture thread); returns the motion score in [0, 1]"""
+        if frame.shape != self._source_shape:
+            self._allocate(frame)
+
+        cv2.resize(frame, (self._small.shape[1], self._small.shape[0]),
+                   dst=self._small, interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(self._small, cv2.COLOR_BGR2GRAY, dst=self._gray)
+
+        if self._background is None:
+            # First frame: everything is "new"
+            self._background = self._gray.astype(np.float32)
+            score = 1.0
+        else:
+            cv2.convertScaleAbs(self._background, dst=self._background_u8)
+            cv2.absdiff(self._gray, self._background_u8, dst=self._diff)
+            cv2.threshold(self._diff, self.pixel_threshold, 255, cv2.THRESH_BINARY, dst=self._mask)
+            score = cv2.countNonZero(self._mask) / self._mask.size
+            cv2.accumulateWeighted(self._gray, self._background, self.learning_rate)
+
+        self.frames += 1
+        self.last_score = score
+        self.avg_score = 0.95 * self.avg_score + 0.05 * score
+        self.peak_score = max(self.peak_score, score)
+        if score >= self.threshold:
+            self.motion_frames += 1
+            self.last_motion_seq = seq
+        return score
+
+    def needs_inference(self, last_inference_seq: int) -> bool:
+        """True if the scene changed since last_inference_seq (or a refresh is due)"""
+        if not self.enabled or self.frames == 0:
+            return True
+        if self.last_motion_seq > last_inference_seq:
+            return True
+        return time.time() - self._last_inference_time >= self.refresh_interval
+
+    def record(self, ran: bool):
+        """Count an inference decision made by the engine"""
+        if ran:
+            self.inference_run += 1
+            self._last_inference_time = time.time()
+        else:
+            self.inference_skipped += 1
+
+    def get_stats(self) -> Dict:
+        decisions = self.inference_run + self.inference_skipped
+        return {
+            **self.get_config(),
+            "last_score": round(self.last_score, 5),
+            "avg_score": round(self.avg_score, 5),
+            "peak_score": round(self.peak_score, 5),
+            "motion_ratio": round(self.motion_frames / self.frames, 3) if self.frames else 0.0,
+            "inference_run": self.inference_run,
+            "inference_skipped": self.inference_skipped,
+            "skip_ratio": round(self.inference_skipped / decisions, 3) if decisions else 0.0
+        }
@@ -0,0 +1,335 @@
+"""
+Inference Pipeline - Staged Frame Processing
+capture (ThreadedCamera) -> preprocess -> infer -> postprocess -> publish,
+each stage on its own thread and joined by bounded drop-oldest queues.
+While YOLO runs on batch N, batch N+1 is being letterboxed and batch N-1
+face-matched and tracked. A stage that falls behind never builds a
+backlog: the queue in front of it discards its oldest item, so the newest
+frame always wins end to end.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+# Configuration (overridable via environment)
+PIPELINE_ENABLED = os.getenv("INFERENCE_PIPELINE", "1") == "1"
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "1"))         # items between two stages
+PIPELINE_MAX_IN_FLIGHT = int(os.getenv("PIPELINE_MAX_IN_FLIGHT", "2"))   # frames per camera inside the pipeline
+PIPELINE_PUBLISH_TIMEOUT = 5.0  # seconds the publish stage waits on the event loop
+
+
+class DropOldestQueue:
+    """
+    Bounded FIFO that never blocks the producer: put() on a full queue
+    evicts the oldest item (handing it to on_drop) instead of waiting.
+    """
+
+    def __init__(self, capacity: int = PIPELINE_QUEUE_SIZE, on_drop: Optional[Callable[[Any], None]] = None):
+        self.capacity = max(1, capacity)
+        self.on_drop = on_drop
+        self._items = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self.dropped = 0
+        self.high_water = 0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def put(self, item: Any):
+        evicted = None
+        with self._cond:
+            if len(self._items) >= self.capacity:
+                evicted = self._items.popleft()
+                self.dropped += 1
+            self._items.append(item)
+            self.high_water = max(self.high_water, len(self._items))
+            self._cond.notify()
+        if evicted is not None and self.on_drop:
+            self.on_drop(evicted)
+
+    def get(self, timeout: Optional[float] = None) -> Optional[Any]:
+        """Oldest item, or None on timeout / close"""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._items or self._closed, timeout):
+                return None
+            return self._items.popleft() if self._items else None
+
+    def close(self) -> List[Any]:
+        """Wake blocked consumers and return whatever was still queued"""
+        with self._cond:
+            self._closed = True
+            leftover = list(self._items)
+            self._items.clear()
+            self._cond.notify_all()
+        return leftover
+
+    def get_stats(self) -> Dict:
+        return {
+            "size": len(self._items),
+            "capacity": self.capacity,
+            "occupancy": round(len(self._items) / self.capacity, 2),
+            "high_water": self.high_water,
+            "dropped": self.dropped
+        }
+
+
+class Stage:
+    """
+    One pipeline stage: a worker thread that pulls items from `source`
+    (a callable returning the next item or None), runs `fn` on them and
+    puts non-None results on `output`. Tracks per-item latency and
+    completion times for throughput.
+    """
+
+    def __init__(self, name: str, fn: Callable[[Any], Any], source: Callable[[], Any],
+                 output: Optional[DropOldestQueue] = None, input_queue: Optional[DropOldestQueue] = None,
+                 history: int = 200):
+        self.name = name
+        self.fn = fn
+        self.source = source
+        self.output = output
+        self.input_queue = input_queue
+        self.processed = 0
+        self.failed = 0
+        self._latencies = deque(maxlen=history)
+        self._completed = deque(maxlen=history)
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name=f"pipeline-{self.name}", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 2.0):
+        self._running = False
+        if self._thread:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while self._running:
+            item = self.source()
+            if item is None:
+                continue
+            t0 = time.perf_counter()
+            try:
+                out = self.fn(item)
+            except Exception as e:
+                self.failed += 1
+                print(f"❌ Pipeline {self.name} error: {e}")
+                continue
+            now = time.perf_counter()
+            self._latencies.append(now - t0)
+            self._completed.append(now)
+            self.processed += 1
+            if out is not None and self.output is not None:
+                self.output.put(out)
+
+    def recent_latency(self, window: int = 20) -> Optional[float]:
+        """Mean latency (ms) of the last `window` items"""
+        recent = list(self._latencies)[-window:]
+        return sum(recent) / len(recent) * 1000 if recent else None
+
+    def throughput(self, window: float = 5.0) -> float:
+        """Items per second over the last `window` seconds"""
+        cutoff = time.perf_counter() - window
+        done = sum(1 for t in list(self._completed) if t >= cutoff)
+        return done / window
+
+    def get_stats(self) -> Dict:
+        latencies = np.array(self._latencies) * 1000 if self._latencies else None
+        stats = {
+            "processed": self.processed,
+            "failed": self.failed,
+            "throughput_per_s": round(self.throughput(), 2),
+            "queue": self.input_queue.get_stats() if self.input_queue else None
+        }
+        if latencies is not None:
+            stats["latency_ms"] = {
+                "avg": round(float(latencies.mean()), 2),
+                "p95": round(float(np.percentile(latencies, 95)), 2),
+                "max": round(float(latencies.max()), 2)
+            }
+        return stats
+
+
+class PipelineBatch:
+    """One batch of cameras on its way through the stages"""
+    __slots__ = ("channels", "due", "jobs", "leases", "inputs", "results", "analyses",
+                 "created", "_pipeline", "_done")
+
+    def __init__(self, pipeline: "InferencePipeline", channels: List, due: List, jobs: List, leases: List):
+        self._pipeline = pipeline
+        self.channels = channels
+        self.due = due
+        self.jobs = jobs
+        self.leases = leases
+        self.inputs = None
+        self.results = None
+        self.analyses: Optional[List[Dict]] = None
+        self.created = time.time()
+        self._done = False
+
+    def release(self):
+        """Return the ring slots and the cameras' in-flight slots (idempotent)"""
+        if self._done:
+            return
+        self._done = True
+        self._pipeline.engine.release_frames(self.due, self.leases)
+        self._pipeline._leave(self.channels)
+
+
+class InferencePipeline:
+    """
+    Staged replacement for the inference scheduler.
+    `publish` is a coroutine function (channels, analyses) run on the
+    event loop by the publish stage - result_hub, alerts and DB writes
+    stay where they were.
+    """
+
+    def __init__(self, engine, camera_manager, publish: Callable,
+                 queue_size: int = PIPELINE_QUEUE_SIZE, max_in_flight: int = PIPELINE_MAX_IN_FLIGHT):
+        self.engine = engine
+        self.cameras = camera_manager
+        self.publish = publish
+        self.max_in_flight = max(1, max_in_flight)
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._in_flight: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+        self.to_infer = DropOldestQueue(queue_size, on_drop=self._drop)
+        self.to_postprocess = DropOldestQueue(queue_size, on_drop=self._drop)
+        self.to_publish = DropOldestQueue(queue_size)
+        self.stages = [
+            Stage("preprocess", self._preprocess, self._collect, output=self.to_infer),
+            Stage("infer", self._infer, lambda: self.to_infer.get(0.5),
+                  output=self.to_postprocess, input_queue=self.to_infer),
+            Stage("postprocess", self._postprocess, lambda: self.to_postprocess.get(0.5),
+                  output=self.to_publish, input_queue=self.to_postprocess),
+            Stage("publish", self._publish, lambda: self.to_publish.get(0.5),
+                  input_queue=self.to_publish),
+        ]
+        self.running = False
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.running = True
+        for stage in self.stages:
+            stage.start()
+        print(f"🧠 Inference pipeline started ({' -> '.join(s.name for s in self.stages)}, "
+              f"queue={self.to_infer.capacity}, in-flight/camera={self.max_in_flight})")
+
+    def stop(self):
+        self.running = False
+        for stage in self.stages:
+            stage.stop()
+        for queue in (self.to_infer, self.to_postprocess, self.to_publish):
+            for batch in queue.close():
+                batch.release()
+        print("🛑 Inference pipeline stopped")
+
+    # ------------------------------------------------------------------
+    # Per-camera in-flight accounting
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _drop(batch: PipelineBatch):
+        """A newer batch overtook this one in a queue - free its frames"""
+        batch.release()
+
+    def _busy(self) -> set:
+        with self._lock:
+            return {cid for cid, n in self._in_flight.items() if n >= self.max_in_flight}
+
+    def _enter(self, channels: List):
+        with self._lock:
+            for ch in channels:
+                self._in_flight[ch.camera_id] = self._in_flight.get(ch.camera_id, 0) + 1
+
+    def _leave(self, channels: List):
+        with self._lock:
+            for ch in channels:
+                left = self._in_flight.get(ch.camera_id, 0) - 1
+                if left > 0:
+                    self._in_flight[ch.camera_id] = left
+                else:
+                    self._in_flight.pop(ch.camera_id, None)
+
+    # ------------------------------------------------------------------
+    # Stages
+    # ------------------------------------------------------------------
+
+    def _collect(self) -> Optional[List]:
+        """Preprocess source: the next round-robin batch of cameras with a new frame"""
+        if not self.running:
+            return None
+        batch = self.cameras.collect_batch(self.engine.max_batch_size, self.engine.max_batch_wait,
+                                           self._busy(), timeout=0.5)
+        return batch or None
+
+    def _preprocess(self, channels: List) -> PipelineBatch:
+        due, jobs, leases = self.engine.prepare_batch(channels)
+        self._enter(channels)
+        batch = PipelineBatch(self, channels, due, jobs, leases)
+        try:
+            if jobs:
+                batch.inputs = self.engine.preprocess_batch(jobs)
+        except Exception:
+            batch.release()
+            raise
+        return batch
+
+    def _infer(self, batch: PipelineBatch) -> PipelineBatch:
+        try:
+            batch.results = self.engine.infer_batch(batch.inputs)
+        except Exception:
+            batch.release()
+            raise
+        return batch
+
+    def _postprocess(self, batch: PipelineBatch) -> PipelineBatch:
+        # Single worker: each camera's tracker sees its frames in order
+        try:
+            outputs = self.engine.postprocess_batch(batch.jobs, batch.inputs, batch.results) \
+                if batch.jobs else []
+        finally:
+            batch.release()
+        batch.analyses = self.engine.finish_batch(batch.channels, batch.due, batch.jobs, outputs)
+        batch.inputs = batch.results = None
+        return batch
+
+    def _publish(self, batch: PipelineBatch):
+        if self.loop is None or self.loop.is_closed():
+            return None
+        future = asyncio.run_coroutine_threadsafe(self.publish(batch.channels, batch.analyses), self.loop)
+        future.result(PIPELINE_PUBLISH_TIMEOUT)
+        return None
+
+    # ------------------------------------------------------------------
+    # Metrics
+    # ------------------------------------------------------------------
+
+    def recent_latency(self) -> Optional[float]:
+        """Mean infer-stage latency (ms), the QoS governor's latency signal"""
+        return self.stages[1].recent_latency()
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            in_flight = dict(self._in_flight)
+        return {
+            "running": self.running,
+            "max_in_flight": self.max_in_flight,
+            "in_flight": in_flight,
+            "stages": {stage.name: stage.get_stats() for stage in self.stages}
+        }
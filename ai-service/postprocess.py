@@ -0,0 +1,134 @@
+"""
+Post-processing - YOLO Results to Detection Dicts
+Pulls boxes, confidences and class ids out of an ultralytics result as whole
+arrays, classifies threats with per-class lookup tables, and stamps one
+timestamp per frame. Shared by VisionEngine and the standalone streams in
+video_stream.py.
+"""
+
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+THREAT_LEVELS = np.array(["normal", "suspicious", "critical"], dtype=object)
+
+
+def result_arrays(result) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(xyxy, conf, cls) arrays of one ultralytics result"""
+    boxes = result.boxes
+    return (boxes.xyxy.cpu().numpy(), boxes.conf.cpu().numpy(), boxes.cls.cpu().numpy().astype(int))
+
+
+class ThreatRules:
+    """
+    Class-name threat rules compiled into per-class-id lookup tables.
+    critical: always critical. suspicious: suspicious above
+    suspicious_min_conf. substring=True also matches names that merely
+    contain a keyword ('gun' -> 'handgun').
+    """
+
+    def __init__(self, critical: Iterable[str] = (), suspicious: Iterable[str] = (),
+                 suspicious_min_conf: float = 0.0, substring: bool = False):
+        self.critical = tuple(critical)
+        self.suspicious = tuple(suspicious)
+        self.suspicious_min_conf = suspicious_min_conf
+        self.substring = substring
+        self._names: Optional[Dict[int, str]] = None
+        self._tables: Tuple[np.ndarray, np.ndarray] = (np.zeros(0, dtype=bool), np.zeros(0, dtype=bool))
+
+    def _matches(self, name: str, keywords: Tuple[str, ...]) -> bool:
+        name = name.lower()
+        if self.substring:
+            return any(k in name for k in keywords)
+        return name in keywords
+
+    def tables(self, names: Dict[int, str]) -> Tuple[np.ndarray, np.ndarray]:
+        """(is_critical, is_suspicious) boolean arrays indexed by class id, built once per model"""
+        if names is not self._names and names != self._names:
+            size = max(names) + 1 if names else 0
+            critical = np.zeros(size, dtype=bool)
+            suspicious = np.zeros(size, dtype=bool)
+            for cls_id, name in names.items():
+                critical[cls_id] = self._matches(name, self.critical)
+                suspicious[cls_id] = self._matches(name, self.suspicious)
+            self._names = names
+            self._tables = (critical, suspicious)
+        return self._tables
+
+    def classify(self, cls: np.ndarray, conf: np.ndarray, names: Dict[int, str]) -> np.ndarray:
+        """Threat level per detection ('normal' | 'suspicious' | 'critical')"""
+        critical, suspicious = self.tables(names)
+        code = np.where(critical[cls], 2,
+                        np.where(suspicious[cls] & (conf > self.suspicious_min_conf), 1, 0))
+        return THREAT_LEVELS[code]
+
+
+# VisionEngine: every person is flagged for demo activity ('cell phone' stands in for a weapon)
+ENGINE_THREAT_RULES = ThreatRules(
+    critical=('knife', 'gun', 'weapon', 'scissors', 'cell phone'),
+    suspicious=('person',),
+)
+
+# Standalone streams: only confident people / carried bags are suspicious
+STREAM_THREAT_RULES = ThreatRules(
+    critical=('knife', 'gun', 'rifle', 'scissors', 'sword'),
+    suspicious=('person', 'backpack', 'handbag', 'suitcase'),
+    suspicious_min_conf=0.85,
+    substring=True,
+)
+
+
+def build_detections(result, frame_id: int, rules: ThreatRules = ENGINE_THREAT_RULES,
+                     camera_id: Optional[str] = None,
+                     face_matches: Optional[Dict[int, List[Dict]]] = None,
+                     timestamp: Optional[str] = None, arrays: Optional[Tuple] = None,
+                     frame_shape: Optional[Tuple[int, ...]] = None) -> List[Dict]:
+    """
+    Turn one frame's YOLO result into detection dicts.
+    face_matches maps box index -> suspect candidates (an empty list means
+    a face was checked and matched nobody); a match makes the box critical.
+    arrays / frame_shape override the result's own (xyxy, conf, cls) and
+    image size, e.g. after mapping boxes back from a letterboxed input.
+    """
+    xyxy, conf, cls = arrays if arrays is not None else result_arrays(result)
+    if len(cls) == 0:
+        return []
+    names = result.names
+    h, w = (frame_shape or result.orig_shape)[:2]
+    timestamp = timestamp or datetime.now().isoformat()
+    face_matches = face_matches or {}
+
+    levels = rules.classify(cls, conf, names).tolist()
+    labels = [names[c] for c in cls.tolist()]
+    corners = xyxy.astype(int).tolist()
+    sizes = (xyxy[:, 2:] - xyxy[:, :2]).astype(int).tolist()
+    normalized = (np.concatenate([xyxy[:, :2], xyxy[:, 2:] - xyxy[:, :2]], axis=1)
+                  / np.array([w, h, w, h], dtype=np.float64)).tolist()
+    confidences = np.round(conf.astype(np.float64), 2).tolist()
+
+    detections = []
+    for idx, label in enumerate(labels):
+        candidates = face_matches.get(idx) or None
+        identity = candidates[0]["name"] if candidates else None
+        detections.append({
+            "id": f"det_{frame_id}_{idx}",
+            "camera_id": camera_id,
+            "class": f"SUSPECT: {identity}" if identity else label.lower(),
+            "label": label,
+            "identity": identity,
+            "face_matches": candidates,
+            "face_checked": idx in face_matches,
+            "confidence": confidences[idx],
+            "bbox": {
+                "x": corners[idx][0],
+                "y": corners[idx][1],
+                "width": sizes[idx][0],
+                "height": sizes[idx][1]
+            },
+            "bbox_normalized": normalized[idx],
+            "threat_level": "critical" if identity else levels[idx],
+            "frame_id": frame_id,
+            "timestamp": timestamp
+        })
+    return detections
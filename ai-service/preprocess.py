@@ -0,0 +1,74 @@
+"""
+Pre-processing - Frames to Model Input
+Letterboxes a batch of BGR frames into one RGB BCHW array the way
+ultralytics does (aspect kept, grey padding, stride-aligned), so the
+resize can run ahead of inference, and maps detected boxes back onto
+the original frames afterwards.
+"""
+
+import math
+from typing import List, Tuple
+
+import cv2
+import numpy as np
+
+try:
+    import torch
+    TORCH_AVAILABLE = True
+except ImportError:
+    TORCH_AVAILABLE = False
+
+PAD_VALUE = 114
+STRIDE = 32
+
+# (gain, pad_x, pad_y, frame_h, frame_w) - how one frame was placed on the canvas
+Letterbox = Tuple[float, float, float, int, int]
+
+
+def letterbox_batch(frames: List[np.ndarray], imgsz: int = 640,
+                    auto: bool = True) -> Tuple[np.ndarray, List[Letterbox]]:
+    """
+    Fit every frame inside imgsz x imgsz. auto=True shrinks the canvas to
+    the smallest stride multiple that holds the largest frame (640x480 ->
+    640x480 instead of 640x640); auto=False keeps it square.
+    Returns a (B, 3, H, W) uint8 RGB array and one Letterbox per frame.
+    """
+    placed = []
+    for frame in frames:
+        h, w = frame.shape[:2]
+        gain = min(imgsz / h, imgsz / w)
+        placed.append((gain, int(round(h * gain)), int(round(w * gain))))
+    if auto:
+        height = max(math.ceil(nh / STRIDE) * STRIDE for _, nh, _ in placed)
+        width = max(math.ceil(nw / STRIDE) * STRIDE for _, _, nw in placed)
+    else:
+        height = width = imgsz
+
+    canvas = np.full((len(frames), height, width, 3), PAD_VALUE, dtype=np.uint8)
+    boxes: List[Letterbox] = []
+    for i, (frame, (gain, nh, nw)) in enumerate(zip(frames, placed)):
+        top = int(round((height - nh) / 2 - 0.1))
+        left = int(round((width - nw) / 2 - 0.1))
+        if (nh, nw) == frame.shape[:2]:
+            canvas[i, top:top + nh, left:left + nw] = frame
+        else:
+            canvas[i, top:top + nh, left:left + nw] = cv2.resize(frame, (nw, nh), interpolation=cv2.INTER_LINEAR)
+        boxes.append((gain, float(left), float(top), frame.shape[0], frame.shape[1]))
+    # BGR -> RGB, NHWC -> NCHW in one copy
+    return np.ascontiguousarray(canvas[..., ::-1].transpose(0, 3, 1, 2)), boxes
+
+
+def to_model_input(batch: np.ndarray):
+    """uint8 BCHW -> float 0..1 tensor (ultralytics then skips its own pre-processing)"""
+    if not TORCH_AVAILABLE:
+        raise RuntimeError("PyTorch is required for pre-letterboxed model input")
+    return torch.from_numpy(batch).float().div_(255.0)
+
+
+def unletterbox_boxes(xyxy: np.ndarray, box: Letterbox) -> np.ndarray:
+    """Map xyxy boxes from canvas coordinates back onto the original frame"""
+    gain, pad_x, pad_y, h, w = box
+    out = xyxy.astype(np.float32, copy=True)
+    out[:, [0, 2]] = np.clip((out[:, [0, 2]] - pad_x) / gain, 0, w)
+    out[:, [1, 3]] = np.clip((out[:, [1, 3]] - pad_y) / gain, 0, h)
+    return out
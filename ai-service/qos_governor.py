@@ -0,0 +1,146 @@
+"""
+QoS Governor - Adaptive Load Shedding
+Watches inference latency, frame staleness and CPU load, and steps the
+pipeline through progressively cheaper degradation levels under pressure.
+Recovers one level at a time once pressure has stayed low for a while.
+"""
+
+import os
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+# Configuration (overridable via environment)
+QOS_ENABLED = os.getenv("QOS_ENABLED", "1") == "1"
+QOS_INTERVAL = float(os.getenv("QOS_INTERVAL", "1.0"))                 # seconds between evaluations
+QOS_LATENCY_BUDGET_MS = float(os.getenv("QOS_LATENCY_BUDGET_MS", "250"))
+QOS_STALENESS_BUDGET = float(os.getenv("QOS_STALENESS_BUDGET", "0.5"))  # seconds
+QOS_CPU_HIGH = float(os.getenv("QOS_CPU_HIGH", "85"))
+QOS_CPU_LOW = float(os.getenv("QOS_CPU_LOW", "60"))
+
+# Degradation ladder - level 0 is full quality
+QOS_LEVELS: List[Dict] = [
+    {"name": "normal",   "detection_interval": 5,  "imgsz": 640, "face_mode": "all",        "mjpeg_fps": 30, "jpeg_quality": 30},
+    {"name": "elevated", "detection_interval": 8,  "imgsz": 640, "face_mode": "all",        "mjpeg_fps": 20, "jpeg_quality": 30},
+    {"name": "high",     "detection_interval": 12, "imgsz": 480, "face_mode": "new_tracks", "mjpeg_fps": 15, "jpeg_quality": 25},
+    {"name": "severe",   "detection_interval": 20, "imgsz": 320, "face_mode": "new_tracks", "mjpeg_fps": 10, "jpeg_quality": 20},
+]
+
+
+class QoSGovernor:
+    """
+    Hysteresis controller over QOS_LEVELS.
+    observe() takes one metrics sample; step_up_after consecutive pressured
+    samples raise the level, step_down_after calm samples lower it.
+    """
+
+    def __init__(self, levels: List[Dict] = QOS_LEVELS, enabled: bool = QOS_ENABLED,
+                 latency_budget_ms: float = QOS_LATENCY_BUDGET_MS,
+                 staleness_budget: float = QOS_STALENESS_BUDGET,
+                 cpu_high: float = QOS_CPU_HIGH, cpu_low: float = QOS_CPU_LOW,
+                 step_up_after: int = 2, step_down_after: int = 5):
+        self.levels = levels
+        self.enabled = enabled
+        self.latency_budget_ms = latency_budget_ms
+        self.staleness_budget = staleness_budget
+        self.cpu_high = cpu_high
+        self.cpu_low = cpu_low
+        self.step_up_after = step_up_after
+        self.step_down_after = step_down_after
+
+        self.level = 0
+        self._pressured = 0
+        self._calm = 0
+        self.last_sample: Dict = {}
+        self.last_reason: Optional[str] = None
+        self.history = deque(maxlen=20)  # recent level changes
+
+        if PSUTIL_AVAILABLE:
+            psutil.cpu_percent(interval=None)  # prime the non-blocking counter
+
+    @property
+    def current(self) -> Dict:
+        return self.levels[self.level]
+
+    @staticmethod
+    def sample_cpu() -> Optional[float]:
+        """Non-blocking CPU utilisation since the previous call (None without psutil)"""
+        return psutil.cpu_percent(interval=None) if PSUTIL_AVAILABLE else None
+
+    def _pressure_reason(self, latency_ms, staleness, cpu) -> Optional[str]:
+        if latency_ms is not None and latency_ms > self.latency_budget_ms:
+            return f"latency {latency_ms:.0f}ms > {self.latency_budget_ms:.0f}ms"
+        if staleness is not None and staleness > self.staleness_budget:
+            return f"staleness {staleness:.2f}s > {self.staleness_budget:.2f}s"
+        if cpu is not None and cpu > self.cpu_high:
+            return f"cpu {cpu:.0f}% > {self.cpu_high:.0f}%"
+        return None
+
+    def _is_calm(self, latency_ms, staleness, cpu) -> bool:
+        return ((latency_ms is None or latency_ms < self.latency_budget_ms * 0.5)
+                and (staleness is None or staleness < self.staleness_budget * 0.5)
+                and (cpu is None or cpu < self.cpu_low))
+
+    def observe(self, latency_ms: Optional[float], staleness: Optional[float],
+                cpu: Optional[float]) -> bool:
+        """Feed one metrics sample; returns True if the level changed"""
+        self.last_sample = {
+            "latency_ms": round(latency_ms, 1) if latency_ms is not None else None,
+            "staleness_s": round(staleness, 3) if staleness is not None else None,
+            "cpu_percent": cpu,
+            "timestamp": time.time()
+        }
+        if not self.enabled:
+            return False
+
+        reason = self._pressure_reason(latency_ms, staleness, cpu)
+        if reason:
+            self._pressured += 1
+            self._calm = 0
+            if self._pressured >= self.step_up_after and self.level < len(self.levels) - 1:
+                return self._set_level(self.level + 1, reason)
+        elif self._is_calm(latency_ms, staleness, cpu):
+            self._calm += 1
+            self._pressured = 0
+            if self._calm >= self.step_down_after and self.level > 0:
+                return self._set_level(self.level - 1, "pressure cleared")
+        else:
+            # In the hysteresis band - hold the current level
+            self._pressured = 0
+            self._calm = 0
+        return False
+
+    def _set_level(self, level: int, reason: str) -> bool:
+        previous = self.levels[self.level]["name"]
+        arrow = "⬆️" if level > self.level else "⬇️"
+        self.level = level
+        self._pressured = 0
+        self._calm = 0
+        self.last_reason = reason
+        self.history.append({"level": self.current["name"], "reason": reason, "timestamp": time.time()})
+        print(f"{arrow}  QoS {previous} -> {self.current['name']} ({reason})")
+        return True
+
+    def apply(self, engine):
+        """Push the current level's inference settings onto the vision engine"""
+        level = self.current
+        engine.detection_interval = level["detection_interval"]
+        engine.imgsz = level["imgsz"]
+        engine.face_mode = level["face_mode"]
+
+    def get_stats(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "level": self.level,
+            "name": self.current["name"],
+            "settings": self.current,
+            "reason": self.last_reason,
+            "sample": self.last_sample,
+            "changes": list(self.history)
+        }
@@ -0,0 +1,48 @@
+"""
+Result Hub - Shared Inference Fan-Out
+One producer per camera publishes its latest analysis here, so nothing
+downstream runs inference itself; the stream pushes each result to its
+clients as it is published.
+"""
+
+from typing import Dict, Optional
+
+
+class PublishedResult:
+    """Immutable snapshot of one analysis published by a producer."""
+    __slots__ = ("camera_id", "seq", "data")
+
+    def __init__(self, camera_id: str, seq: int, data: Dict):
+        self.camera_id = camera_id
+        self.seq = seq
+        self.data = data
+
+
+class ResultHub:
+    """
+    Latest-result registry. Producers call publish(); status endpoints and
+    late joiners read latest(). Pushing results to clients is
+    ConnectionManager's job (client_stream.py), which also counts them.
+    """
+
+    def __init__(self):
+        self._latest: Dict[str, PublishedResult] = {}
+        self.publish_count = 0
+
+    async def publish(self, camera_id: str, data: Dict) -> PublishedResult:
+        """Store a new result for a camera (older ones are simply overwritten)"""
+        previous = self._latest.get(camera_id)
+        seq = previous.seq + 1 if previous else 1
+        result = PublishedResult(camera_id, seq, data)
+        self._latest[camera_id] = result
+        self.publish_count += 1
+        return result
+
+    def latest(self, camera_id: str) -> Optional[PublishedResult]:
+        return self._latest.get(camera_id)
+
+    def get_stats(self) -> Dict:
+        return {
+            "cameras": {cam_id: {"seq": res.seq} for cam_id, res in self._latest.items()},
+            "total_published": self.publish_count
+        }
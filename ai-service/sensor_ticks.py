@@ -0,0 +1,110 @@
+"""
+Sensor Ticks - Fixed-Cadence Fusion and Prediction Feeds
+Fusion snapshots are sampled at the sensors' native rate and risk
+predictions on a fixed cadence, each by one background loop, no matter how
+many clients are connected or how fast cameras publish. The latest value
+of every feed is cached: frame_analysis messages embed it, and clients
+subscribed to a feed's own channel get it pushed (at their own rate, see
+stream_topics.py) right after each tick.
+"""
+
+import asyncio
+import os
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+# Configuration (overridable via environment)
+SENSOR_FUSION_HZ = float(os.getenv("SENSOR_FUSION_HZ", "10"))                       # fusion snapshots per second
+SENSOR_PREDICTION_INTERVAL = float(os.getenv("SENSOR_PREDICTION_INTERVAL", "10"))  # seconds between risk predictions
+
+
+class SensorFeed:
+    """One periodically sampled source and its latest value"""
+
+    def __init__(self, name: str, interval: float, sample: Callable[[], Any]):
+        self.name = name
+        self.interval = max(0.01, interval)
+        self.sample = sample
+        self.seq = 0
+        self.value: Any = None
+        self.message: Optional[Dict] = None
+        self.sampled_at: Optional[float] = None
+        self.errors = 0
+        self.late = 0  # ticks skipped because sampling overran the interval
+        self.sample_ms = 0.0
+
+    def tick(self):
+        t0 = time.perf_counter()
+        self.value = self.sample()
+        self.sample_ms = (time.perf_counter() - t0) * 1000
+        self.sampled_at = time.time()
+        self.seq += 1
+        self.message = {
+            "type": self.name,
+            self.name: self.value,
+            "seq": self.seq,
+            "timestamp": datetime.fromtimestamp(self.sampled_at).isoformat()
+        }
+
+
+class SensorTicker:
+    """
+    Owns the feeds; run(name) is the background loop of one feed.
+    `publish(channel, build)` pushes a tick to the channel's subscribers
+    (ConnectionManager.publish_channel, which serializes at most once).
+    """
+
+    def __init__(self, publish: Callable[[str, Callable[[], Dict]], int]):
+        self.publish = publish
+        self.feeds: Dict[str, SensorFeed] = {}
+
+    def add(self, name: str, interval: float, sample: Callable[[], Any]) -> SensorFeed:
+        feed = SensorFeed(name, interval, sample)
+        self.feeds[name] = feed
+        return feed
+
+    def latest(self, name: str) -> Any:
+        return self.feeds[name].value
+
+    def prime(self, publish_to: Callable[[str, Callable[[], Dict]], int]):
+        """Push every cached value through `publish_to` (e.g. to a client that just subscribed)"""
+        for name, feed in self.feeds.items():
+            if feed.message is not None:
+                publish_to(name, lambda feed=feed: feed.message)
+
+    async def run(self, name: str):
+        """Tick one feed on a fixed schedule (no drift, no catch-up bursts)"""
+        feed = self.feeds[name]
+        print(f"📡 Sensor feed '{name}' ticking every {feed.interval:.2f}s")
+        next_tick = time.monotonic()
+        while True:
+            try:
+                feed.tick()
+                self.publish(name, lambda: feed.message)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                feed.errors += 1
+                print(f"❌ Sensor feed '{name}' error: {e}")
+            next_tick += feed.interval
+            now = time.monotonic()
+            if next_tick < now:
+                missed = int((now - next_tick) // feed.interval) + 1
+                feed.late += missed
+                next_tick += missed * feed.interval
+            await asyncio.sleep(next_tick - now)
+
+    def get_stats(self) -> Dict:
+        now = time.time()
+        return {
+            name: {
+                "rate_hz": round(1.0 / feed.interval, 3),
+                "ticks": feed.seq,
+                "late": feed.late,
+                "errors": feed.errors,
+                "sample_ms": round(feed.sample_ms, 2),
+                "age_s": round(now - feed.sampled_at, 2) if feed.sampled_at else None
+            }
+            for name, feed in self.feeds.items()
+        }
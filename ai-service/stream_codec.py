@@ -0,0 +1,235 @@
+"""
+Stream Codec - Compact Binary Frames for /api/ai/stream
+Opt-in alternative to the JSON frame_analysis message, negotiated with
+?encoding=msgpack. A frame is one MessagePack map holding columnar
+detection arrays, an integer millisecond timestamp, and no derived fields
+(class, ids and bbox_normalized are rebuilt by the decoder).
+
+Boxes of tracked objects are delta-encoded against the last keyframe
+rather than the previous frame, so a lagging client whose queue drops
+frames can still decode every frame it gets - only keyframes must arrive,
+and ClientSession never drops those.
+
+Binary frame keys:
+    t    "frame_analysis"          v    protocol version
+    cam  camera id                 f    frame id
+    ts   epoch milliseconds        mode "real" | "mock"
+    kf   frame id of the keyframe the deltas refer to (== f on keyframes)
+    sz   [width, height] of the analyzed frame (absent if unknown)
+    lb   label table               L    label index per detection
+    tr   track id per detection (-1 = untracked)
+    th   threat code per detection (0 normal, 1 suspicious, 2 critical)
+    cf   confidence in hundredths  fl   flag bits (1 confirmed, 2 interpolated, 4 face checked)
+    bx   flattened x, y, w, h per detection
+    dm   indices whose bx entry is a delta against the keyframe box of that track
+    id   {detection index: identity} for recognized suspects
+    fu   fusion payload            pr   predictions payload
+"""
+
+import os
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+# Configuration (overridable via environment)
+STREAM_KEYFRAME_INTERVAL = int(os.getenv("STREAM_KEYFRAME_INTERVAL", "30"))  # frames between keyframes
+
+PROTOCOL_VERSION = 1
+ENCODINGS = ("json", "msgpack")
+THREAT_LEVELS = ["normal", "suspicious", "critical"]
+THREAT_CODES = {level: code for code, level in enumerate(THREAT_LEVELS)}
+FLAG_CONFIRMED = 1
+FLAG_INTERPOLATED = 2
+FLAG_FACE_CHECKED = 4
+
+
+def negotiate_encoding(requested: Optional[str]) -> str:
+    """Encoding a client gets for ?encoding= (JSON unless msgpack is asked for and installed)"""
+    requested = (requested or "json").lower()
+    if requested == "msgpack" and MSGPACK_AVAILABLE:
+        return "msgpack"
+    return "json"
+
+
+def parse_resolution(res: Optional[str]) -> Optional[Tuple[int, int]]:
+    """'640x480' -> (640, 480)"""
+    try:
+        width, height = (int(v) for v in str(res).lower().split("x"))
+        return width, height
+    except (TypeError, ValueError):
+        return None
+
+
+def _box(det: Dict) -> Tuple[int, int, int, int]:
+    bbox = det["bbox"]
+    return int(bbox["x"]), int(bbox["y"]), int(bbox["width"]), int(bbox["height"])
+
+
+class BinaryFrameEncoder:
+    """
+    Stateful frame_analysis -> MessagePack encoder for one camera, shared
+    by all of its binary clients. encode() returns (payload, is_keyframe);
+    keyframes must not be dropped.
+    """
+
+    def __init__(self, keyframe_interval: int = STREAM_KEYFRAME_INTERVAL):
+        if not MSGPACK_AVAILABLE:
+            raise RuntimeError("msgpack is required for the binary stream encoding")
+        self.keyframe_interval = max(1, keyframe_interval)
+        self._since_key: Optional[int] = None
+        self._key_frame_id = None
+        self._key_size = None
+        self._key_boxes: Dict[int, Tuple[int, int, int, int]] = {}
+
+    def request_keyframe(self):
+        """Make the next frame a keyframe (a client joined mid-stream)"""
+        self._since_key = None
+
+    def encode(self, message: Dict, frame_size: Optional[Tuple[int, int]] = None) -> Tuple[bytes, bool]:
+        detections = message.get("detections") or []
+        keyframe = (self._since_key is None or self._since_key + 1 >= self.keyframe_interval
+                    or frame_size != self._key_size)
+        if keyframe:
+            self._since_key = 0
+            self._key_frame_id = message.get("frame_id")
+            self._key_size = frame_size
+            self._key_boxes = {}
+        else:
+            self._since_key += 1
+
+        labels: Dict[str, int] = {}
+        label_idx, tracks, threats, confs, flags, boxes, deltas = [], [], [], [], [], [], []
+        identities = {}
+        for i, det in enumerate(detections):
+            label = det.get("label") or det["class"]
+            label_idx.append(labels.setdefault(label, len(labels)))
+            track_id = det.get("track_id")
+            tracks.append(-1 if track_id is None else track_id)
+            threats.append(THREAT_CODES.get(det.get("threat_level"), 0))
+            confs.append(int(round(det.get("confidence", 0.0) * 100)))
+            flags.append((FLAG_CONFIRMED if det.get("confirmed") else 0)
+                         | (FLAG_INTERPOLATED if det.get("interpolated") else 0)
+                         | (FLAG_FACE_CHECKED if det.get("face_checked") else 0))
+            if det.get("identity"):
+                identities[i] = det["identity"]
+
+            box = _box(det)
+            base = self._key_boxes.get(track_id) if track_id is not None else None
+            if keyframe:
+                if track_id is not None:
+                    self._key_boxes[track_id] = box
+            elif base is not None:
+                box = (box[0] - base[0], box[1] - base[1], box[2] - base[2], box[3] - base[3])
+                deltas.append(i)
+            boxes.extend(box)
+
+        frame = {
+            "t": "frame_analysis",
+            "v": PROTOCOL_VERSION,
+            "cam": message.get("camera_id"),
+            "f": message.get("frame_id"),
+            "ts": int(time.time() * 1000),
+            "mode": message.get("mode"),
+            "kf": self._key_frame_id,
+            "lb": list(labels),
+            "L": label_idx,
+            "tr": tracks,
+            "th": threats,
+            "cf": confs,
+            "fl": flags,
+            "bx": boxes,
+        }
+        if frame_size:
+            frame["sz"] = list(frame_size)
+        if deltas:
+            frame["dm"] = deltas
+        if identities:
+            frame["id"] = identities
+        if message.get("fusion") is not None:
+            frame["fu"] = message["fusion"]
+        if message.get("predictions") is not None:
+            frame["pr"] = message["predictions"]
+        # Sensor floats do not need double precision on the wire
+        return msgpack.packb(frame, use_bin_type=True, use_single_float=True), keyframe
+
+
+def embed_sensors(payload: bytes, message: Dict) -> bytes:
+    """An encoded frame plus the message's fusion / predictions (keyframe state untouched)"""
+    frame = msgpack.unpackb(payload, raw=False, strict_map_key=False)
+    if message.get("fusion") is not None:
+        frame["fu"] = message["fusion"]
+    if message.get("predictions") is not None:
+        frame["pr"] = message["predictions"]
+    return msgpack.packb(frame, use_bin_type=True, use_single_float=True)
+
+
+class BinaryFrameDecoder:
+    """
+    Reference decoder (benchmarks, Python clients): rebuilds the JSON
+    frame_analysis schema, minus per-face candidate lists.
+    """
+
+    def __init__(self):
+        self._key_frame_id = None
+        self._key_boxes: Dict[int, Tuple[int, int, int, int]] = {}
+
+    def decode(self, payload: bytes) -> Dict:
+        frame = msgpack.unpackb(payload, raw=False, strict_map_key=False)
+        keyframe = frame["kf"] == frame["f"]
+        if keyframe:
+            self._key_frame_id = frame["kf"]
+            self._key_boxes = {}
+        elif frame["kf"] != self._key_frame_id:
+            raise ValueError(f"Frame {frame['f']} refers to keyframe {frame['kf']}, which was never received")
+
+        size = frame.get("sz")
+        deltas = set(frame.get("dm", ()))
+        identities = frame.get("id", {})
+        timestamp = datetime.fromtimestamp(frame["ts"] / 1000).isoformat()
+        camera_id = frame.get("cam")
+        detections: List[Dict] = []
+        for i, track_id in enumerate(frame["tr"]):
+            box = tuple(frame["bx"][i * 4:i * 4 + 4])
+            if i in deltas:
+                base = self._key_boxes[track_id]
+                box = tuple(b + d for b, d in zip(base, box))
+            elif keyframe and track_id >= 0:
+                self._key_boxes[track_id] = box
+            label = frame["lb"][frame["L"][i]]
+            identity = identities.get(i)
+            det = {
+                "id": f"trk_{camera_id or 'cam'}_{track_id}" if track_id >= 0 else f"det_{frame['f']}_{i}",
+                "camera_id": camera_id,
+                "class": f"SUSPECT: {identity}" if identity else label.lower(),
+                "label": label,
+                "identity": identity,
+                "face_checked": bool(frame["fl"][i] & FLAG_FACE_CHECKED),
+                "confidence": frame["cf"][i] / 100,
+                "bbox": {"x": box[0], "y": box[1], "width": box[2], "height": box[3]},
+                "bbox_normalized": [box[0] / size[0], box[1] / size[1], box[2] / size[0], box[3] / size[1]]
+                if size else None,
+                "threat_level": THREAT_LEVELS[frame["th"][i]],
+                "frame_id": frame["f"],
+                "timestamp": timestamp
+            }
+            if track_id >= 0:
+                det["track_id"] = track_id
+                det["confirmed"] = bool(frame["fl"][i] & FLAG_CONFIRMED)
+                det["interpolated"] = bool(frame["fl"][i] & FLAG_INTERPOLATED)
+            detections.append(det)
+
+        return {
+            "type": "frame_analysis",
+            "frame_id": frame["f"],
+            "detections": detections,
+            "mode": frame.get("mode"),
+            "timestamp": timestamp,
+            "fusion": frame.get("fu"),
+            "predictions": frame.get("pr")
+        }
@@ -0,0 +1,151 @@
+"""
+Stream Topics - Per-Client Subscriptions for /api/ai/stream
+Clients choose what they receive, as query parameters at connect or later
+with a {"type": "subscribe", ...} text message (keys left out keep their
+current value):
+
+    cameras      camera ids ("CAM_1,CAM_2" or a list); default: the primary
+                 camera's frames and every camera's alerts
+    min_threat   normal | suspicious | critical (default normal)
+    classes      object classes to keep ("person,knife" or a list; default all)
+    frames       0 = no frame_analysis messages (alerts only)
+    alerts       0 = no critical_alert messages
+    fusion       Hz of separate "fusion" messages, 0 = off;
+                 absent = embedded in every frame_analysis (original behaviour)
+    predictions  Hz of separate "predictions" messages, same convention
+
+Detections are filtered before serialization, and clients with the same
+topics share one serialized payload (see Subscription.frame_key).
+"""
+
+import time
+from typing import Any, Dict, Mapping, Optional, Set, Tuple
+
+from stream_codec import THREAT_CODES
+
+CHANNELS = ("fusion", "predictions")
+
+
+def _as_set(value: Any) -> Optional[Set[str]]:
+    if value is None:
+        return None
+    items = value.split(",") if isinstance(value, str) else value
+    values = {str(v).strip() for v in items if str(v).strip()}
+    return values or None
+
+
+def _as_bool(value: Any) -> bool:
+    if isinstance(value, str):
+        return value.strip().lower() not in ("0", "false", "no", "off", "")
+    return bool(value)
+
+
+def _as_rate(name: str, value: Any) -> Optional[float]:
+    if value is None or value == "":
+        return None
+    try:
+        rate = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be a rate in Hz, got {value!r}")
+    if rate < 0:
+        raise ValueError(f"{name} must be >= 0")
+    return rate
+
+
+class Subscription:
+    """What one client receives. Rates are per channel and per client."""
+
+    def __init__(self, cameras: Optional[Set[str]] = None, min_threat: str = "normal",
+                 classes: Optional[Set[str]] = None, frames: bool = True, alerts: bool = True,
+                 fusion: Optional[float] = None, predictions: Optional[float] = None):
+        if min_threat not in THREAT_CODES:
+            raise ValueError(f"min_threat must be one of {', '.join(THREAT_CODES)}")
+        self.cameras = cameras
+        self.min_threat = min_threat
+        self.classes = {c.lower() for c in classes} if classes else None
+        self.frames = frames
+        self.alerts = alerts
+        self.rates: Dict[str, Optional[float]] = {"fusion": fusion, "predictions": predictions}
+        self._last_sent: Dict[str, float] = {}
+
+    @classmethod
+    def parse(cls, params: Mapping, base: Optional["Subscription"] = None) -> "Subscription":
+        """Build from query parameters or a subscribe message; raises ValueError on bad values"""
+        base = base or cls()
+        cameras = base.cameras
+        if "cameras" in params or "camera_id" in params:
+            cameras = _as_set(params.get("cameras") or params.get("camera_id"))
+        sub = cls(
+            cameras=cameras,
+            min_threat=str(params.get("min_threat", base.min_threat)).lower(),
+            classes=_as_set(params["classes"]) if "classes" in params else base.classes,
+            frames=_as_bool(params["frames"]) if "frames" in params else base.frames,
+            alerts=_as_bool(params["alerts"]) if "alerts" in params else base.alerts,
+            fusion=_as_rate("fusion", params["fusion"]) if "fusion" in params else base.rates["fusion"],
+            predictions=_as_rate("predictions", params["predictions"]) if "predictions" in params
+            else base.rates["predictions"]
+        )
+        sub._last_sent = dict(base._last_sent)
+        return sub
+
+    # ------------------------------------------------------------------
+    # Filters
+    # ------------------------------------------------------------------
+
+    def frame_cameras(self, default_camera: str) -> Set[str]:
+        return set(self.cameras) if self.cameras else {default_camera}
+
+    def matches(self, det: Dict) -> bool:
+        if THREAT_CODES.get(det.get("threat_level"), 0) < THREAT_CODES[self.min_threat]:
+            return False
+        if self.classes is None:
+            return True
+        label = str(det.get("label") or det.get("class", "")).lower()
+        return label in self.classes or ("suspect" in self.classes and bool(det.get("identity")))
+
+    def wants_alert(self, camera_id: str, det: Dict) -> bool:
+        return self.alerts and (not self.cameras or camera_id in self.cameras) and self.matches(det)
+
+    def embeds(self, channel: str) -> bool:
+        return self.rates[channel] is None
+
+    @property
+    def frame_key(self) -> Tuple:
+        """Everything a frame_analysis payload depends on"""
+        return (self.min_threat, frozenset(self.classes) if self.classes else None,
+                self.embeds("fusion"), self.embeds("predictions"))
+
+    def frame_message(self, message: Dict) -> Tuple[Dict, bool]:
+        """This subscription's view of a frame_analysis message, and whether it carries anything"""
+        detections = message.get("detections") or []
+        if self.min_threat != "normal" or self.classes is not None:
+            detections = [d for d in detections if self.matches(d)]
+        frame = dict(message, detections=detections)
+        for channel in CHANNELS:
+            if not self.embeds(channel):
+                frame.pop(channel, None)
+        empty = not detections and not any(frame.get(channel) is not None for channel in CHANNELS)
+        return frame, empty
+
+    def due(self, channel: str, now: Optional[float] = None) -> bool:
+        """True (and marks the send) when this client's rate allows another message on the channel"""
+        rate = self.rates[channel]
+        if not rate:
+            return False
+        now = time.time() if now is None else now
+        if now - self._last_sent.get(channel, 0.0) < 1.0 / rate:
+            return False
+        self._last_sent[channel] = now
+        return True
+
+    def describe(self) -> Dict:
+        return {
+            "cameras": sorted(self.cameras) if self.cameras else None,
+            "min_threat": self.min_threat,
+            "classes": sorted(self.classes) if self.classes else None,
+            "frames": self.frames,
+            "alerts": self.alerts,
+            "fusion": "embedded" if self.embeds("fusion") else self.rates["fusion"],
+            "predictions": "embedded" if self.embeds("predictions") else self.rates["predictions"]
+        }
+
@@ -0,0 +1,43 @@
+"""
+Quick test: a weapon below TRACK_HIGH_CONFIDENCE must still come out of
+the tracker (it starts a tentative track, confirmed on the next pass),
+while a weak non-threat detection still only extends existing tracks.
+"""
+
+import sys
+sys.path.append('.')
+
+from tracker import MultiObjectTracker, TRACK_HIGH_CONFIDENCE
+
+
+def detection(label, confidence, threat_level, x=100):
+    return {
+        "class": label.lower(),
+        "label": label,
+        "confidence": confidence,
+        "threat_level": threat_level,
+        "bbox": {"x": x, "y": 120, "width": 40, "height": 90}
+    }
+
+
+tracker = MultiObjectTracker()
+
+print(f"Testing tracker with weak detections (TRACK_HIGH_CONFIDENCE={TRACK_HIGH_CONFIDENCE})...")
+print("="*60)
+
+first = tracker.update([detection("KNIFE", 0.55, "critical")], seq=1)
+assert len(first) == 1, f"0.55 KNIFE dropped: {first}"
+assert first[0]["label"] == "KNIFE" and not first[0]["confirmed"]
+print(f"  - pass 1: {first[0]['label']} track {first[0]['track_id']} (tentative)")
+
+second = tracker.update([detection("KNIFE", 0.55, "critical")], seq=2)
+assert len(second) == 1 and second[0]["track_id"] == first[0]["track_id"]
+assert second[0]["confirmed"], "weak KNIFE track never confirmed"
+print(f"  - pass 2: {second[0]['label']} track {second[0]['track_id']} (confirmed)")
+
+weak = tracker.update([detection("KNIFE", 0.55, "critical"), detection("CHAIR", 0.55, "normal", x=400)], seq=3)
+assert [d["label"] for d in weak] == ["KNIFE"], f"weak CHAIR started a track: {weak}"
+print("  - weak CHAIR did not start a track")
+
+print("\n" + "="*60)
+print("✅ Weak weapon detections are tracked!")
@@ -0,0 +1,41 @@
+"""
+Check that a spawned inference worker does not rebuild the app.
+Spawn re-runs the launch script as __mp_main__ in every worker, so this
+starts one spawn child exactly as `python main.py` would and lists the
+engine / executor / gallery objects main.py's top level built in it.
+"""
+
+import multiprocessing as mp
+import os
+import queue
+import sys
+sys.path.append('.')
+
+from inference_workers import app_state_types, probe_worker_imports
+
+if __name__ == "__main__":
+    # Make the child re-run main.py, like a worker of `python main.py`
+    sys.modules["__main__"].__file__ = os.path.abspath("main.py")
+    ctx = mp.get_context("spawn")
+    results = ctx.Queue()
+    process = ctx.Process(target=probe_worker_imports, args=(results,))
+
+    print("Spawning a worker from main.py...")
+    print("="*60)
+    process.start()
+    inherited = None
+    while inherited is None:
+        try:
+            inherited = results.get(timeout=1.0)
+        except queue.Empty:
+            if not process.is_alive():
+                print(f"❌ Worker exited with code {process.exitcode} while importing main.py")
+                sys.exit(1)
+    process.join()
+
+    print(f"Checked for: {', '.join(t.__name__ for t in app_state_types())}")
+    print("\n" + "="*60)
+    if inherited:
+        print(f"❌ Worker inherited app state from main.py: {', '.join(inherited)}")
+        sys.exit(1)
+    print("✅ Worker imports only inference_workers - no engine, executor or gallery")
@@ -0,0 +1,327 @@
+"""
+Object Tracker - IoU + Kalman Multi-Object Tracking
+SORT/ByteTrack-style tracker (pure numpy, CPU-only). Gives detections stable
+track ids across YOLO passes and interpolates their boxes on the frames in
+between, so downstream work (alerts, face matching, DB writes) can run once
+per track instead of once per frame. Face-match results are kept per track
+in an IdentityCache.
+"""
+
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from identity_cache import IdentityCache
+
+# Configuration (overridable via environment)
+TRACK_IOU_THRESHOLD = float(os.getenv("TRACK_IOU_THRESHOLD", "0.3"))
+TRACK_HIGH_CONFIDENCE = float(os.getenv("TRACK_HIGH_CONFIDENCE", "0.6"))  # below: may extend, starts a track only if it is a threat
+TRACK_MAX_MISSES = int(os.getenv("TRACK_MAX_MISSES", "3"))       # detection passes a track may go unmatched
+TRACK_MIN_HITS = int(os.getenv("TRACK_MIN_HITS", "2"))           # matches before a track is confirmed
+TRACK_MAX_EXTRAPOLATION = int(os.getenv("TRACK_MAX_EXTRAPOLATION", "30"))  # frames
+
+
+def _to_cxcywh(box: np.ndarray) -> np.ndarray:
+    x1, y1, x2, y2 = box
+    return np.array([(x1 + x2) / 2, (y1 + y2) / 2, x2 - x1, y2 - y1], dtype=np.float64)
+
+
+def _to_xyxy(state: np.ndarray) -> np.ndarray:
+    cx, cy, w, h = state[:4]
+    w, h = max(w, 1.0), max(h, 1.0)
+    return np.array([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], dtype=np.float64)
+
+
+def iou_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Pairwise IoU between (N, 4) and (M, 4) xyxy boxes"""
+    if len(a) == 0 or len(b) == 0:
+        return np.zeros((len(a), len(b)))
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
+
+
+def greedy_match(scores: np.ndarray, threshold: float) -> List[Tuple[int, int]]:
+    """Pair rows with columns by descending score (each used at most once)"""
+    if scores.size == 0:
+        return []
+    order = np.argsort(scores, axis=None)[::-1]
+    rows, cols = np.unravel_index(order, scores.shape)
+    used_rows, used_cols = set(), set()
+    matches = []
+    for r, c in zip(rows.tolist(), cols.tolist()):
+        if scores[r, c] < threshold:
+            break
+        if r in used_rows or c in used_cols:
+            continue
+        used_rows.add(r)
+        used_cols.add(c)
+        matches.append((r, c))
+    return matches
+
+
+class KalmanBoxFilter:
+    """
+    Constant-velocity Kalman filter over (cx, cy, w, h).
+    Time is measured in capture frames, so YOLO can run every Nth frame.
+    """
+    _H = np.hstack([np.eye(4), np.zeros((4, 4))])
+    _R = np.diag([1.0, 1.0, 10.0, 10.0])
+    _Q = np.diag([1.0, 1.0, 1.0, 1.0, 0.01, 0.01, 0.0001, 0.0001])
+
+    def __init__(self, box: np.ndarray):
+        self.x = np.zeros(8)
+        self.x[:4] = _to_cxcywh(box)
+        # Position is known, velocity is not
+        self.P = np.diag([10.0, 10.0, 10.0, 10.0, 1000.0, 1000.0, 1000.0, 1000.0])
+
+    @staticmethod
+    def _transition(dt: float) -> np.ndarray:
+        F = np.eye(8)
+        F[:4, 4:] = np.eye(4) * dt
+        return F
+
+    def predict(self, dt: float):
+        if dt <= 0:
+            return
+        F = self._transition(dt)
+        self.x = F @ self.x
+        self.P = F @ self.P @ F.T + self._Q * dt
+        self.x[2:4] = np.maximum(self.x[2:4], 1.0)
+
+    def update(self, box: np.ndarray):
+        y = _to_cxcywh(box) - self._H @ self.x
+        S = self._H @ self.P @ self._H.T + self._R
+        K = self.P @ self._H.T @ np.linalg.inv(S)
+        self.x = self.x + K @ y
+        self.P = (np.eye(8) - K @ self._H) @ self.P
+
+    def box(self, dt: float = 0) -> np.ndarray:
+        """xyxy box extrapolated dt frames ahead (state is not modified)"""
+        return _to_xyxy(self._transition(dt) @ self.x if dt > 0 else self.x)
+
+
+class Track:
+    """One tracked object: filter state and latest detection"""
+
+    def __init__(self, track_id: int, detection: Dict, box: np.ndarray, seq: int):
+        self.track_id = track_id
+        self.label = detection.get("label", detection["class"])
+        self.kf = KalmanBoxFilter(box)
+        self.detection = detection
+        self.last_seq = seq
+        self.hits = 1
+        self.misses = 0
+        self.first_seen = time.time()
+
+
+class MultiObjectTracker:
+    """
+    Per-camera tracker.
+    update() runs on every YOLO pass and returns the detections annotated
+    with track ids; predict() returns interpolated boxes for the frames
+    YOLO skipped. Identities come from the track's IdentityCache entry, so
+    they survive the passes where face matching was skipped. All public
+    methods hold the tracker's lock, so the pipeline stages may share it.
+    """
+
+    def __init__(self, iou_threshold: float = TRACK_IOU_THRESHOLD,
+                 high_confidence: float = TRACK_HIGH_CONFIDENCE,
+                 max_misses: int = TRACK_MAX_MISSES, min_hits: int = TRACK_MIN_HITS,
+                 max_extrapolation: int = TRACK_MAX_EXTRAPOLATION,
+                 identities: Optional[IdentityCache] = None):
+        self.iou_threshold = iou_threshold
+        self.high_confidence = high_confidence
+        self.max_misses = max_misses
+        self.min_hits = min_hits
+        self.max_extrapolation = max_extrapolation
+        self.tracks: List[Track] = []
+        self.identities = identities or IdentityCache()
+        self.frame_size = (640, 480)
+        self._next_id = 1
+        self.created = 0
+        self.lost = 0
+        # update() runs on the pipeline's postprocess thread while prepare reads
+        # the tracks (cached_face_boxes, needs_face_check) on the preprocess thread
+        self._lock = threading.RLock()
+
+    def _match(self, tracks: List[Track], predicted: np.ndarray, detections: List[Dict],
+               boxes: np.ndarray, det_indices: List[int]) -> List[Tuple[int, int]]:
+        """IoU-match a subset of detections to tracks of the same class"""
+        if not tracks or not det_indices:
+            return []
+        scores = iou_matrix(predicted, boxes[det_indices])
+        for r, track in enumerate(tracks):
+            for c, d in enumerate(det_indices):
+                if detections[d].get("label", detections[d]["class"]) != track.label:
+                    scores[r, c] = 0.0
+        return [(r, det_indices[c]) for r, c in greedy_match(scores, self.iou_threshold)]
+
+    def update(self, detections: List[Dict], seq: int,
+               frame_size: Optional[Tuple[int, int]] = None) -> List[Dict]:
+        """
+        Associate one YOLO pass (taken at capture frame `seq`) with the
+        existing tracks. Detections flagged face_checked carry a fresh face
+        match result, which replaces the track's cached identity.
+        """
+        with self._lock:
+            if frame_size:
+                self.frame_size = frame_size
+
+            for track in self.tracks:
+                track.kf.predict(seq - track.last_seq)
+                track.last_seq = seq
+            predicted = np.array([t.kf.box() for t in self.tracks]).reshape(-1, 4)
+            boxes = np.array([self._detection_box(d) for d in detections]).reshape(-1, 4)
+
+            # ByteTrack-style: confident detections first, weak ones only extend leftovers
+            high = [i for i, d in enumerate(detections) if d["confidence"] >= self.high_confidence]
+            low = [i for i, d in enumerate(detections) if d["confidence"] < self.high_confidence]
+            matches = self._match(self.tracks, predicted, detections, boxes, high)
+            matched_tracks = {r for r, _ in matches}
+            leftover = [r for r in range(len(self.tracks)) if r not in matched_tracks]
+            for r, d in self._match([self.tracks[r] for r in leftover], predicted[leftover],
+                                    detections, boxes, low):
+                matches.append((leftover[r], d))
+                matched_tracks.add(leftover[r])
+
+            assigned: Dict[int, Track] = {}
+            for r, d in matches:
+                track = self.tracks[r]
+                track.kf.update(boxes[d])
+                track.hits += 1
+                track.misses = 0
+                assigned[d] = track
+
+            for r, track in enumerate(self.tracks):
+                if r not in matched_tracks:
+                    track.misses += 1
+
+            # Weak threat detections (a knife at 0.55) still start a tentative
+            # track: dropping them would hide the object from the stream and alerts
+            matched_dets = set(assigned)
+            starters = high + [d for d in low if detections[d].get("threat_level", "normal") != "normal"]
+            for d in starters:
+                if d not in matched_dets:
+                    track = Track(self._next_id, detections[d], boxes[d], seq)
+                    self._next_id += 1
+                    self.created += 1
+                    self.tracks.append(track)
+                    assigned[d] = track
+
+            live = [t for t in self.tracks if t.misses <= self.max_misses]
+            self.lost += len(self.tracks) - len(live)
+            self.tracks = live
+            self.identities.retain(t.track_id for t in live)
+
+            now = time.time()
+            output = []
+            for d, track in sorted(assigned.items()):
+                det = detections[d]
+                if det.get("face_checked"):
+                    self.identities.store(track.track_id, det.get("face_matches"), now)
+                elif track.track_id in self.identities.entries:
+                    self.identities.hits += 1
+                det = self._annotate(track, det, self.identities.get(track.track_id, now))
+                track.detection = det
+                output.append(det)
+            return output
+
+    def predict(self, seq: int) -> List[Dict]:
+        """Detections for a frame YOLO skipped, with Kalman-interpolated boxes"""
+        with self._lock:
+            output = []
+            for track in self.tracks:
+                if track.misses > 0:
+                    continue
+                dt = min(seq - track.last_seq, self.max_extrapolation)
+                det = dict(track.detection)
+                det.update(self._box_fields(track.kf.box(dt)))
+                det["interpolated"] = True
+                output.append(det)
+            return output
+
+    def _annotate(self, track: Track, det: Dict, cached=None) -> Dict:
+        """Stamp the track id (and its cached identity) onto a detection"""
+        det = dict(det)
+        det["track_id"] = track.track_id
+        det["id"] = f"trk_{det.get('camera_id') or 'cam'}_{track.track_id}"
+        det["confirmed"] = track.hits >= self.min_hits
+        det["interpolated"] = False
+        if cached is not None and cached.identity:
+            det["identity"] = cached.identity
+            det["face_matches"] = cached.matches
+            det["identity_score"] = cached.score
+            det["class"] = f"SUSPECT: {cached.identity}"
+            det["threat_level"] = "critical"
+        det.update(self._box_fields(track.kf.box()))
+        return det
+
+    def _box_fields(self, box: np.ndarray) -> Dict:
+        w, h = self.frame_size
+        x1, y1, x2, y2 = (float(v) for v in box)
+        x1, y1 = max(0.0, x1), max(0.0, y1)
+        x2, y2 = min(float(w), x2), min(float(h), y2)
+        return {
+            "bbox": {
+                "x": int(x1),
+                "y": int(y1),
+                "width": int(max(0.0, x2 - x1)),
+                "height": int(max(0.0, y2 - y1))
+            },
+            "bbox_normalized": [x1 / w, y1 / h, max(0.0, x2 - x1) / w, max(0.0, y2 - y1) / h]
+        }
+
+    @staticmethod
+    def _detection_box(det: Dict) -> List[float]:
+        b = det["bbox"]
+        return [b["x"], b["y"], b["x"] + b["width"], b["y"] + b["height"]]
+
+    def needs_face_check(self) -> bool:
+        """True while some person track has no cached face-match result"""
+        with self._lock:
+            now = time.time()
+            return any(t.label == "person" and self.identities.get(t.track_id, now) is None
+                       for t in self.tracks)
+
+    def cached_face_boxes(self, seq: int, reverify: bool = True) -> np.ndarray:
+        """
+        Predicted xyxy boxes (at capture frame `seq`) of the person tracks
+        whose cached identity needs no face pass yet; the face stage skips
+        person detections that overlap them.
+        """
+        with self._lock:
+            now = time.time()
+            boxes = [
+                t.kf.box(min(seq - t.last_seq, self.max_extrapolation)) for t in self.tracks
+                if t.label == "person" and self.identities.is_fresh(t.track_id, now, reverify)
+            ]
+            return np.array(boxes, dtype=np.float32).reshape(-1, 4)
+
+    def sync_gallery(self, version: int):
+        """Drop cached identities if the face gallery changed (see IdentityCache)"""
+        with self._lock:
+            self.identities.sync_gallery(version)
+
+    def active_ids(self) -> Set[int]:
+        with self._lock:
+            return {t.track_id for t in self.tracks}
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                "active": len(self.tracks),
+                "confirmed": sum(1 for t in self.tracks if t.hits >= self.min_hits),
+                "identified": self.identities.identified(),
+                "created": self.created,
+                "lost": self.lost,
+                "identity_cache": self.identities.get_stats()
+            }
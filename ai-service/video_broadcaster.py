@@ -0,0 +1,398 @@
+"""
+Video Broadcaster - Encode-Once MJPEG Fan-Out
+One encoder task per watched camera and rendition turns each new frame
+into a single JPEG, already framed as a multipart/x-mixed-replace part,
+and every viewer of that rendition streams the same bytes. Encoding cost
+grows with the number of watched renditions, not with the number of
+viewers; viewers are plain async generators, so none of them holds a thread.
+
+Renditions (VIDEO_RENDITIONS) trade size, quality and frame rate: a camera
+grid asks for "thumb", a focused view for "full" (the default, identical
+to the original stream). "auto" is opt-in: it starts in the middle of the
+ladder and moves per viewer on its measured delivery.
+
+A viewer on a slow link only ever waits for the newest part - the frames
+encoded in the meantime are skipped (and counted) - and a viewer whose
+link needs longer than CLIENT_MAX_LAG to take one part is dropped.
+"""
+
+import asyncio
+import itertools
+import os
+import time
+from typing import AsyncIterator, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import cv2
+
+from client_stream import CLIENT_MAX_LAG
+from qos_governor import QOS_LEVELS
+
+MJPEG_BOUNDARY = "frame"
+MJPEG_MEDIA_TYPE = f"multipart/x-mixed-replace; boundary={MJPEG_BOUNDARY}"
+
+# Rendition ladder, lowest first: name:max_width:jpeg_quality:max_fps (width 0 = capture size)
+# ("full" keeps the original single stream: capture size, quality 30, 30 fps)
+VIDEO_RENDITIONS = os.getenv("VIDEO_RENDITIONS", "thumb:320:20:5,low:480:25:10,medium:640:30:15,full:0:30:30")
+VIDEO_DEFAULT_RENDITION = os.getenv("VIDEO_DEFAULT_RENDITION", "full")
+VIDEO_AUTO_START = os.getenv("VIDEO_AUTO_START", "medium")  # where "auto" viewers begin
+
+# "auto" ladder steps, evaluated over AUTO_WINDOW seconds of delivery
+AUTO_WINDOW = 3.0
+AUTO_DOWN_SKIP_RATIO = 0.3  # more of the encoded parts skipped than this -> step down
+AUTO_UP_BUSY = 0.25         # link busy less than this fraction of the time (twice in a row) -> step up
+
+# QoS jpeg_quality is relative to its normal level: rendition qualities scale with it
+BASE_JPEG_QUALITY = QOS_LEVELS[0]["jpeg_quality"]
+
+
+class Rendition(NamedTuple):
+    name: str
+    max_width: int   # 0 = capture resolution
+    quality: int
+    max_fps: float
+
+    def effective(self, settings: Dict) -> Tuple[int, float]:
+        """(jpeg quality, fps) under the QoS governor's current video budget"""
+        quality = max(5, min(95, round(self.quality * settings["jpeg_quality"] / BASE_JPEG_QUALITY)))
+        return quality, min(self.max_fps, settings["mjpeg_fps"])
+
+
+def parse_renditions(spec: str) -> List[Rendition]:
+    """'thumb:320:25:5,full:0:75:30' -> [Rendition, ...] (bad entries skipped)"""
+    ladder = []
+    for entry in filter(None, (e.strip() for e in spec.split(","))):
+        try:
+            name, width, quality, fps = entry.split(":")
+            ladder.append(Rendition(name, int(width), int(quality), float(fps)))
+        except ValueError:
+            print(f"⚠️ Ignoring video rendition '{entry}' (expected name:max_width:quality:max_fps)")
+    return ladder or [Rendition("full", 0, 30, 30.0)]
+
+
+class EncodedFrame:
+    """One encoded frame, shared read-only by every viewer"""
+    __slots__ = ("seq", "index", "part", "size", "timestamp")
+
+    def __init__(self, seq: int, index: int, jpeg: bytes):
+        self.seq = seq
+        self.index = index  # encoder's running count, for per-viewer skip accounting
+        self.part = (f"--{MJPEG_BOUNDARY}\r\nContent-Type: image/jpeg\r\n"
+                     f"Content-Length: {len(jpeg)}\r\n\r\n").encode() + jpeg + b"\r\n"
+        self.size = len(jpeg)
+        self.timestamp = time.time()
+
+
+class CameraEncoder:
+    """
+    Encodes one camera in one rendition while it has viewers. The capture
+    ring is read zero-copy, and the resize + cv2.imencode run off the event
+    loop; the QoS governor's mjpeg_fps / jpeg_quality scale every rendition.
+    """
+
+    def __init__(self, camera_id: str, rendition: Rendition, resolve: Callable, settings: Callable[[], Dict]):
+        self.camera_id = camera_id
+        self.rendition = rendition
+        self.resolve = resolve      # camera_id -> CameraChannel (None once detached)
+        self.settings = settings    # -> {"mjpeg_fps": ..., "jpeg_quality": ...}
+        self.latest: Optional[EncodedFrame] = None
+        self.viewers = 0
+        self.encoded = 0
+        self.encoded_bytes = 0
+        self.encode_time = 0.0
+        self.started_at = time.time()
+        self.closed = False
+        self._cond = asyncio.Condition()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self.closed = False
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        last_seq = 0
+        last_sent = 0.0
+        stalled = 0
+        camera = None
+        try:
+            while True:
+                channel = self.resolve(self.camera_id)
+                if channel is None:
+                    print(f"📴 Video feed ended: {self.camera_id} detached")
+                    return
+
+                if channel.camera is not camera:
+                    # Camera (re)attached - its sequence numbers start over
+                    camera = channel.camera
+                    last_seq = 0
+                if not camera.running:
+                    await asyncio.sleep(1.0)  # capture failed; wait for a resync to replace it
+                    continue
+
+                if await camera.wait_for_frame_async(last_seq, timeout=1.0) <= last_seq:
+                    stalled += 1
+                    if stalled % 10 == 0:
+                        print(f"⚠️ Warning: No new frames from {self.camera_id} for {stalled}s")
+                    continue
+                stalled = 0
+
+                # Frame-rate cap: wait out the remaining interval, then take the newest frame
+                quality, fps = self.rendition.effective(self.settings())
+                remaining = last_sent + 1.0 / fps - time.time()
+                if remaining > 0:
+                    await asyncio.sleep(remaining)
+
+                lease = camera.borrow_frame(after_seq=last_seq)
+                if lease is None:
+                    continue
+                t0 = time.perf_counter()
+                try:
+                    # Encode straight from the ring slot, off the event loop
+                    ok, buffer = await asyncio.to_thread(self._encode, lease.frame, quality)
+                finally:
+                    lease.release()
+                last_seq = lease.seq
+                last_sent = time.time()
+                if not ok:
+                    continue
+                self.encode_time += time.perf_counter() - t0
+                self.encoded += 1
+                self.encoded_bytes += len(buffer)
+                await self._publish(EncodedFrame(lease.seq, self.encoded, buffer.tobytes()))
+        finally:
+            self.closed = True
+            async with self._cond:
+                self._cond.notify_all()
+
+    def _encode(self, frame, quality: int):
+        width = self.rendition.max_width
+        if width and frame.shape[1] > width:
+            height = max(1, round(frame.shape[0] * width / frame.shape[1]))
+            frame = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+        return cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+
+    async def _publish(self, frame: EncodedFrame):
+        async with self._cond:
+            self.latest = frame
+            self._cond.notify_all()
+
+    async def wait_for_frame(self, after_seq: int, timeout: float = 1.0) -> Optional[EncodedFrame]:
+        """Newest encoded frame past after_seq (None on timeout or once closed)"""
+        frame = self.latest
+        if frame is not None and frame.seq > after_seq:
+            return frame
+        try:
+            async with self._cond:
+                await asyncio.wait_for(
+                    self._cond.wait_for(lambda: self.closed or (self.latest is not None
+                                                                and self.latest.seq > after_seq)),
+                    timeout=timeout
+                )
+        except asyncio.TimeoutError:
+            return None
+        frame = self.latest
+        return frame if frame is not None and frame.seq > after_seq else None
+
+    def get_stats(self) -> Dict:
+        elapsed = max(1e-6, time.time() - self.started_at)
+        return {
+            "viewers": self.viewers,
+            "encoded": self.encoded,
+            "fps": round(self.encoded / elapsed, 1),
+            "avg_encode_ms": round(self.encode_time / self.encoded * 1000, 2) if self.encoded else None,
+            "avg_frame_bytes": self.encoded_bytes // self.encoded if self.encoded else None,
+            "kbps_per_viewer": round(self.encoded_bytes * 8 / elapsed / 1000, 1),
+            "running": self._task is not None and not self._task.done()
+        }
+
+
+class RenditionPicker:
+    """
+    Walks one "auto" viewer along the ladder from its measured delivery:
+    steps down when the link skips many encoded parts, steps up after two
+    windows in which it never skipped and was mostly idle.
+    """
+
+    def __init__(self, ladder: List[str], start: str):
+        self.ladder = ladder
+        self.index = ladder.index(start) if start in ladder else len(ladder) // 2
+        self.switches = 0
+        self._reset()
+        self._calm = 0
+
+    @property
+    def current(self) -> str:
+        return self.ladder[self.index]
+
+    def _reset(self):
+        self._window_start = time.monotonic()
+        self._busy = 0.0
+        self._sent = 0
+        self._skipped = 0
+
+    def observe(self, drain: float, skipped: int) -> bool:
+        """Record one delivered part (drain = seconds the transport took); True if the rendition changed"""
+        self._busy += drain
+        self._sent += 1
+        self._skipped += skipped
+        elapsed = time.monotonic() - self._window_start
+        if elapsed < AUTO_WINDOW:
+            return False
+        skip_ratio = self._skipped / (self._sent + self._skipped)
+        busy = self._busy / elapsed
+        self._reset()
+
+        if skip_ratio > AUTO_DOWN_SKIP_RATIO and self.index > 0:
+            self.index -= 1
+            self._calm = 0
+        elif self._skipped == 0 and busy < AUTO_UP_BUSY:
+            self._calm += 1
+            if self._calm < 2 or self.index == len(self.ladder) - 1:
+                return False
+            self.index += 1
+            self._calm = 0
+        else:
+            self._calm = 0
+            return False
+        self.switches += 1
+        return True
+
+
+class ViewerStats:
+    """Delivery counters of one MJPEG viewer"""
+    __slots__ = ("viewer_id", "camera_id", "rendition", "auto", "connected_at", "sent", "skipped",
+                 "bytes", "last_lag", "max_lag")
+
+    def __init__(self, viewer_id: int, camera_id: str, rendition: str, auto: bool):
+        self.viewer_id = viewer_id
+        self.camera_id = camera_id
+        self.rendition = rendition
+        self.auto = auto
+        self.connected_at = time.time()
+        self.sent = 0
+        self.skipped = 0  # parts encoded while this viewer was still draining an older one
+        self.bytes = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+
+    def get_stats(self) -> Dict:
+        return {
+            "viewer": self.viewer_id,
+            "camera_id": self.camera_id,
+            "rendition": self.rendition,
+            "auto": self.auto,
+            "connected_s": round(time.time() - self.connected_at, 1),
+            "sent": self.sent,
+            "skipped": self.skipped,
+            "bytes": self.bytes,
+            "lag_ms": round(self.last_lag * 1000, 1),
+            "max_lag_ms": round(self.max_lag * 1000, 1)
+        }
+
+
+class VideoBroadcaster:
+    """
+    Registry of CameraEncoders keyed by (camera_id, rendition). stream() is
+    the per-viewer async generator: the first viewer of a rendition starts
+    its encoder, the last one stops it.
+    """
+
+    def __init__(self, resolve: Callable, settings: Callable[[], Dict],
+                 renditions: str = VIDEO_RENDITIONS, auto_start: str = VIDEO_AUTO_START):
+        self.resolve = resolve
+        self.settings = settings
+        self.renditions: Dict[str, Rendition] = {r.name: r for r in parse_renditions(renditions)}
+        self.auto_start = auto_start
+        self.encoders: Dict[Tuple[str, str], CameraEncoder] = {}
+        self.viewers: Dict[int, ViewerStats] = {}
+        self.slow_disconnects = 0
+        self._ids = itertools.count(1)
+
+    def accepts(self, rendition: str) -> bool:
+        return rendition == "auto" or rendition in self.renditions
+
+    def _acquire(self, camera_id: str, rendition: str) -> CameraEncoder:
+        key = (camera_id, rendition)
+        encoder = self.encoders.get(key)
+        if encoder is None or (encoder.closed and encoder.viewers == 0):
+            encoder = CameraEncoder(camera_id, self.renditions[rendition], self.resolve, self.settings)
+            self.encoders[key] = encoder
+        encoder.viewers += 1
+        encoder.start()
+        return encoder
+
+    def _release(self, encoder: CameraEncoder):
+        encoder.viewers -= 1
+        if encoder.viewers == 0:
+            encoder.stop()
+            key = (encoder.camera_id, encoder.rendition.name)
+            if self.encoders.get(key) is encoder:
+                del self.encoders[key]
+
+    async def stream(self, camera_id: str, rendition: str = VIDEO_DEFAULT_RENDITION) -> AsyncIterator[bytes]:
+        """MJPEG body for one viewer: every new shared part of its rendition, once"""
+        picker = RenditionPicker(list(self.renditions), self.auto_start) if rendition == "auto" else None
+        name = picker.current if picker else rendition
+        encoder = self._acquire(camera_id, name)
+        viewer = ViewerStats(next(self._ids), camera_id, name, picker is not None)
+        self.viewers[viewer.viewer_id] = viewer
+        last_seq = 0
+        last_index = None
+        try:
+            while True:
+                frame = await encoder.wait_for_frame(last_seq)
+                if frame is None:
+                    if encoder.closed:
+                        return
+                    continue
+                skipped = max(0, frame.index - last_index - 1) if last_index is not None else 0
+                viewer.skipped += skipped
+                last_seq, last_index = frame.seq, frame.index
+                # yield returns once the transport has taken the part: encode-to-delivered lag
+                t0 = time.time()
+                yield frame.part
+                now = time.time()
+                viewer.sent += 1
+                viewer.bytes += len(frame.part)
+                lag = now - frame.timestamp
+                viewer.last_lag = lag
+                viewer.max_lag = max(viewer.max_lag, lag)
+                if lag > CLIENT_MAX_LAG:
+                    self.slow_disconnects += 1
+                    print(f"🐢 Dropping video viewer {viewer.viewer_id} ({camera_id}): {lag:.1f}s behind")
+                    return
+
+                if picker and picker.observe(now - t0, skipped):
+                    # Parts are self-contained JPEGs, so the stream can change size mid-flight
+                    self._release(encoder)
+                    encoder = self._acquire(camera_id, picker.current)
+                    viewer.rendition = picker.current
+                    last_seq, last_index = 0, None
+        finally:
+            del self.viewers[viewer.viewer_id]
+            self._release(encoder)
+
+    def stop_all(self):
+        for encoder in self.encoders.values():
+            encoder.stop()
+        self.encoders.clear()
+
+    def get_renditions(self) -> List[Dict]:
+        return [r._asdict() for r in self.renditions.values()]
+
+    def get_stats(self) -> Dict:
+        encoders = list(self.encoders.items())
+        cameras: Dict[str, Dict] = {}
+        for (camera_id, rendition), encoder in encoders:
+            cameras.setdefault(camera_id, {})[rendition] = encoder.get_stats()
+        return {
+            "cameras": cameras,
+            "viewers": [viewer.get_stats() for viewer in list(self.viewers.values())],
+            "encoders": sum(1 for _, encoder in encoders if encoder.get_stats()["running"]),
+            "slow_disconnects": self.slow_disconnects
+        }
@@ -10,6 +10,8 @@ import time
 from typing import List, Dict, Optional
 from datetime import datetime
 
+from postprocess import build_detections, STREAM_THREAT_RULES
+
 
 class VideoStream:
     """
@@ -151,38 +153,8 @@ class VideoStream:
                 verbose=False   # Suppress output
             )[0]
             
-            detections = []
-            
-            # Parse results
-            for idx, box in enumerate(results.boxes):
-                # Extract bounding box coordinates
-                x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-                
-                # Extract confidence and class
-                confidence = float(box.conf[0])
-                class_id = int(box.cls[0])
-                class_name = results.names[class_id]
-                
-                # Classify threat level
-                threat_level = self._classify_threat(class_name, confidence)
-                
-                # Create detection object (matches mock_detector format)
-                detection = {
-                    "id": f"det_{self.frame_count}_{idx}",
-                    "class": class_name.lower(),
-                    "confidence": round(confidence, 2),
-                    "bbox": {
-                        "x": int(x1),
-                        "y": int(y1),
-                        "width": int(x2 - x1),
-                        "height": int(y2 - y1)
-                    },
-                    "threat_level": threat_level,
-                    "timestamp": datetime.utcnow().isoformat(),
-                    "frame_id": self.frame_count
-                }
-                
-                detections.append(detection)
+            detections = build_detections(results, self.frame_count, STREAM_THREAT_RULES,
+                                          timestamp=datetime.utcnow().isoformat())
             
             self.frame_count += 1
             return detections
@@ -191,40 +163,6 @@ class VideoStream:
             print(f"❌ Detection error: {e}")
             return []
     
-    def _classify_threat(self, class_name: str, confidence: float) -> str:
-        """
-        Classify threat level based on detected object
-        
-        Args:
-            class_name: YOLOv8 class name
-            confidence: Detection confidence
-            
-        Returns:
-            "critical", "suspicious", or "normal"
-        """
-        # Critical threats (weapons)
-        critical_objects = [
-            'knife', 'gun', 'rifle', 'scissors', 'sword'
-        ]
-        
-        # Suspicious (high-confidence person, vehicle at night, etc.)
-        suspicious_objects = [
-            'person', 'backpack', 'handbag', 'suitcase'
-        ]
-        
-        class_lower = class_name.lower()
-        
-        # Critical threat
-        if any(weapon in class_lower for weapon in critical_objects):
-            return 'critical'
-        
-        # Suspicious (high confidence person)
-        if class_lower in suspicious_objects and confidence > 0.85:
-            return 'suspicious'
-        
-        # Normal
-        return 'normal'
-    
     def get_stats(self) -> Dict:
         """Get stream statistics"""
         return {
@@ -307,27 +245,8 @@ class SnapshotStream:
             return []
             
         results = self.model(frame, conf=0.6, verbose=False)[0]
-        detections = []
-        for idx, box in enumerate(results.boxes):
-            x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-            confidence = float(box.conf[0])
-            class_id = int(box.cls[0])
-            class_name = results.names[class_id]
-            
-            # Simple threat classification
-            threat_level = 'normal'
-            if class_name in ['knife', 'gun', 'rifle']: threat_level = 'critical'
-            elif class_name == 'person' and confidence > 0.85: threat_level = 'suspicious'
-            
-            detections.append({
-                "id": f"det_{self.frame_count}_{idx}",
-                "class": class_name.lower(),
-                "confidence": round(confidence, 2),
-                "bbox": {"x": int(x1), "y": int(y1), "width": int(x2-x1), "height": int(y2-y1)},
-                "threat_level": threat_level,
-                "timestamp": datetime.utcnow().isoformat(),
-                "frame_id": self.frame_count
-            })
+        detections = build_detections(results, self.frame_count, STREAM_THREAT_RULES,
+                                      timestamp=datetime.utcnow().isoformat())
         self.frame_count += 1
         return detections
         
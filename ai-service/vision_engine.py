@@ -3,52 +3,103 @@ Vision Engine - Defense Grade (Performance Optimized)
 Non-blocking threaded camera capture with minimal latency.
 """
 
+import asyncio
 import cv2
 import threading
 import time
-from typing import Optional, List, Dict, Union
+from typing import Optional, List, Dict, Union, Callable
 from datetime import datetime
 import numpy as np
 import os
 
-try:
-    from ultralytics import YOLO
-    YOLO_AVAILABLE = True
-except ImportError:
-    YOLO_AVAILABLE = False
+from frame_ring import FrameRing, FrameLease
+from motion_gate import MotionGate
+from tracker import MultiObjectTracker, iou_matrix, TRACK_IOU_THRESHOLD
+from face_gallery import FaceGallery, FACE_MATCH_TOP_K, FACE_GALLERY_DIR
+from inference_backends import create_backend, INFERENCE_BACKEND
+from preprocess import letterbox_batch, to_model_input, unletterbox_boxes
+from postprocess import build_detections, result_arrays, ENGINE_THREAT_RULES
 
 try:
     import insightface
     from insightface.app import FaceAnalysis
+    from insightface.utils import face_align
     INSIGHTFACE_AVAILABLE = True
 except ImportError:
     INSIGHTFACE_AVAILABLE = False
 
+# Preallocated frames per camera (newest + in-flight readers + one to write)
+FRAME_RING_SLOTS = int(os.getenv("FRAME_RING_SLOTS", "4"))
+
+# Cross-camera batching: frames from up to N cameras share one model call
+INFERENCE_BATCH_SIZE = int(os.getenv("INFERENCE_BATCH_SIZE", "8"))
+INFERENCE_BATCH_WAIT_MS = float(os.getenv("INFERENCE_BATCH_WAIT_MS", "10"))
+
+# Face stage: only the upper part of each person box is searched for a face
+FACE_CROP_RATIO = float(os.getenv("FACE_CROP_RATIO", "0.5"))   # top fraction of the person box
+FACE_MIN_CROP = int(os.getenv("FACE_MIN_CROP", "32"))          # px; smaller persons are skipped
+FACE_DET_SIZES = (160, 256, 320, 480, 640)                      # detector input sizes by crop size
+
+
+def upper_body_crop(frame: np.ndarray, box) -> Optional[np.ndarray]:
+    """Head-and-shoulders region of a person box (a view, no copy)"""
+    h, w = frame.shape[:2]
+    x1, y1, x2, y2 = box
+    margin = (x2 - x1) * 0.1
+    cx1, cx2 = int(max(0, x1 - margin)), int(min(w, x2 + margin))
+    cy1, cy2 = int(max(0, y1)), int(min(h, y1 + (y2 - y1) * FACE_CROP_RATIO))
+    if min(cx2 - cx1, cy2 - cy1) < FACE_MIN_CROP:
+        return None
+    return frame[cy1:cy2, cx1:cx2]
+
+
+def face_det_size(crop: np.ndarray) -> int:
+    """Smallest detector input that covers the crop (upscaling tiny crops wastes time)"""
+    longest = max(crop.shape[:2])
+    for size in FACE_DET_SIZES:
+        if longest <= size:
+            return size
+    return FACE_DET_SIZES[-1]
+
 
 class ThreadedCamera:
     """
     High-performance background thread for capturing frames.
-    Uses double buffering for smooth playback.
+    Frames are decoded and mirrored in place into a preallocated FrameRing;
+    readers borrow them by sequence number instead of sharing a live array,
+    and block on wait_for_frame()/wait_for_frame_async() instead of polling.
+    shared_frames=True puts the ring in shared memory for worker processes.
     """
-    def __init__(self, source: Union[int, str]):
+    def __init__(self, source: Union[int, str], motion_gate: Optional[MotionGate] = None,
+                 shared_frames: bool = False):
         self.source = source
-        self.lock = threading.Lock()
         self.running = False
-        self.latest_frame = None
+        self.ring = FrameRing(slots=FRAME_RING_SLOTS, shared=shared_frames)
+        self.motion_gate = motion_gate  # scored in the capture thread
         self.status = "stopped"
         self.fps = 0
         self.frame_count = 0
         self.thread = None
         self.resolution = (640, 480)
         self.cap = None
+        
+        # New-frame notification (sync condition + asyncio waiters + listeners)
+        self._frame_cond = threading.Condition()
+        self._async_waiters: Dict[asyncio.AbstractEventLoop, List[asyncio.Future]] = {}
+        self._frame_listeners: List[Callable[[int], None]] = []
+
+    @property
+    def frame_seq(self) -> int:
+        """Monotonic sequence number of the newest captured frame"""
+        return self.frame_count
 
     def start(self):
         if self.running:
             return
         self.running = True
+        self.status = "starting"
         self.thread = threading.Thread(target=self._capture_loop, daemon=True)
         self.thread.start()
-        self.status = "starting"
         print(f"📷 Camera thread started for source: {self.source}")
 
     def stop(self):
@@ -57,7 +108,10 @@ class ThreadedCamera:
             self.thread.join(timeout=2.0)
         if self.cap:
             self.cap.release()
+        if self.ring.shared:
+            self.ring.close()  # unlink the shared block
         self.status = "stopped"
+        self._notify_frame()  # wake waiters so they notice the camera is gone
         print("📷 Camera thread stopped")
 
     def _capture_loop(self):
@@ -96,14 +150,26 @@ class ThreadedCamera:
         last_fps_time = time.time()
         frame_counter = 0
 
+        raw = None  # decode scratch buffer, reused by cap.read()
         while self.running:
-            ret, frame = self.cap.read()
+            ret, decoded = self.cap.read(raw) if raw is not None else self.cap.read()
             if ret:
-                # Mirror the frame and store
-                frame = cv2.flip(frame, 1)
-                with self.lock:
-                    self.latest_frame = frame
-                    self.frame_count += 1
+                if decoded is not raw:
+                    # First frame or resolution change - (re)size the ring
+                    raw = decoded
+                    if self.ring.shape != raw.shape:
+                        self.ring.allocate(raw.shape, raw.dtype)
+                
+                # Mirror straight into a free ring slot
+                slot = self.ring.acquire_write()
+                if slot is not None:
+                    idx, buf = slot
+                    cv2.flip(raw, 1, dst=buf)
+                    # Score motion before publishing so the scheduler never sees an unscored frame
+                    if self.motion_gate and self.motion_gate.enabled:
+                        self.motion_gate.update(buf, self.ring.seq + 1)
+                    self.frame_count = self.ring.commit(idx)
+                    self._notify_frame()
                 
                 frame_counter += 1
                 
@@ -120,200 +186,465 @@ class ThreadedCamera:
         self.cap.release()
 
     def get_frame(self) -> Optional[np.ndarray]:
-        with self.lock:
-            return self.latest_frame  # Return direct reference, no copy needed for read
+        """Private copy of the newest frame (safe to keep)"""
+        return self.ring.copy_latest()
+
+    def borrow_frame(self, after_seq: int = 0) -> Optional[FrameLease]:
+        """Zero-copy access to the newest frame; release() the lease when done"""
+        return self.ring.borrow(after_seq)
+
+    # ------------------------------------------------------------------
+    # New-frame notification
+    # ------------------------------------------------------------------
+
+    def add_frame_listener(self, callback: Callable[[int], None]):
+        """Call callback(seq) from the capture thread after every new frame"""
+        self._frame_listeners.append(callback)
+
+    def remove_frame_listener(self, callback: Callable[[int], None]):
+        if callback in self._frame_listeners:
+            self._frame_listeners.remove(callback)
+
+    def _notify_frame(self):
+        seq = self.frame_count
+        with self._frame_cond:
+            self._frame_cond.notify_all()
+            waiters = self._async_waiters
+            self._async_waiters = {}
+        # One loop callback per event loop, however many coroutines wait on it
+        for loop, futures in waiters.items():
+            try:
+                loop.call_soon_threadsafe(_resolve_futures, futures, seq)
+            except RuntimeError:
+                pass  # loop already closed
+        for callback in self._frame_listeners:
+            try:
+                callback(seq)
+            except Exception as e:
+                print(f"⚠️ Frame listener error: {e}")
+
+    def wait_for_frame(self, after_seq: int = 0, timeout: Optional[float] = None) -> int:
+        """
+        Block until a frame newer than after_seq exists (or timeout/stop).
+        Returns the newest sequence number; compare with after_seq to detect a timeout.
+        """
+        with self._frame_cond:
+            self._frame_cond.wait_for(
+                lambda: self.frame_count > after_seq or not self.running,
+                timeout=timeout
+            )
+            return self.frame_count
+
+    async def wait_for_frame_async(self, after_seq: int = 0, timeout: Optional[float] = None) -> int:
+        """asyncio variant of wait_for_frame(); never blocks the event loop"""
+        loop = asyncio.get_running_loop()
+        with self._frame_cond:
+            if self.frame_count > after_seq or not self.running:
+                return self.frame_count
+            future = loop.create_future()
+            self._async_waiters.setdefault(loop, []).append(future)
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            with self._frame_cond:
+                pending = self._async_waiters.get(loop)
+                if pending and future in pending:
+                    pending.remove(future)
+        return self.frame_count
+
+
+def _resolve_futures(futures: List[asyncio.Future], seq: int):
+    for future in futures:
+        if not future.done():
+            future.set_result(seq)
 
 
 class InsightFaceRecognizer:
-    def __init__(self, known_faces_dir="assets/known_faces"):
+    """
+    InsightFace detector/embedder plus the persistent suspect gallery.
+    The gallery is opened from disk - the face model only runs for faces in
+    frames and for newly enrolled images (embed_image).
+    """
+    def __init__(self, gallery_dir: str = FACE_GALLERY_DIR, readonly: bool = False):
         self.app = None
-        self.known_embeddings = []
-        self.known_names = []
-        self.is_active = False
+        self.rec_model = None
+        self.gallery = FaceGallery(gallery_dir, readonly=readonly)
         
         if INSIGHTFACE_AVAILABLE:
             try:
                 print("👤 Loading InsightFace (Buffalo_L)...")
                 self.app = FaceAnalysis(name='buffalo_l')
                 self.app.prepare(ctx_id=0, det_size=(640, 640))
+                self.rec_model = self.app.models.get('recognition')
                 print("✅ InsightFace Loaded")
-                self.reload(known_faces_dir)
             except Exception as e:
                 print(f"❌ Failed to load InsightFace: {e}")
         else:
             print("❌ InsightFace module not found")
-
-    def reload(self, directory="assets/known_faces"):
-        self.known_embeddings = []
-        self.known_names = []
-        self.is_active = False
         
-        if not os.path.exists(directory):
-            os.makedirs(directory, exist_ok=True)
-            return
+        if len(self.gallery):
+            print(f"✅ Face gallery: {len(self.gallery)} identities ({gallery_dir})")
 
-        print(f"👤 Processing Known Faces from {directory}...")
-        for filename in os.listdir(directory):
-            if filename.endswith((".jpg", ".png", ".jpeg")):
-                path = os.path.join(directory, filename)
-                try:
-                    img = cv2.imread(path)
-                    faces = self.app.get(img)
-                    if len(faces) > 0:
-                        face = max(faces, key=lambda x: (x.bbox[2]-x.bbox[0]) * (x.bbox[3]-x.bbox[1]))
-                        self.known_embeddings.append(face.embedding)
-                        name = os.path.splitext(filename)[0].replace("_", " ").title()
-                        self.known_names.append(name)
-                        print(f"  ✅ Loaded: {name}")
-                except Exception as e:
-                    print(f"  ❌ Failed to load {filename}: {e}")
-        
-        if self.known_embeddings:
-            self.is_active = True
-            print(f"✅ Facial Recognition Active: {len(self.known_names)} identities.")
+    @property
+    def is_active(self) -> bool:
+        return self.app is not None and len(self.gallery) > 0
+
+    @property
+    def known_names(self) -> List[str]:
+        return self.gallery.names
+
+    def embed_image(self, path: str) -> Optional[np.ndarray]:
+        """Embedding of the largest face in an image (None if no face / no model)"""
+        if self.app is None:
+            return None
+        img = cv2.imread(path)
+        if img is None:
+            return None
+        faces = self.app.get(img)
+        if len(faces) == 0:
+            return None
+        face = max(faces, key=lambda x: (x.bbox[2]-x.bbox[0]) * (x.bbox[3]-x.bbox[1]))
+        return np.asarray(face.embedding, dtype=np.float32)
+
+    def embed_person_crops(self, crops: List[tuple]) -> List[Optional[np.ndarray]]:
+        """
+        One face embedding per (frame, person_xyxy): the detector only sees
+        the upper-body crop, at an input size picked from the crop size, and
+        every face found is embedded in a single batched recognition call.
+        """
+        embeddings: List[Optional[np.ndarray]] = [None] * len(crops)
+        if self.app is None or self.rec_model is None:
+            return embeddings
+        aligned, slots = [], []
+        for n, (frame, box) in enumerate(crops):
+            crop = upper_body_crop(frame, box)
+            if crop is None:
+                continue
+            size = face_det_size(crop)
+            bboxes, kpss = self.app.det_model.detect(crop, input_size=(size, size), max_num=1)
+            if len(bboxes) == 0 or kpss is None:
+                continue
+            aligned.append(face_align.norm_crop(crop, landmark=kpss[0],
+                                                image_size=self.rec_model.input_size[0]))
+            slots.append(n)
+        if aligned:
+            for n, feat in zip(slots, self.rec_model.get_feat(aligned)):
+                embeddings[n] = feat
+        return embeddings
 
-    def identify_face(self, embedding, threshold=0.5):
-        if not self.known_embeddings:
+    def identify_faces(self, embeddings, top_k: int = FACE_MATCH_TOP_K) -> List[List[Dict]]:
+        """Top-k suspect matches for every face of a frame (one matrix multiply)"""
+        return self.gallery.match(embeddings, top_k)
+
+    def identify_face(self, embedding):
+        matches = self.gallery.match([embedding], top_k=1)[0]
+        if not matches:
             return "Unknown", 0.0
-        
-        best_match = "Unknown"
-        best_score = 0.0
-        
-        for i, known_emb in enumerate(self.known_embeddings):
-            # Cosine similarity
-            sim = np.dot(embedding, known_emb) / (np.linalg.norm(embedding) * np.linalg.norm(known_emb))
-            if sim > threshold and sim > best_score:
-                best_score = sim
-                best_match = self.known_names[i]
-        
-        return best_match, best_score
+        return matches[0]["name"], matches[0]["score"]
+
+
+class CameraChannel:
+    """
+    One camera feed plus its detection bookkeeping.
+    Many channels share a single VisionEngine (model + face recognizer).
+    """
+    def __init__(self, camera_id: str, source: Union[int, str], motion_config: Optional[Dict] = None,
+                 shared_frames: bool = False):
+        self.camera_id = camera_id
+        self.source = source
+        self.motion_gate = MotionGate()
+        if motion_config:
+            self.motion_gate.configure(**motion_config)
+        self.camera = ThreadedCamera(source, motion_gate=self.motion_gate, shared_frames=shared_frames)
+        self.tracker = MultiObjectTracker()
+        self.frame_counter = 0
+        self.last_detections = []
+        self.last_seen_frame = -1
+        self.last_inference_seq = 0
+        self.last_staleness = 0.0  # capture-to-result age of the last analyzed frame (0 while the gate idles YOLO)
+
+    def start(self):
+        self.camera.start()
+
+    def stop(self):
+        self.camera.stop()
+
+    def has_new_frame(self) -> bool:
+        return self.camera.frame_count != self.last_seen_frame
 
 
 class VisionEngine:
-    def __init__(self, source: Union[int, str] = 0):
-        self.camera = ThreadedCamera(source)
+    def __init__(self, source: Optional[Union[int, str]] = 0, camera_id: str = "CAM_MAIN",
+                 gallery_readonly: bool = False, backend: str = INFERENCE_BACKEND,
+                 load_detector: bool = True):
+        # source=None builds a detection-only engine; cameras are attached as
+        # CameraChannels by the CameraManager (or by worker processes).
+        # load_detector=False: detection runs in worker processes, so this
+        # engine only schedules, tracks and owns the face gallery.
+        self.channel = CameraChannel(camera_id, source) if source is not None else None
         self.model = None
         self.is_ready = False
-        self.last_detections = []
         self.detection_interval = 5  # Run detection every 5th frame to reduce lag
-        self.frame_counter = 0
+        self.max_batch_size = max(1, INFERENCE_BATCH_SIZE)
+        self.max_batch_wait = INFERENCE_BATCH_WAIT_MS / 1000.0
         
-        if YOLO_AVAILABLE:
-            print("🧠 Loading YOLOv11...")
-            try:
-                self.model = YOLO("yolo11n.pt")
-                self.is_ready = True
-                print("✅ YOLOv11 Ready")
-            except:
-                try:
-                    self.model = YOLO("yolov8n.pt")
-                    self.is_ready = True
-                    print("✅ YOLOv8 Ready (fallback)")
-                except:
-                    print("❌ All YOLO models failed")
+        # Tuned at runtime by the QoS governor
+        self.imgsz = 640
+        self.face_mode = "all"  # all | new_tracks
+        
+        # PyTorch / ONNX Runtime / int8 - all return ultralytics Results
+        self.backend = create_backend(backend) if load_detector else None
+        self.model = self.backend.model if self.backend else None
+        self.is_ready = self.model is not None
         
-        self.face_recognizer = InsightFaceRecognizer()
+        self.face_recognizer = InsightFaceRecognizer(readonly=gallery_readonly)
+
+    @property
+    def camera(self) -> Optional[ThreadedCamera]:
+        return self.channel.camera if self.channel else None
 
     def start(self):
-        self.camera.start()
+        if self.channel:
+            self.channel.start()
 
     def stop(self):
-        self.camera.stop()
+        if self.channel:
+            self.channel.stop()
 
-    def analyze(self) -> Dict:
-        frame = self.camera.get_frame()
-        self.frame_counter += 1
-        
-        # Return cached detections if not time to analyze
-        if self.frame_counter % self.detection_interval != 0:
-            return {
-                "detections": self.last_detections,
-                "stats": {
-                    "fps": self.camera.fps,
-                    "status": self.camera.status,
-                    "res": f"{self.camera.resolution[0]}x{self.camera.resolution[1]}"
-                }
-            }
+    def get_stats(self, channel: Optional[CameraChannel] = None) -> Dict:
+        channel = channel or self.channel
+        if not channel:
+            return {"fps": 0, "status": "detached", "res": "Unknown"}
+        camera = channel.camera
+        return {
+            "camera_id": channel.camera_id,
+            "fps": camera.fps,
+            "status": camera.status,
+            "res": f"{camera.resolution[0]}x{camera.resolution[1]}"
+        }
+
+    def next_inference_frame(self, channel: Optional[CameraChannel] = None) -> Optional[tuple]:
+        """
+        Advance the channel's frame counter and return (lease, frame_id) when
+        a detection pass is due, or None when cached detections should be used.
+        The lease pins a zero-copy ring slot until release_frames(); it is
+        None while the camera has no frame yet.
+        """
+        channel = channel or self.channel
+        if not channel:
+            return None
+        channel.frame_counter += 1
+        channel.last_seen_frame = channel.camera.frame_count
+        if channel.frame_counter % self.detection_interval != 0:
+            return None
         
-        detections = []
+        # Static scene: keep the cached detections instead of running YOLO
+        gate = channel.motion_gate
+        if not gate.needs_inference(channel.last_inference_seq):
+            gate.record(ran=False)
+            # Nothing is waiting on inference: an old measurement must not keep QoS degraded
+            channel.last_staleness = 0.0
+            return None
         
-        if frame is not None and self.is_ready and self.model:
+        lease = channel.camera.borrow_frame()
+        if lease is None:
+            return None, channel.camera.frame_count
+        gate.record(ran=True)
+        channel.last_inference_seq = lease.seq
+        return lease, lease.seq
+
+    def analyze(self, channel: Optional[CameraChannel] = None) -> Dict:
+        channel = channel or self.channel
+        if not channel:
+            return {"detections": [], "stats": self.get_stats()}
+        return self.analyze_batch([channel])[0]
+
+    def analyze_batch(self, channels: List[CameraChannel]) -> List[Dict]:
+        """
+        Analyze the latest frame of several cameras with one model call.
+        Returns one analyze()-style dict per channel, in the same order.
+        """
+        due, jobs, leases = self.prepare_batch(channels)
+        results = []
+        if jobs:
             try:
-                h, w = frame.shape[:2]
-                
-                # Run YOLO detection
-                results = self.model(frame, verbose=False, conf=0.5)[0]
-                
-                # Face recognition (if suspects registered)
-                face_identities = {}
-                if self.face_recognizer.is_active:
-                    faces = self.face_recognizer.app.get(frame)
-                    for face in faces:
-                        name, score = self.face_recognizer.identify_face(face.embedding)
-                        if name != "Unknown":
-                            cx = int((face.bbox[0] + face.bbox[2]) / 2)
-                            cy = int((face.bbox[1] + face.bbox[3]) / 2)
-                            face_identities[(cx, cy)] = name
-
-                for idx, box in enumerate(results.boxes):
-                    x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-                    conf = float(box.conf[0])
-                    cls_id = int(box.cls[0])
-                    label = self.model.names[cls_id]
-                    
-                    threat_level = "normal"
-                    final_label = label
-                    
-                    # Check for suspect match
-                    if label == 'person' and face_identities:
-                        pcx = (x1 + x2) / 2
-                        pcy = (y1 + y2) / 2
-                        for (fcx, fcy), name in face_identities.items():
-                            if x1 < fcx < x2 and y1 < fcy < y2:
-                                final_label = f"SUSPECT: {name}"
-                                threat_level = "critical"
-                                break
-                    
-                    
-                    # Weapon detection (Added 'cell phone' for demo purposes)
-                    if label in ['knife', 'gun', 'weapon', 'scissors', 'cell phone']:
-                        threat_level = "critical"
-                    
-                    # Mark all persons as suspicious for demo activity
-                    if label == 'person' and threat_level == "normal":
-                        threat_level = "suspicious"
-                    
-                    detections.append({
-                        "id": f"det_{self.camera.frame_count}_{idx}",
-                        "class": final_label,
-                        "confidence": round(conf, 2),
-                        "bbox": {
-                            "x": int(x1),
-                            "y": int(y1),
-                            "width": int(x2 - x1),
-                            "height": int(y2 - y1)
-                        },
-                        "bbox_normalized": [
-                            float(x1 / w),
-                            float(y1 / h),
-                            float((x2 - x1) / w),
-                            float((y2 - y1) / h)
-                        ],
-                        "threat_level": threat_level,
-                        "frame_id": self.camera.frame_count,
-                        "timestamp": datetime.now().isoformat()
-                    })
-                    
+                results = self.detect_batch(jobs)
+            finally:
+                self.release_frames(due, leases)
+        return self.finish_batch(channels, due, jobs, results)
+
+    def prepare_batch(self, channels: List[CameraChannel]) -> tuple:
+        """
+        Pick the channels that need a YOLO pass this frame.
+        Returns (due_channels, jobs, leases) with jobs as
+        (frame, frame_id, camera_id, match_faces, cached_boxes) tuples for
+        detect_batch(); cached_boxes are tracks whose identity is cached.
+        The leases pin the job frames until release_frames().
+        """
+        gallery_version = self.face_recognizer.gallery.version
+        due = []
+        jobs = []
+        leases = []
+        for channel in channels:
+            picked = self.next_inference_frame(channel)
+            if picked is not None:
+                lease, frame_id = picked
+                tracker = channel.tracker
+                tracker.sync_gallery(gallery_version)
+                cached = tracker.cached_face_boxes(frame_id, reverify=self.face_mode == "all")
+                due.append(channel)
+                leases.append(lease)
+                jobs.append((lease.frame if lease else None, frame_id, channel.camera_id,
+                             self._wants_faces(channel), cached))
+        return due, jobs, leases
+
+    @staticmethod
+    def release_frames(due: List[CameraChannel], leases: List[Optional[FrameLease]]):
+        """Hand the ring slots pinned for inference back to the capture threads"""
+        now = time.time()
+        for channel, lease in zip(due, leases):
+            if lease is not None:
+                channel.last_staleness = now - lease.timestamp
+                lease.release()
+
+    def finish_batch(self, channels: List[CameraChannel], due: List[CameraChannel],
+                     jobs: List[tuple], results: List[List[Dict]]) -> List[Dict]:
+        """
+        Feed fresh detections to each channel's tracker; channels YOLO
+        skipped get the tracker's interpolated boxes instead.
+        """
+        analyzed = {}
+        for channel, job, detections in zip(due, jobs, results):
+            if job[0] is None:
+                continue
+            channel.last_detections = channel.tracker.update(
+                detections, job[1], channel.camera.resolution
+            )
+            analyzed[channel.camera_id] = True
+
+        outputs = []
+        for channel in channels:
+            if channel.camera_id not in analyzed:
+                channel.last_detections = channel.tracker.predict(channel.last_seen_frame)
+            outputs.append({"detections": channel.last_detections, "stats": self.get_stats(channel)})
+        return outputs
+
+    def detect(self, frame: np.ndarray, frame_id: int = 0, camera_id: Optional[str] = None) -> List[Dict]:
+        """Run YOLO + face recognition on a single frame (no shared state)"""
+        return self.detect_batch([(frame, frame_id, camera_id)])[0]
+
+    def get_inference_options(self) -> Dict:
+        """Settings a detached worker engine must mirror (see InferenceExecutor)"""
+        return {"imgsz": self.imgsz, "face_mode": self.face_mode}
+
+    def set_inference_options(self, options: Dict):
+        self.imgsz = options.get("imgsz", self.imgsz)
+        self.face_mode = options.get("face_mode", self.face_mode)
+
+    def _wants_faces(self, channel: CameraChannel) -> bool:
+        """
+        face_mode "new_tracks": only pay for face recognition while some
+        person track has no cached result (and never re-verify).
+        """
+        return self.face_mode == "all" or channel.tracker.needs_face_check()
+
+    def detect_batch(self, jobs: List[tuple]) -> List[List[Dict]]:
+        """
+        Run YOLO once over a batch of
+        (frame, frame_id, camera_id[, match_faces[, cached_boxes]]) jobs and
+        split the results back into one detection list per job.
+        The three steps are separate so a pipeline can overlap them.
+        """
+        inputs = self.preprocess_batch(jobs)
+        return self.postprocess_batch(jobs, inputs, self.infer_batch(inputs))
+
+    def preprocess_batch(self, jobs: List[tuple]) -> Optional[tuple]:
+        """
+        Letterbox the batch's frames into one model input.
+        Returns (valid_job_indices, input_tensor, letterboxes), or None
+        when there is nothing to run.
+        """
+        valid = [i for i, job in enumerate(jobs) if job[0] is not None]
+        if not valid or not self.is_ready or not self.model:
+            return None
+        batch, letterboxes = letterbox_batch([jobs[i][0] for i in valid], self.imgsz)
+        return valid, to_model_input(batch), letterboxes
+
+    def infer_batch(self, inputs: Optional[tuple]) -> Optional[list]:
+        """One model call over a preprocess_batch() input (None on failure)"""
+        if inputs is None:
+            return None
+        try:
+            return self.model(inputs[1], verbose=False, conf=0.5, imgsz=self.imgsz)
+        except Exception as e:
+            print(f"Inference Error: {e}")
+            return None
+
+    def postprocess_batch(self, jobs: List[tuple], inputs: Optional[tuple],
+                          results: Optional[list]) -> List[List[Dict]]:
+        """Face matching and detection dicts for an infer_batch() result"""
+        outputs = [[] for _ in jobs]
+        if inputs is None or results is None:
+            return outputs
+        valid, _, letterboxes = inputs
+
+        # Boxes come back in letterbox coordinates - map them onto the frames
+        arrays = {}
+        for i, result, letterbox in zip(valid, results, letterboxes):
+            xyxy, conf, cls = result_arrays(result)
+            arrays[i] = (unletterbox_boxes(xyxy, letterbox), conf, cls)
+
+        try:
+            face_matches = self._match_person_faces(jobs, arrays)
+        except Exception as e:
+            print(f"Face Recognition Error: {e}")
+            face_matches = {}
+
+        timestamp = datetime.now().isoformat()  # one per batch, not per box
+        for i, result in zip(valid, results):
+            try:
+                outputs[i] = build_detections(result, jobs[i][1], ENGINE_THREAT_RULES,
+                                              camera_id=jobs[i][2], face_matches=face_matches.get(i),
+                                              timestamp=timestamp, arrays=arrays[i],
+                                              frame_shape=jobs[i][0].shape)
             except Exception as e:
-                print(f"Inference Error: {e}")
-        
-        self.last_detections = detections
-        
-        return {
-            "detections": detections,
-            "stats": {
-                "fps": self.camera.fps,
-                "status": self.camera.status,
-                "res": f"{self.camera.resolution[0]}x{self.camera.resolution[1]}"
-            }
-        }
+                print(f"Inference Error ({jobs[i][2]}): {e}")
+        return outputs
+
+    def _match_person_faces(self, jobs: List[tuple], arrays: Dict[int, tuple]) -> Dict[int, Dict[int, List[Dict]]]:
+        """
+        Face stage for a whole batch: embed the face in each person box's
+        upper-body crop and match all of them in one gallery call.
+        Frames without persons (or not flagged for matching) cost nothing,
+        and person boxes overlapping a job's cached_boxes are skipped.
+        Returns {job_index: {box_index: matches}}; an empty match list means
+        a face was embedded but matched no suspect.
+        """
+        if not self.face_recognizer.is_active:
+            return {}
+        crops, owners = [], []
+        for i, (boxes, _, classes) in arrays.items():
+            if len(jobs[i]) > 3 and not jobs[i][3]:
+                continue
+            cached = jobs[i][4] if len(jobs[i]) > 4 else None
+            if cached is not None and len(cached):
+                # Tracks with a fresh cached identity keep it without a new embedding
+                known = iou_matrix(boxes, cached).max(axis=1) >= TRACK_IOU_THRESHOLD
+            else:
+                known = np.zeros(len(boxes), dtype=bool)
+            for b, (box, cls_id) in enumerate(zip(boxes, classes)):
+                if self.model.names[cls_id] == 'person' and not known[b]:
+                    crops.append((jobs[i][0], box))
+                    owners.append((i, b))
+        if not crops:
+            return {}
+
+        embeddings = self.face_recognizer.embed_person_crops(crops)
+        found = [(owner, emb) for owner, emb in zip(owners, embeddings) if emb is not None]
+        if not found:
+            return {}
+        matches = self.face_recognizer.identify_faces([emb for _, emb in found])
+        by_job: Dict[int, Dict[int, List[Dict]]] = {}
+        for ((i, b), _), candidates in zip(found, matches):
+            by_job.setdefault(i, {})[b] = candidates
+        return by_job
@@ -102,7 +102,7 @@ export function CameraDetailPanel({ cameraId, onClose }: CameraDetailPanelProps)
                 {camera.status === 'LIVE' ? (
                     <>
                         <img
-                            src={`http://${window.location.hostname}:8000/api/ai/video_feed`}
+                            src={`http://${window.location.hostname}:8000/api/ai/video_feed?rendition=full`}
                             className="w-full h-full object-cover opacity-80 group-hover:opacity-100 transition-opacity"
                             alt="Live Feed"
                         />
@@ -19,10 +19,12 @@ interface CameraFeedProps {
     cameraName: string;
     isLive?: boolean;
     selected?: boolean;
+    /** MJPEG rendition (see /api/ai/video_renditions); grid tiles use 'thumb' */
+    rendition?: string;
     onSelect: () => void;
 }
 
-export function CameraFeed({ cameraId, cameraName, isLive = false, selected = false, onSelect }: CameraFeedProps) {
+export function CameraFeed({ cameraId, cameraName, isLive = false, selected = false, rendition = 'full', onSelect }: CameraFeedProps) {
     const { detections, isConnected, fps } = useCameraStream(cameraId, isLive);
 
     const hasCritical = detections.some(d => d.threat_level === 'critical');
@@ -45,7 +47,7 @@ export function CameraFeed({ cameraId, cameraName, isLive = false, selected = fa
                     <div className="relative w-full h-full">
                         {/* MJPEG Stream from AI Service */}
                         <img
-                            src={`http://${window.location.hostname}:8000/api/ai/video_feed`}
+                            src={`http://${window.location.hostname}:8000/api/ai/video_feed?rendition=${rendition}`}
                             className="w-full h-full object-cover"
                             alt="Live Feed"
                         />
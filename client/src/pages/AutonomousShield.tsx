@@ -166,6 +166,7 @@ export default function AutonomousShield() {
                                     cameraId={camera.id}
                                     cameraName={camera.name}
                                     isLive={camera.isLive}
+                                    rendition="thumb"
                                     selected={selectedCamera === camera.id}
                                     onSelect={() => setSelectedCamera(camera.id)}
                                 />